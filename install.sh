@@ -76,6 +76,7 @@ create_pm2_tasks(){
     pm2 delete data_fetcher 2> /dev/null && pm2 start runtime_scripts/data_fetcher.py --interpreter .venv/bin/python3  -- -e prod -i 600 -l info
     pm2 delete delete_model_iteration 2> /dev/null && pm2 start runtime_scripts/delete_model_iteration.py --interpreter .venv/bin/python3 -- -t old -a -c -l debug --use_config
     pm2 delete maple_models_bert 2> /dev/null && pm2 start runtime_scripts/maple_models.py --interpreter .venv/bin/python3 --name maple_models_bert -- --model bert --level debug --logname maple_models_bert
+    pm2 delete maple_classifier 2> /dev/null && pm2 start runtime_scripts/maple_classifier.py --interpreter .venv/bin/python3 --name maple_classifier -- --level info
     pm2 save
     pm2 kill
     pm2 resurrect
@@ -1,2 +1,18 @@
-from .chatgpt_server import ChatgptServer
-from .chatgpt_client import ChatgptClient
\ No newline at end of file
+import importlib
+
+# ChatgptServer pulls aiohttp and the LLM helpers, ChatgptClient pulls socketio.
+# Both are imported on first access.
+_LAZY_ATTRIBUTES = dict(
+    ChatgptServer='.chatgpt_server',
+    ChatgptClient='.chatgpt_client',
+)
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -1,5 +1,4 @@
 import logging
-from numpy import require
 import socketio
 import random
 from socketio.exceptions import BadNamespaceError, ConnectionError
@@ -43,6 +42,13 @@ class ChatgptClientNamespace(socketio.ClientNamespace):
             job_popped = self.client.sent_jobs.pop(key)
             self.client.logger.debug('removed job from sent_jobs: %s', key[0])
 
+    def on_chat_summary_ready(self, data):
+        for callback in self.client.chat_summary_ready_callbacks:
+            try:
+                callback(data)
+            except Exception as exc:
+                self.client.logger.error('Failed chat_summary_ready callback. %s', exc)
+
 
 class ChatgptClient(socketio.Client):
     def __init__(
@@ -72,6 +78,7 @@ class ChatgptClient(socketio.Client):
         self.topic_bullet_summary_results = []
         
         self.sent_jobs = dict()
+        self.chat_summary_ready_callbacks = []
         
         self.register_namespace(ChatgptClientNamespace('/'))
         self._connect()
@@ -96,6 +103,14 @@ class ChatgptClient(socketio.Client):
                 if not self._connection_required:
                     return
 
+    def add_chat_summary_ready_callback(self, callback):
+        """Registers a callback for the articles that receive a chat_summary on the server.
+
+        Args:
+            callback (callable): called with a dict with uuid, url, createDate and chat_summary.
+        """
+        self.chat_summary_ready_callbacks.append(callback)
+
     def request_chat_summary(self, article: dict, until_success: bool = True):
         required_keys=['uuid']
         for key in required_keys:
@@ -8,9 +8,13 @@ import time
 import random
 import rcs
 from maple_processing.process import LLMProcess, chatgpt_summary, chatgpt_topic_name, chatgpt_bullet_summary
+from maple_processing.llm_clients import close_clients
 from maple_structures import Article, Topic
-from maple_interface import MapleAPI
+from maple_interface import MapleAPI, AsyncMapleAPI
 from .utils import JobType
+from .job_queue import JobQueue
+from .rate_limit import KeyLimits, KeyRateLimiter, rate_limit_error
+from .llm_cache import LLMCache
 
 
 class ChatgptServerNamespace(socketio.AsyncNamespace):
@@ -79,19 +83,34 @@ class ChatgptServer(socketio.AsyncServer):
         socket_io_api_key: str,
         chatgpt_api_key: str = None,
         article_fetching: bool = False,
-        use_config: bool = True) -> None:
+        use_config: bool = True,
+        rate_limits: KeyLimits = None,
+        llm_cache: LLMCache = None,
+        summary_batch_size: int = 1,
+        summary_batch_window: float = 0.5) -> None:
+        """
+        Args:
+            rate_limits (KeyLimits, optional): concurrency and rate limits of each api key. Defaults to one job in progress per key.
+            llm_cache (LLMCache, optional): cache of LLM results consulted before each LLM query. Defaults to None.
+            summary_batch_size (int, optional): maximum summary jobs sent in one request to backends that accept several articles. Defaults to 1 (no batching).
+            summary_batch_window (float, optional): seconds waited for more summary jobs when a batch is not full. Defaults to 0.5.
+        """
         
         super().__init__(ping_timeout=600)
         self.logger=logging.getLogger('ChatgptServer')
         
         self.maple_lock = Lock()
-        self.maple_keys_in_use = []
         self.maple_clients = []
-        self.maple_jobs = []
+        self.rate_limiter = KeyRateLimiter(default=rate_limits)
+        self.job_queue = JobQueue(limiter=self.rate_limiter)
+        self.llm_cache = llm_cache
+        self._summary_batch_size = max(1, summary_batch_size)
+        self._summary_batch_window = summary_batch_window
         self._maple_config = None
         self._use_config = use_config
         
         self.maple_api = maple_api
+        self.async_maple_api = AsyncMapleAPI.from_maple_api(maple_api)
         self._socket_io_port = socket_io_port
         self._socket_io_ip =  socket_io_ip
         self._socket_io_api_key = socket_io_api_key
@@ -100,6 +119,7 @@ class ChatgptServer(socketio.AsyncServer):
         
         self._app = web.Application()
         self.attach(self._app)
+        self._app.on_cleanup.append(self._close_llm_clients)
         self.register_namespace(ChatgptServerNamespace('/'))
         self.loop = asyncio.get_event_loop()
     
@@ -111,8 +131,8 @@ class ChatgptServer(socketio.AsyncServer):
                 attempts = 0
                 while self._maple_config is None and attempts < max_attempts:
                     self.logger.debug("Fetching maple_config")
-                    maple_config = self.maple_api.config_get()
-                    if maple_config is not None:
+                    maple_config = await self.async_maple_api.config_get()
+                    if isinstance(maple_config, dict):
                         if self._maple_config != maple_config:
                             self.logger.info('maple_config has changed')
                             self._maple_config = maple_config
@@ -124,24 +144,20 @@ class ChatgptServer(socketio.AsyncServer):
             
         
     def maple_add_job(self, sid: str, api_key: str, job_type: JobType, job_details: any):
-        with self.maple_lock:
-            job = dict(
-                    sid = sid,
-                    job_type = job_type,
-                    api_key = api_key,
-                    job_details = job_details,
-                )
-            
-            if job in self.maple_jobs:
-                self.logger.warning("Job was not added! Already exists.")
-            else:
-                self.maple_jobs.append(
-                    job
-                )
-                self.logger.debug(
-                    "Added job: %s. Total jobs: %d", 
-                    job_type,
-                    len(self.maple_jobs))
+        job = dict(
+                sid = sid,
+                job_type = job_type,
+                api_key = api_key,
+                job_details = job_details,
+            )
+        
+        if not self.job_queue.put(job):
+            self.logger.warning("Job was not added! Already exists.")
+        else:
+            self.logger.debug(
+                "Added job: %s. Total jobs: %d", 
+                job_type,
+                len(self.job_queue))
     
     async def client_add(self, sid: str):
         """adds a the sid to a list of clients.
@@ -166,21 +182,21 @@ class ChatgptServer(socketio.AsyncServer):
         with self.maple_lock:
             if sid in self.maple_clients:
                 self.maple_clients.remove(sid)
-            old_len  = len(self.maple_jobs)
-            self.maple_jobs = [job for job in self.maple_jobs if job['sid'] != sid or job['job_type'] in [JobType.summary]]
-            self.logger.debug(
-                "Removed client (%s) and %d jobs. Current jobs: %d",
-                sid,
-                old_len-len(self.maple_jobs),
-                len(self.maple_jobs)
-                )
+        removed = self.job_queue.remove(
+            lambda job: job['sid'] == sid and job['job_type'] not in [JobType.summary])
+        self.logger.debug(
+            "Removed client (%s) and %d jobs. Current jobs: %d",
+            sid,
+            removed,
+            len(self.job_queue)
+            )
     
     async def _fetch_pending_summaries(self):
         # await asyncio.sleep(1)
         while True:
             self.logger.info('Fetching articles without chat_summary.')
             try:
-                for articles in self.maple_api.article_iterator(limit=1000, page=0):
+                async for articles in self.async_maple_api.article_iterator(limit=1000, page=0):
                     for article in articles:
                         if not hasattr(article, 'chat_summary'):
                             self.maple_add_job(
@@ -195,18 +211,69 @@ class ChatgptServer(socketio.AsyncServer):
             self.logger.info('Next article fetching schedule in %.2f hours.', sec/60/60)
             await asyncio.sleep(sec)
 
-    async def _process_job_summary(self, job, force_update: bool = False):
+    async def _close_llm_clients(self, app):
+        """closes the pooled LLM clients and the LLM cache when the server shuts down."""
+        await close_clients()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+
+    async def _cached_llm(self, job, kind: str, llm_process: LLMProcess, prompt: str, content, query, refresh: bool = False):
+        """Result of an LLM query, taken from the LLM cache if the same model, prompt and content were already queried.
+
+        Args:
+            job (dict): the job of the query.
+            kind (str): kind of result, e.g. the job type.
+            llm_process (LLMProcess): the process used by query, which gives the model name.
+            prompt (str): the prompt of the query.
+            content (any): the input of the query.
+            query (callable): coroutine function querying the LLM.
+            refresh (bool, optional): query the LLM even if the result is cached. Defaults to False.
+        """
+        if self.llm_cache is None:
+            return await query()
+        model_name = f'{llm_process.get_model_type()}/{llm_process.get_model_name()}'
+        key = self.llm_cache.key(kind, model_name, prompt, content)
+        if not refresh:
+            result = self.llm_cache.get(key)
+            if result is not None:
+                # no tokens were used, the estimate is given back to the rate limiter.
+                self.job_queue.record_usage(job, 0)
+                return result
+        result = await query()
+        self.llm_cache.put(key, result)
+        return result
+
+    def _llm_process(self, job) -> LLMProcess:
+        """LLMProcess reporting the rate limit headers and token usage of its responses to the job queue.
+
+        It only holds the config and the hook, the http clients are shared by all jobs.
+        """
+        return LLMProcess(
+            config = self._maple_config,
+            response_hook = lambda headers, used_tokens: self.job_queue.record_usage(job, used_tokens, headers),
+        )
+
+    def _rate_limited(self, job, exc: Exception) -> bool:
+        """if exc is a 429 response, blocks the api key of the job and enqueues the job again."""
+        is_rate_limited, retry_after = rate_limit_error(exc)
+        if not is_rate_limited:
+            return False
+        self.logger.warning('Rate limited %s job. Enqueued again.', job['job_type'])
+        self.job_queue.rate_limited(job, retry_after)
+        return True
+
+    async def _get_job_article(self, job, force_update: bool = False) -> Article:
+        """the article of a summary job, or None if it does not exist or already has a chat_summary."""
         # check if uuid in job details
         if 'uuid' not in job['job_details']:
             self.logger.error('Missing uuid for job summary')
-            # self.maple_keys_in_use.remove(job['api_key'])
-            return
+            return None
         
         # retrieve article given uuid
         article = None
         for _ in range(5):
             try:
-                article = self.maple_api.article_get(uuid=job['job_details']['uuid'])
+                article = await self.async_maple_api.article_get(uuid=job['job_details']['uuid'])
                 
                 if isinstance(article, list):
                     if len(article) > 0:
@@ -218,46 +285,140 @@ class ChatgptServer(socketio.AsyncServer):
                 break
             except Exception as exc:
                 self.logger.error("Error retrieving article. %s", exc)
-                return
+                return None
+        
+        if not isinstance(article, Article):
+            return None
+        # check if already has chat_summary and continue with force_update
+        if hasattr(article, 'chat_summary') and not force_update:
+            return None
+        return article
+
+    async def _save_chat_summary(self, article: Article, summary: str):
+        article.chat_summary = summary
+        try:
+            await self.async_maple_api.article_put(article)
+            self.logger.info('Updated chat_summary for article %s, %s', article.uuid, article.url)
+        except Exception as exc:
+            self.logger.error('Failed updating article %s. %s', article.uuid, exc)
+            return
+        await self._notify_chat_summary_ready(article)
+
+    async def _process_job_summary(self, job, force_update: bool = False):
+        article = await self._get_job_article(job, force_update)
+        if article is None:
+            return
         
         # get chat summary using chatgpt
-        if isinstance(article, Article):
-            # check if already has chat_summary and continue with force_update
-            if hasattr(article, 'chat_summary'):
-                if not force_update:
-                    # self.maple_keys_in_use.remove(job['api_key'])
-                    return
-            for _ in range(3):
-                try:
-                    llm_process = LLMProcess(config = self._maple_config)
-                    summary = await llm_process.get_summary(article.content, job['api_key'])
-                    # summary = await chatgpt_summary(article.content, job['api_key'])
-                    # summary = chatgpt_summary(article.content, job['api_key'])
-                    break
-                except Exception as exc:
-                    self.logger.error('Failed to retrieve chat summary using chatgpt. %s', exc)
-                    # self.maple_keys_in_use.remove(job['api_key'])
-                    return
-            
-            article.chat_summary = summary
+        try:
+            llm_process = self._llm_process(job)
+            summary = await self._cached_llm(
+                job, JobType.summary, llm_process, llm_process.summary_prompt, article.content,
+                lambda: llm_process.get_summary(article.content, job['api_key']),
+                refresh=force_update)
+        except Exception as exc:
+            if self._rate_limited(job, exc):
+                return
+            self.logger.error('Failed to retrieve chat summary using chatgpt. %s', exc)
+            return
+        await self._save_chat_summary(article, summary)
+
+    async def _process_job_summary_batch(self, job):
+        """Summarizes the article of job together with other queued summary jobs of the same api key.
+
+        Up to summary_batch_size jobs are taken, waiting summary_batch_window seconds for more
+        jobs if the batch is not full. The limiter slot of job is given back while waiting. The
+        articles are summarized with one request and the summaries are saved to each article.
+        Articles with a cached summary are not sent.
+        """
+        jobs = [job] + self.job_queue.take(job, self._summary_batch_size - 1)
+        if len(jobs) < self._summary_batch_size and self._summary_batch_window > 0:
+            self.job_queue.suspend(job)
+            await asyncio.sleep(self._summary_batch_window)
+            await self.job_queue.resume(job)
+            jobs += self.job_queue.take(job, self._summary_batch_size - len(jobs))
+
+        articles = [
+            article for article in await asyncio.gather(*[self._get_job_article(job_) for job_ in jobs])
+            if article is not None]
+        if len(articles) == 0:
+            return
+
+        llm_process = self._llm_process(job)
+        summaries = dict()
+        keys = dict()
+        if self.llm_cache is not None:
+            model_name = f'{llm_process.get_model_type()}/{llm_process.get_model_name()}'
+            for article in articles:
+                keys[article.uuid] = self.llm_cache.key(
+                    JobType.summary, model_name, llm_process.summary_prompt, article.content)
+                cached = self.llm_cache.get(keys[article.uuid])
+                if cached is not None:
+                    summaries[article.uuid] = cached
+        pending = [article for article in articles if article.uuid not in summaries]
+        if len(pending) > 0:
             try:
-                self.maple_api.article_put(article)
-                self.logger.info('Updated chat_summary for article %s, %s', article.uuid, article.url)
+                results = await llm_process.get_summaries(
+                    [article.content for article in pending], job['api_key'])
             except Exception as exc:
-                self.logger.error('Failed updating article %s. %s', article.uuid, exc)
-        # self.maple_keys_in_use.remove(job['api_key'])
-    
+                is_rate_limited, retry_after = rate_limit_error(exc)
+                if is_rate_limited:
+                    self.logger.warning('Rate limited batch of %d summary jobs. Enqueued again.', len(jobs))
+                    # queued again at the front, in their original order.
+                    for job_ in reversed(jobs[1:]):
+                        self.job_queue.put(job_, front=True)
+                    self.job_queue.rate_limited(job, retry_after)
+                    return
+                self.logger.error('Failed to retrieve %d chat summaries. %s', len(pending), exc)
+                return
+            if len(results) != len(pending):
+                # summaries can not be matched to their articles.
+                self.logger.error(
+                    'Failed to retrieve chat summaries. Expected %d summaries, received %d.',
+                    len(pending), len(results))
+                return
+            for article, summary in zip(pending, results):
+                summaries[article.uuid] = summary
+                if self.llm_cache is not None:
+                    self.llm_cache.put(keys[article.uuid], summary)
+        self.logger.debug(
+            'Summarized batch of %d articles, %d from cache.', len(articles), len(articles) - len(pending))
+
+        await asyncio.gather(*[
+            self._save_chat_summary(article, summaries[article.uuid])
+            for article in articles if summaries[article.uuid] is not None])
+
+    async def _notify_chat_summary_ready(self, article: Article):
+        """broadcasts to all clients that an article has a new chat_summary (e.g. for MapleClassifier)."""
+        try:
+            await self.emit(
+                'chat_summary_ready',
+                dict(
+                    uuid=article.uuid,
+                    url=article.url,
+                    createDate=getattr(article, 'createDate', None),
+                    chat_summary=article.chat_summary,
+                ),
+            )
+        except Exception as exc:
+            self.logger.error('Failed to notify chat_summary_ready for article %s. %s', article.uuid, exc)
+
     async def _process_job_topic_name(self, job):
         job_send = job.copy()
         while True:
             try:
-                llm_process = LLMProcess(config = self._maple_config)
-                topic_name = await llm_process.get_topic_name(job['job_details']['keyword'], job['api_key'])
+                llm_process = self._llm_process(job)
+                keywords = job['job_details']['keyword']
+                topic_name = await self._cached_llm(
+                    job, JobType.topic_name, llm_process, llm_process.topic_name_prompt, keywords,
+                    lambda: llm_process.get_topic_name(keywords, job['api_key']))
                 
                 # topic_name = await chatgpt_topic_name( job_send['job_details']['keyword'], job_send['api_key'])
                 job_send['results'] = topic_name
                 break
             except Exception as exc:
+                if self._rate_limited(job, exc):
+                    return
                 self.logger.error('Failed query from chatgpt. %s', exc)
                 return
         
@@ -281,13 +442,17 @@ class ChatgptServer(socketio.AsyncServer):
         while True:
             try:
                 articles = job['job_details']['content']
-                llm_process = LLMProcess(config = self._maple_config)
-                bullet_summary = await llm_process.get_bullet_summary(articles, job['api_key'])
+                llm_process = self._llm_process(job)
+                bullet_summary = await self._cached_llm(
+                    job, JobType.bullet_summary, llm_process, llm_process.bullet_summary_prompt, articles,
+                    lambda: llm_process.get_bullet_summary(articles, job['api_key']))
                 
                 # bullet_summary = await chatgpt_bullet_summary(articles, job['api_key'])
                 job_send['results'] = bullet_summary
                 break
             except Exception as exc:
+                if self._rate_limited(job, exc):
+                    return
                 self.logger.error('Failed query from chatgpt: %s', exc)
             
         try:
@@ -305,71 +470,48 @@ class ChatgptServer(socketio.AsyncServer):
             self.logger.error('Failed replying to job. %s', exc)
         
     async def _process_job(self, job):
-        
-        self.logger.debug('Processing job: %s, uuid: %s', job['job_type'], job['job_details']['uuid'])
-        if job['job_type'] == JobType.summary:
-            await self._process_job_summary(job)
-            # self.start_background_task(
-            #     self._process_job_summary, job
-            # )
-        
-        elif job['job_type'] == JobType.topic_name:
-            await self._process_job_topic_name(job)
-            # self.maple_keys_in_use.remove(job['api_key'])
-        
-        elif job['job_type'] == JobType.bullet_summary:
-            await self._process_job_bullet_summary(job)
-            # self.maple_keys_in_use.remove(job['api_key'])
-        
-        self.maple_keys_in_use.remove(job['api_key'])
-    
-    def _get_job(self):
-        """get a job to be executed.
-
-        Returns:
-            _type_: _description_
-        """
-        jobs_ = self.maple_jobs.copy()
-        # sort by priority (ordered by JobType.all)
-        jobs = []
-        for job_type in JobType.all:
-            for job in jobs_:
-                if job['job_type'] == job_type:
-                    jobs.append(job)
-        
-        if len(jobs) != len(jobs_):
-            self.logger.warning('There are invalid jobs: (%d)/(%d)', len(jobs_) - len(jobs), len(jobs_))
-        
-        # return a job if api_key not in use.
-        for job in jobs:
-            if job['api_key'] not in self.maple_keys_in_use:
-                self.maple_keys_in_use.append(job['api_key'])
-                self.maple_jobs.remove(job)
-                return job
-        
-        return None
+        try:
+            self.logger.debug('Processing job: %s, uuid: %s', job['job_type'], job['job_details']['uuid'])
+            if job['job_type'] == JobType.summary:
+                if self._summary_batch_size > 1 and LLMProcess(config = self._maple_config).supports_batch_summary:
+                    await self._process_job_summary_batch(job)
+                else:
+                    await self._process_job_summary(job)
+            
+            elif job['job_type'] == JobType.topic_name:
+                await self._process_job_topic_name(job)
+            
+            elif job['job_type'] == JobType.bullet_summary:
+                await self._process_job_bullet_summary(job)
+        finally:
+            self.job_queue.release(job)
     
     async def _process(self):
         """the process to be executed. run forever...
+
+        Waits for jobs on the job queue, which wakes up only when a job is added, a job
+        is released or a rate limited api key is available again.
         """
         tstart = time.time()
         tlog = time.time()
         while True:
             try:
+                job = await self.job_queue.get()
                 if (time.time() - tlog) > 5:
                     tlog = time.time()
                     self.logger.debug(
                         'Jobs enqueued: %d. Total time: %.2fh',
-                        len(self.maple_jobs),
+                        len(self.job_queue),
                         (time.time()-tstart)/60/60,
                         )
-                
-                job = self._get_job()
-                if job is None:
-                    await self.sleep(0)
-                    continue
+                    if self.llm_cache is not None:
+                        self.logger.debug(
+                            'LLM cache hits: %d, misses: %d, hit rate: %.2f',
+                            self.llm_cache.hits,
+                            self.llm_cache.misses,
+                            self.llm_cache.hit_rate,
+                            )
                 self.start_background_task(self._process_job, job)
-                await self.sleep(0)
             except Exception as exc:
                 self.logger.error("_process run into problems: %s", exc)
             
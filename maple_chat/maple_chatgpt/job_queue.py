@@ -0,0 +1,219 @@
+'''Queue of chatgpt jobs used by ChatgptServer.'''
+import asyncio
+from collections import deque
+import itertools
+import json
+from .utils import JobType
+from .rate_limit import KeyRateLimiter, estimate_job_tokens
+
+
+class JobQueue:
+    """asyncio queue of jobs, ordered by job type priority and enqueue order.
+
+    Jobs are kept in one deque per job type and api key, so taking a job only looks at
+    the head of each deque. A job is only taken when the rate limiter of its api key
+    allows it (concurrency, requests and tokens per minute); the limiter slot is given
+    back with `release`. Identical queued jobs are only added once, using an index
+    instead of comparing against every queued job. Each job receives a `job_id` when it
+    is first queued, which identifies it while in progress. Consumers wait on an event set by
+    `put` and `release`, or until a rate limited key is available again, so an idle
+    queue costs no cpu.
+
+    The queue must be used from the thread of its event loop.
+    """
+
+    def __init__(self, priorities: list[str] = None, limiter: KeyRateLimiter = None, cost=estimate_job_tokens):
+        """
+        Args:
+            priorities (list[str], optional): job types, highest priority first. Defaults to JobType.all.
+            limiter (KeyRateLimiter, optional): limits per api key. Defaults to one job in progress per key.
+            cost (callable, optional): estimated tokens of a job. Defaults to estimate_job_tokens.
+        """
+        self._priorities = list(priorities or JobType.all)
+        # job type -> api key -> deque of jobs.
+        self._queues = {job_type: dict() for job_type in self._priorities}
+        self._index = dict()
+        self._limiter = limiter or KeyRateLimiter()
+        self._cost = cost
+        self._job_ids = itertools.count()
+        # job_id of the jobs in progress -> estimated tokens.
+        self._in_progress = dict()
+        # job_id of the jobs in progress without a limiter slot.
+        self._suspended = set()
+        # seconds until a rate limited key may be available, if any.
+        self._next_delay = None
+        self._available = asyncio.Event()
+
+    @staticmethod
+    def key(job: dict) -> tuple:
+        """Identity of a job, used to ignore duplicates.
+
+        Jobs are identified by the uuid of their article or topic, so the key stays small even
+        when job_details holds a whole article. Jobs without uuid fall back to their serialized details.
+        """
+        details = job['job_details']
+        if isinstance(details, dict) and details.get('uuid') is not None:
+            identity = details['uuid']
+        else:
+            identity = json.dumps(details, sort_keys=True, default=str)
+        return (job['sid'], job['job_type'], job['api_key'], identity)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, job: dict):
+        return self.key(job) in self._index
+
+    @property
+    def limiter(self) -> KeyRateLimiter:
+        return self._limiter
+
+    @property
+    def in_progress(self) -> int:
+        return len(self._in_progress)
+
+    def put(self, job: dict, front: bool = False) -> bool:
+        """Adds a job.
+
+        Args:
+            job (dict): the job. A `job_id` is assigned to it if it has none.
+            front (bool, optional): queue the job before the jobs of its type and api key. Defaults to False.
+
+        Raises:
+            ValueError: if the job type is unknown.
+
+        Returns:
+            bool: False if an identical job is already queued.
+        """
+        if job['job_type'] not in self._queues:
+            raise ValueError(f"Invalid job type: {job['job_type']}")
+        key = self.key(job)
+        if key in self._index:
+            return False
+        if 'job_id' not in job:
+            job['job_id'] = next(self._job_ids)
+        self._index[key] = job
+        keys = self._queues[job['job_type']].setdefault(job['api_key'], deque())
+        if front:
+            keys.appendleft(key)
+        else:
+            keys.append(key)
+        self._available.set()
+        return True
+
+    def get_nowait(self) -> dict:
+        """the next job of the highest priority allowed by the limiter of its api key, or None."""
+        self._next_delay = None
+        for job_type in self._priorities:
+            for api_key, keys in self._queues[job_type].items():
+                if not keys:
+                    continue
+                job = self._index[keys[0]]
+                tokens = self._cost(job)
+                delay = self._limiter.delay(api_key, tokens)
+                if delay is None:
+                    continue
+                if delay > 0:
+                    self._next_delay = delay if self._next_delay is None else min(self._next_delay, delay)
+                    continue
+                del self._index[keys.popleft()]
+                self._limiter.acquire(api_key, tokens)
+                self._in_progress[job['job_id']] = tokens
+                return job
+        return None
+
+    def take(self, holder: dict, count: int) -> list[dict]:
+        """Takes up to count queued jobs of the job type and api key of holder, a job in progress.
+
+        The jobs are processed together with holder, e.g. in one batched request: they share
+        its limiter slot and their estimated tokens are added to it. They must not be released.
+        """
+        keys = self._queues[holder['job_type']].get(holder['api_key'])
+        jobs = []
+        while keys and len(jobs) < count:
+            job = self._index.pop(keys.popleft())
+            tokens = self._cost(job)
+            self._limiter.consume(holder['api_key'], tokens)
+            self._in_progress[holder['job_id']] = self._in_progress.get(holder['job_id'], 0) + tokens
+            jobs.append(job)
+        return jobs
+
+    async def get(self) -> dict:
+        """waits for a job that can be processed and takes a slot of its api key."""
+        while True:
+            job = self.get_nowait()
+            if job is not None:
+                return job
+            self._available.clear()
+            if self._next_delay is None:
+                await self._available.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._available.wait(), self._next_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def release(self, job: dict):
+        """gives back the slot of a job taken with get."""
+        if job['job_id'] not in self._in_progress:
+            return
+        del self._in_progress[job['job_id']]
+        if job['job_id'] in self._suspended:
+            self._suspended.discard(job['job_id'])
+        else:
+            self._limiter.release(job['api_key'])
+        self._available.set()
+
+    def suspend(self, job: dict):
+        """Gives back the limiter slot of a job in progress while it waits, e.g. for more jobs to batch with.
+
+        Its estimated tokens stay consumed. The slot is taken again with `resume`.
+        """
+        if job['job_id'] not in self._in_progress or job['job_id'] in self._suspended:
+            return
+        self._suspended.add(job['job_id'])
+        self._limiter.release(job['api_key'])
+        self._available.set()
+
+    async def resume(self, job: dict):
+        """waits for a limiter slot of the api key of a suspended job and takes it."""
+        if job['job_id'] not in self._suspended:
+            return
+        while not self._limiter.acquire_slot(job['api_key']):
+            self._available.clear()
+            await self._available.wait()
+        self._suspended.discard(job['job_id'])
+
+    def record_usage(self, job: dict, used_tokens: int = None, headers=None):
+        """feeds the limiter with the usage and rate limit headers of a job response."""
+        self._limiter.update_from_headers(job['api_key'], headers)
+        self._limiter.record_usage(job['api_key'], self._in_progress.get(job['job_id'], 0), used_tokens)
+
+    def rate_limited(self, job: dict, retry_after: float = None):
+        """Handles a 429 response of a job in progress: blocks its key and queues it again
+        at the front, so it keeps its turn.
+
+        The slot of the job must still be released.
+        """
+        self._limiter.penalize(job['api_key'], retry_after)
+        self.put(job, front=True)
+
+    def remove(self, predicate) -> int:
+        """Removes queued jobs.
+
+        Args:
+            predicate (callable): called with a job, returns True if the job should be removed.
+
+        Returns:
+            int: number of jobs removed.
+        """
+        removed = [key for key, job in self._index.items() if predicate(job)]
+        if len(removed) == 0:
+            return 0
+        for key in removed:
+            del self._index[key]
+        for job_type, queues in self._queues.items():
+            self._queues[job_type] = {
+                api_key: deque(key for key in keys if key in self._index)
+                for api_key, keys in queues.items()}
+        return len(removed)
@@ -0,0 +1,144 @@
+'''Persistent cache of LLM results, keyed by the hash of the model, prompt and input.'''
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class LLMCache:
+    """sqlite cache of LLM results (summaries, topic names and bullet points).
+
+    Entries expire after `ttl` seconds. When there are more than `max_entries`, the
+    least recently used entries are removed. Values must be json serializable.
+
+    Reads do not write to the database: access times are kept in memory and written
+    when entries are evicted, and expired entries are removed by the eviction.
+    """
+    EVICTION_INTERVAL = 100
+
+    def __init__(self, path: str, ttl: float = 30 * 24 * 3600, max_entries: int = 100_000, clock=time.time):
+        """
+        Args:
+            path (str): sqlite file. ':memory:' keeps the cache in memory.
+            ttl (float, optional): seconds an entry is valid. None never expires. Defaults to 30 days.
+            max_entries (int, optional): maximum number of entries. Defaults to 100000.
+            clock (callable, optional): clock in seconds. Defaults to time.time.
+        """
+        self.logger = logging.getLogger('LLMCache')
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._puts = 0
+        # key -> access time not written yet.
+        self._accessed = dict()
+        self.hits = 0
+        self.misses = 0
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)')
+        self._connection.commit()
+
+    @classmethod
+    def from_config(cls, config: dict, prefix: str = 'MAPLE_CHAT_') -> 'LLMCache':
+        """cache at MAPLE_CHAT_CACHE_PATH with MAPLE_CHAT_CACHE_TTL_DAYS and MAPLE_CHAT_CACHE_MAX_ENTRIES, or None if disabled.
+
+        The cache is disabled when MAPLE_CHAT_CACHE_PATH is an empty string.
+        """
+        path = config.get(f'{prefix}CACHE_PATH', os.path.join('data', 'llm_cache.sqlite'))
+        if not path:
+            return None
+        kwargs = dict()
+        if config.get(f'{prefix}CACHE_TTL_DAYS'):
+            kwargs['ttl'] = float(config[f'{prefix}CACHE_TTL_DAYS']) * 24 * 3600
+        if config.get(f'{prefix}CACHE_MAX_ENTRIES'):
+            kwargs['max_entries'] = int(config[f'{prefix}CACHE_MAX_ENTRIES'])
+        return cls(path, **kwargs)
+
+    @staticmethod
+    def key(kind: str, model_name: str, prompt: str, content) -> str:
+        """sha256 of the kind of result, the model name, the prompt and the input."""
+        data = json.dumps([kind, model_name, prompt, content], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def metrics(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses, hit_rate=self.hit_rate, entries=len(self))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+
+    def get(self, key: str):
+        """the cached value, or None if missing or expired."""
+        now = self._clock()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value, created FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        """stores value. None values are not cached."""
+        if value is None:
+            return
+        now = self._clock()
+        with self._lock:
+            self._accessed.pop(key, None)
+            self._connection.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now, now))
+            self._connection.commit()
+            self._puts += 1
+            if self._puts % self.EVICTION_INTERVAL == 0:
+                self._evict(now)
+
+    def evict(self):
+        """removes expired entries and the least recently used above max_entries."""
+        with self._lock:
+            self._evict(self._clock())
+
+    def _flush_accessed(self):
+        """writes the access times kept in memory."""
+        if len(self._accessed) == 0:
+            return
+        self._connection.executemany(
+            'UPDATE llm_cache SET accessed = ? WHERE key = ?',
+            [(accessed, key) for key, accessed in self._accessed.items()])
+        self._accessed.clear()
+
+    def _evict(self, now: float):
+        self._flush_accessed()
+        if self.ttl is not None:
+            self._connection.execute('DELETE FROM llm_cache WHERE created < ?', (now - self.ttl,))
+        count = self._connection.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        if count > self.max_entries:
+            self._connection.execute(
+                'DELETE FROM llm_cache WHERE key IN '
+                '(SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)',
+                (count - self.max_entries,))
+            self.logger.debug('Evicted %d entries.', count - self.max_entries)
+        self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self._connection.commit()
+            self._connection.close()
@@ -0,0 +1,245 @@
+'''Per api key concurrency and rate limits of LLM jobs.'''
+import json
+import logging
+import re
+import time
+
+
+class KeyLimits:
+    """Limits of an api key.
+
+    Args:
+        max_concurrency (int, optional): jobs in progress at the same time. Defaults to 1.
+        requests_per_minute (float, optional): requests per minute. Defaults to None (taken from the response headers, if any).
+        tokens_per_minute (float, optional): tokens per minute. Defaults to None (taken from the response headers, if any).
+    """
+
+    def __init__(self, max_concurrency: int = 1, requests_per_minute: float = None, tokens_per_minute: float = None):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency should be at least 1')
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+    @classmethod
+    def from_config(cls, config: dict, prefix: str = 'MAPLE_CHAT_') -> 'KeyLimits':
+        """limits from MAPLE_CHAT_MAX_CONCURRENCY, MAPLE_CHAT_REQUESTS_PER_MINUTE and MAPLE_CHAT_TOKENS_PER_MINUTE."""
+        def value(name, type_):
+            raw = config.get(f'{prefix}{name}')
+            return None if raw in (None, '') else type_(raw)
+        return cls(
+            max_concurrency=value('MAX_CONCURRENCY', int) or 1,
+            requests_per_minute=value('REQUESTS_PER_MINUTE', float),
+            tokens_per_minute=value('TOKENS_PER_MINUTE', float),
+        )
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute, holding at most one minute of tokens."""
+
+    def __init__(self, rate_per_minute: float, clock=time.monotonic):
+        self._clock = clock
+        self.rate_per_minute = rate_per_minute
+        self._tokens = rate_per_minute
+        self._updated = clock()
+
+    @property
+    def capacity(self) -> float:
+        return self.rate_per_minute
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_minute / 60)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def delay(self, amount: float) -> float:
+        """seconds until amount can be consumed. Amounts above the capacity only need a full bucket."""
+        self._refill()
+        missing = min(amount, self.capacity) - self._tokens
+        if missing <= 0:
+            return 0.0
+        return missing * 60 / self.rate_per_minute
+
+    def consume(self, amount: float):
+        """consumes amount. Negative amounts give tokens back."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+    def set_remaining(self, remaining: float):
+        """synchronizes the bucket with the remaining quota reported by the provider."""
+        self._refill()
+        self._tokens = min(self._tokens, remaining)
+
+
+def parse_reset(value: str) -> float:
+    """seconds of reset headers such as '1s', '6m0s', '120ms' or '0.5'."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = dict(h=3600, m=60, s=1, ms=0.001)
+    seconds = 0.0
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    for number, unit in parts:
+        seconds += float(number) * units[unit]
+    return seconds
+
+
+def rate_limit_error(exc: Exception) -> tuple:
+    """Checks whether an exception is a 429 response of the provider.
+
+    Returns:
+        tuple: (bool, retry after seconds or None).
+    """
+    status = getattr(exc, 'status_code', None) or getattr(exc, 'status', None)
+    if status != 429:
+        return False, None
+    headers = getattr(exc, 'headers', None)
+    if headers is None and getattr(exc, 'response', None) is not None:
+        headers = getattr(exc.response, 'headers', None)
+    retry_after = None
+    if headers is not None:
+        retry_after = parse_reset(headers.get('retry-after')) or parse_reset(headers.get('x-ratelimit-reset-requests'))
+    return True, retry_after
+
+
+def estimate_job_tokens(job: dict, completion_tokens: int = 500) -> int:
+    """rough token count of a job: 4 characters per token of its details plus the expected completion."""
+    details = job.get('job_details')
+    if isinstance(details, dict) and 'content' in details:
+        details = details['content']
+    text = details if isinstance(details, str) else json.dumps(details, default=str)
+    return len(text) // 4 + completion_tokens
+
+
+class _KeyState:
+    def __init__(self, limits: KeyLimits, clock):
+        self.limits = limits
+        self.in_flight = 0
+        self.requests = None if limits.requests_per_minute is None else TokenBucket(limits.requests_per_minute, clock)
+        self.tokens = None if limits.tokens_per_minute is None else TokenBucket(limits.tokens_per_minute, clock)
+        self.blocked_until = 0.0
+        self.rate_limited = 0
+
+
+class KeyRateLimiter:
+    """Concurrency limit and request/token buckets per api key.
+
+    Buckets without configured limits are created from the limits reported in the
+    response headers. 429 responses block the key for the time requested by the provider,
+    or with an exponential backoff.
+    """
+    BACKOFF_SECONDS = 1.0
+    MAX_BACKOFF_SECONDS = 60.0
+
+    def __init__(self, default: KeyLimits = None, limits: dict = None, clock=time.monotonic):
+        """
+        Args:
+            default (KeyLimits, optional): limits of keys without specific limits. Defaults to KeyLimits().
+            limits (dict, optional): api key -> KeyLimits. Defaults to None.
+            clock (callable, optional): monotonic clock in seconds. Defaults to time.monotonic.
+        """
+        self.logger = logging.getLogger('KeyRateLimiter')
+        self._default = default or KeyLimits()
+        self._limits = limits or dict()
+        self._clock = clock
+        self._states = dict()
+
+    def _state(self, api_key: str) -> _KeyState:
+        if api_key not in self._states:
+            self._states[api_key] = _KeyState(self._limits.get(api_key, self._default), self._clock)
+        return self._states[api_key]
+
+    def in_flight(self, api_key: str) -> int:
+        return self._state(api_key).in_flight
+
+    def delay(self, api_key: str, tokens: int = 0) -> float:
+        """Seconds until a job of api_key with tokens can start.
+
+        Returns:
+            float: 0 if the job can start now, None if the key is at its concurrency limit
+                (it is available again only when a job is released).
+        """
+        state = self._state(api_key)
+        if state.in_flight >= state.limits.max_concurrency:
+            return None
+        delay = max(0.0, state.blocked_until - self._clock())
+        if state.requests is not None:
+            delay = max(delay, state.requests.delay(1))
+        if state.tokens is not None:
+            delay = max(delay, state.tokens.delay(tokens))
+        return delay
+
+    def acquire(self, api_key: str, tokens: int = 0):
+        state = self._state(api_key)
+        state.in_flight += 1
+        if state.requests is not None:
+            state.requests.consume(1)
+        if state.tokens is not None:
+            state.tokens.consume(tokens)
+
+    def acquire_slot(self, api_key: str) -> bool:
+        """Takes a concurrency slot without consuming requests or tokens, e.g. for a job that
+        gave its slot back while waiting.
+
+        Returns:
+            bool: False if the key is at its concurrency limit.
+        """
+        state = self._state(api_key)
+        if state.in_flight >= state.limits.max_concurrency:
+            return False
+        state.in_flight += 1
+        return True
+
+    def consume(self, api_key: str, tokens: int):
+        """consumes tokens of a key without taking a concurrency slot, e.g. for jobs batched with one in progress."""
+        state = self._state(api_key)
+        if state.tokens is not None:
+            state.tokens.consume(tokens)
+
+    def release(self, api_key: str):
+        state = self._state(api_key)
+        state.in_flight = max(0, state.in_flight - 1)
+
+    def record_usage(self, api_key: str, estimated_tokens: int, used_tokens: int):
+        """corrects the token bucket with the tokens reported by the provider."""
+        state = self._state(api_key)
+        state.rate_limited = 0
+        if state.tokens is not None and used_tokens is not None:
+            state.tokens.consume(used_tokens - estimated_tokens)
+
+    def update_from_headers(self, api_key: str, headers):
+        """Synchronizes the buckets with x-ratelimit-* response headers."""
+        if headers is None:
+            return
+        state = self._state(api_key)
+        for kind, bucket_name in [('requests', 'requests'), ('tokens', 'tokens')]:
+            limit = headers.get(f'x-ratelimit-limit-{kind}')
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            try:
+                if getattr(state, bucket_name) is None and limit is not None:
+                    setattr(state, bucket_name, TokenBucket(float(limit), self._clock))
+                if getattr(state, bucket_name) is not None and remaining is not None:
+                    getattr(state, bucket_name).set_remaining(float(remaining))
+            except ValueError:
+                self.logger.warning('Invalid rate limit headers: %s=%s, %s', kind, limit, remaining)
+
+    def penalize(self, api_key: str, retry_after: float = None):
+        """blocks a key after a 429 response."""
+        state = self._state(api_key)
+        state.rate_limited += 1
+        if retry_after is None:
+            retry_after = min(
+                self.MAX_BACKOFF_SECONDS,
+                self.BACKOFF_SECONDS * 2 ** (state.rate_limited - 1))
+        state.blocked_until = max(state.blocked_until, self._clock() + retry_after)
+        self.logger.warning('Rate limited api key. Blocked for %.2fs.', retry_after)
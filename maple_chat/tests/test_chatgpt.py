@@ -1,4 +1,5 @@
 import unittest
 
 
-class TestChatgpt(unittest.TestCase)
\ No newline at end of file
+class TestChatgpt(unittest.TestCase):
+    pass
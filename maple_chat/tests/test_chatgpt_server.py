@@ -0,0 +1,147 @@
+import asyncio
+import unittest
+from unittest import mock
+from maple_structures import Article
+from maple_chatgpt.job_queue import JobQueue
+from maple_chatgpt.llm_cache import LLMCache
+from maple_chatgpt.utils import JobType
+
+try:
+    from maple_chatgpt.chatgpt_server import ChatgptServer
+except ImportError:
+    # socketio and aiohttp are not installed.
+    ChatgptServer = None
+
+
+class RateLimitError(Exception):
+    status_code = 429
+    headers = {'retry-after': '30'}
+
+
+class FakeLLMProcess:
+    """LLMProcess of a backend accepting several articles per request."""
+    summary_prompt = 'summarize'
+    supports_batch_summary = True
+    requests = []
+    get_summaries_result = None
+
+    def __init__(self, config=None, response_hook=None):
+        pass
+
+    def get_model_type(self):
+        return 'personalized'
+
+    def get_model_name(self):
+        return 'model'
+
+    async def get_summaries(self, contents, api_key):
+        FakeLLMProcess.requests.append(list(contents))
+        return FakeLLMProcess.get_summaries_result(contents)
+
+
+class FakeAsyncMapleAPI:
+    def __init__(self, articles: list[Article]):
+        self.articles = {article.uuid: article for article in articles}
+        self.updated = []
+
+    async def article_get(self, uuid=None, **kwargs):
+        return [self.articles[uuid]] if uuid in self.articles else []
+
+    async def article_put(self, article):
+        self.updated.append((article.uuid, article.chat_summary))
+        return article
+
+
+def summary_job(uuid):
+    return dict(sid=None, job_type=JobType.summary, api_key='key', job_details=dict(uuid=uuid))
+
+
+@unittest.skipIf(ChatgptServer is None, 'socketio or aiohttp is not installed')
+class TestSummaryBatch(unittest.TestCase):
+    def setUp(self):
+        FakeLLMProcess.requests = []
+        FakeLLMProcess.get_summaries_result = staticmethod(
+            lambda contents: [f'summary of {content}' for content in contents])
+        patcher = mock.patch('maple_chatgpt.chatgpt_server.LLMProcess', FakeLLMProcess)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.addCleanup(self.loop.close)
+        self.server = ChatgptServer(
+            maple_api=mock.MagicMock(),
+            socket_io_ip='localhost',
+            socket_io_port=0,
+            socket_io_api_key='socket-key',
+            llm_cache=LLMCache(':memory:'),
+            summary_batch_size=3,
+            summary_batch_window=0)
+        self.server.emit = mock.AsyncMock()
+        articles = []
+        for uuid in '12345':
+            article = Article()
+            article.uuid = uuid
+            article.content = f'content {uuid}'
+            articles.append(article)
+        self.maple = FakeAsyncMapleAPI(articles)
+        self.server.async_maple_api = self.maple
+
+    def process(self, uuids: str):
+        for uuid in uuids:
+            self.server.job_queue.put(summary_job(uuid))
+        holder = self.server.job_queue.get_nowait()
+        self.loop.run_until_complete(self.server._process_job_summary_batch(holder))
+        self.server.job_queue.release(holder)
+
+    def queued(self) -> list[str]:
+        return [key[3] for key in self.server.job_queue._queues[JobType.summary].get('key', [])]
+
+    def test_results_saved_to_articles(self):
+        self.process('1234')
+        self.assertEqual(FakeLLMProcess.requests, [['content 1', 'content 2', 'content 3']])
+        self.assertEqual(sorted(self.maple.updated), [
+            ('1', 'summary of content 1'),
+            ('2', 'summary of content 2'),
+            ('3', 'summary of content 3'),
+        ])
+        self.assertEqual(self.server.emit.await_count, 3)
+        self.assertEqual(self.queued(), ['4'])
+
+    def test_cached_summaries_not_sent(self):
+        cache = self.server.llm_cache
+        cache.put(cache.key(JobType.summary, 'personalized/model', 'summarize', 'content 2'), 'cached summary')
+        self.process('123')
+        self.assertEqual(FakeLLMProcess.requests, [['content 1', 'content 3']])
+        self.assertEqual(sorted(self.maple.updated), [
+            ('1', 'summary of content 1'),
+            ('2', 'cached summary'),
+            ('3', 'summary of content 3'),
+        ])
+
+    def test_rate_limited_batch_queued_first(self):
+        def rate_limited(contents):
+            raise RateLimitError()
+
+        FakeLLMProcess.get_summaries_result = staticmethod(rate_limited)
+        self.process('1234')
+        self.assertEqual(self.maple.updated, [])
+        # the jobs of the batch keep their turn, before the jobs queued after them.
+        self.assertEqual(self.queued(), ['1', '2', '3', '4'])
+        self.assertEqual(self.server.job_queue.in_progress, 0)
+        self.assertGreater(self.server.rate_limiter.delay('key'), 0)
+
+    def test_result_count_mismatch(self):
+        FakeLLMProcess.get_summaries_result = staticmethod(lambda contents: ['only one'])
+        with self.assertLogs('ChatgptServer', level='ERROR'):
+            self.process('123')
+        self.assertEqual(self.maple.updated, [])
+
+
+class TestJobKey(unittest.TestCase):
+    def test_summary_job_key(self):
+        self.assertEqual(JobQueue.key(summary_job('1')), (None, JobType.summary, 'key', '1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import asyncio
+import unittest
+from maple_chatgpt.job_queue import JobQueue
+from maple_chatgpt.utils import JobType
+
+
+def job(job_type, api_key='key', uuid='1', sid=None):
+    return dict(sid=sid, job_type=job_type, api_key=api_key, job_details=dict(uuid=uuid))
+
+
+class TestJobQueue(unittest.TestCase):
+    def test_priority_and_order(self):
+        queue = JobQueue()
+        queue.put(job(JobType.summary, api_key='a', uuid='1'))
+        queue.put(job(JobType.summary, api_key='b', uuid='2'))
+        queue.put(job(JobType.topic_name, api_key='c', uuid='3'))
+        uuids = [queue.get_nowait()['job_details']['uuid'] for _ in range(3)]
+        self.assertEqual(uuids, ['3', '1', '2'])
+        self.assertIsNone(queue.get_nowait())
+
+    def test_duplicates(self):
+        queue = JobQueue()
+        self.assertTrue(queue.put(job(JobType.summary)))
+        self.assertFalse(queue.put(job(JobType.summary)))
+        self.assertEqual(len(queue), 1)
+        taken = queue.get_nowait()
+        # a job in progress can be queued again.
+        self.assertTrue(queue.put(taken))
+
+    def test_duplicates_by_uuid(self):
+        queue = JobQueue()
+        first = job(JobType.summary, uuid='1')
+        first['job_details']['content'] = 'content ' * 1000
+        self.assertTrue(queue.put(first))
+        # the key does not hold the content of the article.
+        self.assertEqual(JobQueue.key(first), (None, JobType.summary, 'key', '1'))
+        self.assertFalse(queue.put(job(JobType.summary, uuid='1')))
+        self.assertTrue(queue.put(job(JobType.summary, uuid='1', sid='other')))
+        self.assertIn(job(JobType.summary, uuid='1'), queue)
+        # details without uuid are compared by content.
+        self.assertTrue(queue.put(dict(sid=None, job_type=JobType.summary, api_key='key', job_details=['a'])))
+        self.assertFalse(queue.put(dict(sid=None, job_type=JobType.summary, api_key='key', job_details=['a'])))
+
+    def test_one_job_per_key(self):
+        queue = JobQueue()
+        queue.put(job(JobType.summary, uuid='1'))
+        queue.put(job(JobType.summary, uuid='2'))
+        first = queue.get_nowait()
+        self.assertIsNone(queue.get_nowait())
+        queue.release(first)
+        self.assertEqual(queue.get_nowait()['job_details']['uuid'], '2')
+
+    def test_take_batch(self):
+        queue = JobQueue()
+        for uuid in '123':
+            queue.put(job(JobType.summary, uuid=uuid))
+        queue.put(job(JobType.summary, api_key='other', uuid='4'))
+        holder = queue.get_nowait()
+        taken = queue.take(holder, 5)
+        # only the jobs of the same type and api key, sharing the slot of holder.
+        self.assertEqual([job_['job_details']['uuid'] for job_ in taken], ['2', '3'])
+        self.assertEqual(queue.in_progress, 1)
+        queue.release(holder)
+        self.assertEqual(queue.get_nowait()['job_details']['uuid'], '4')
+
+    def test_rate_limited_job_first(self):
+        queue = JobQueue()
+        for uuid in '123':
+            queue.put(job(JobType.summary, uuid=uuid))
+        first = queue.get_nowait()
+        queue.rate_limited(first, retry_after=0)
+        # the job is identified by its job_id, not by the dict holding it.
+        queue.release(dict(first))
+        self.assertEqual(queue.in_progress, 0)
+        self.assertEqual(queue.get_nowait()['job_details']['uuid'], '1')
+
+    def test_job_ids(self):
+        queue = JobQueue()
+        queue.put(job(JobType.summary, uuid='1'))
+        queue.put(job(JobType.summary, api_key='other', uuid='2'))
+        first = queue.get_nowait()
+        second = queue.get_nowait()
+        self.assertNotEqual(first['job_id'], second['job_id'])
+        self.assertEqual(queue.in_progress, 2)
+        queue.release(second)
+        self.assertEqual(queue.in_progress, 1)
+
+    def test_suspend_and_resume(self):
+        async def run():
+            queue = JobQueue()
+            queue.put(job(JobType.summary, uuid='1'))
+            queue.put(job(JobType.summary, uuid='2'))
+            first = await queue.get()
+            # the slot is free while first waits.
+            queue.suspend(first)
+            second = await asyncio.wait_for(queue.get(), 1)
+            resumed = asyncio.create_task(queue.resume(first))
+            await asyncio.sleep(0.01)
+            self.assertFalse(resumed.done())
+            queue.release(second)
+            await asyncio.wait_for(resumed, 1)
+            self.assertEqual(queue.limiter.in_flight('key'), 1)
+            queue.release(first)
+            self.assertEqual(queue.limiter.in_flight('key'), 0)
+            self.assertEqual(queue.in_progress, 0)
+
+        asyncio.run(run())
+
+    def test_remove(self):
+        queue = JobQueue()
+        queue.put(job(JobType.topic_name, uuid='1', sid='s1'))
+        queue.put(job(JobType.summary, uuid='2', sid='s1'))
+        queue.put(job(JobType.topic_name, uuid='3', sid='s2'))
+        removed = queue.remove(lambda queued: queued['sid'] == 's1' and queued['job_type'] != JobType.summary)
+        self.assertEqual(removed, 1)
+        self.assertEqual(queue.get_nowait()['job_details']['uuid'], '3')
+
+    def test_get_waits_for_put(self):
+        async def run():
+            queue = JobQueue()
+            consumer = asyncio.create_task(queue.get())
+            await asyncio.sleep(0.01)
+            self.assertFalse(consumer.done())
+            queue.put(job(JobType.summary))
+            return await asyncio.wait_for(consumer, 1)
+
+        self.assertEqual(asyncio.run(run())['job_details']['uuid'], '1')
+
+    def test_get_waits_for_release(self):
+        async def run():
+            queue = JobQueue()
+            queue.put(job(JobType.summary, uuid='1'))
+            queue.put(job(JobType.summary, uuid='2'))
+            first = await queue.get()
+            consumer = asyncio.create_task(queue.get())
+            await asyncio.sleep(0.01)
+            self.assertFalse(consumer.done())
+            queue.release(first)
+            return await asyncio.wait_for(consumer, 1)
+
+        self.assertEqual(asyncio.run(run())['job_details']['uuid'], '2')
+
+
+if __name__ == '__main__':
+    unittest.main()
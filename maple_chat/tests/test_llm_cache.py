@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from maple_chatgpt.llm_cache import LLMCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLLMCache(unittest.TestCase):
+    def test_get_put_and_metrics(self):
+        cache = LLMCache(':memory:')
+        key = LLMCache.key('topic_name', 'ChatGPT/ChatGPT', 'prompt', ['a', 'b'])
+        self.assertNotEqual(key, LLMCache.key('topic_name', 'ChatGPT/ChatGPT', 'other prompt', ['a', 'b']))
+        self.assertIsNone(cache.get(key))
+        cache.put(key, ['first', 'second'])
+        self.assertEqual(cache.get(key), ['first', 'second'])
+        cache.put(LLMCache.key('summary', 'm', 'p', 'c'), None)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.metrics(), dict(hits=1, misses=1, hit_rate=0.5, entries=1))
+
+    def test_ttl_and_lru(self):
+        clock = FakeClock()
+        cache = LLMCache(':memory:', ttl=10, max_entries=2, clock=clock)
+        for name in 'abc':
+            clock.now += 1
+            cache.put(name, name)
+        clock.now += 1
+        cache.get('a')
+        cache.evict()
+        # b was the least recently used.
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'a')
+        clock.now = 20
+        self.assertIsNone(cache.get('c'))
+
+    def test_get_does_not_write(self):
+        clock = FakeClock()
+        cache = LLMCache(':memory:', ttl=10, max_entries=1, clock=clock)
+        cache.put('a', 'a')
+        clock.now += 1
+        cache.put('b', 'b')
+        changes = cache._connection.total_changes
+        clock.now += 1
+        self.assertEqual(cache.get('a'), 'a')
+        clock.now = 30
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache._connection.total_changes, changes)
+        # the access time of a is written on eviction, so b is the least recently used.
+        clock.now = 5
+        cache.evict()
+        self.assertEqual(cache.get('a'), 'a')
+        self.assertIsNone(cache.get('b'))
+
+    def test_access_times_kept_on_close(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.sqlite')
+            clock = FakeClock()
+            cache = LLMCache(path, clock=clock)
+            cache.put('a', 'a')
+            clock.now = 5
+            cache.get('a')
+            cache.close()
+            connection = sqlite3.connect(path)
+            accessed = connection.execute("SELECT accessed FROM llm_cache WHERE key = 'a'").fetchone()[0]
+            connection.close()
+            self.assertEqual(accessed, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from maple_chatgpt.job_queue import JobQueue
+from maple_chatgpt.rate_limit import KeyLimits, KeyRateLimiter, TokenBucket, parse_reset, rate_limit_error
+from maple_chatgpt.utils import JobType
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitedError(Exception):
+    def __init__(self, headers):
+        super().__init__('429')
+        self.status_code = 429
+        self.headers = headers
+
+
+def job(uuid, api_key='key'):
+    return dict(sid=None, job_type=JobType.summary, api_key=api_key, job_details=dict(uuid=uuid))
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_token_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock)
+        bucket.consume(60)
+        self.assertAlmostEqual(bucket.delay(30), 30)
+        clock.now = 30
+        self.assertEqual(bucket.delay(30), 0)
+        # amounts above the capacity only wait for a full bucket.
+        self.assertAlmostEqual(bucket.delay(1000), 30)
+
+    def test_parse_reset(self):
+        self.assertEqual(parse_reset('6m0s'), 360)
+        self.assertAlmostEqual(parse_reset('120ms'), 0.12)
+        self.assertEqual(parse_reset('2'), 2)
+        self.assertIsNone(parse_reset('soon'))
+
+    def test_rate_limit_error(self):
+        self.assertEqual(rate_limit_error(RateLimitedError({'retry-after': '3'})), (True, 3))
+        self.assertEqual(rate_limit_error(ValueError()), (False, None))
+
+    def test_concurrency_and_requests(self):
+        clock = FakeClock()
+        limiter = KeyRateLimiter(KeyLimits(max_concurrency=2, requests_per_minute=2), clock=clock)
+        queue = JobQueue(limiter=limiter, cost=lambda job: 0)
+        for uuid in '123':
+            queue.put(job(uuid))
+        first, second = queue.get_nowait(), queue.get_nowait()
+        queue.release(first)
+        queue.release(second)
+        # the request bucket is empty, the third job waits until it refills.
+        self.assertIsNone(queue.get_nowait())
+        clock.now = 30
+        self.assertEqual(queue.get_nowait()['job_details']['uuid'], '3')
+
+    def test_headers_and_429(self):
+        clock = FakeClock()
+        limiter = KeyRateLimiter(clock=clock)
+        queue = JobQueue(limiter=limiter, cost=lambda job: 100)
+        queue.put(job('1'))
+        taken = queue.get_nowait()
+        queue.record_usage(taken, 150, {
+            'x-ratelimit-limit-tokens': '1000',
+            'x-ratelimit-remaining-tokens': '100'})
+        queue.release(taken)
+        # 100 remaining tokens, minus 50 tokens above the estimate, refilled at 1000 per minute.
+        self.assertAlmostEqual(limiter.delay('key', 100), 3)
+
+        clock.now = 3
+        queue.put(job('2'))
+        taken = queue.get_nowait()
+        # a 429 blocks the key for retry-after seconds and enqueues the job again.
+        queue.rate_limited(taken, 5)
+        queue.release(taken)
+        self.assertEqual(len(queue), 1)
+        self.assertIsNone(queue.get_nowait())
+        # blocked until 8s, and the token bucket is refilled at 9s.
+        clock.now = 8
+        self.assertIsNone(queue.get_nowait())
+        clock.now = 9
+        self.assertEqual(queue.get_nowait()['job_details']['uuid'], '2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,2 +1,12 @@
 '''Maple interface communicates with backend'''
 from .maple import MapleAPI, Articles
+from .retry import RetryPolicy
+
+
+def __getattr__(name):
+    # AsyncMapleAPI is imported on first access so that sync users do not load httpx.
+    if name == 'AsyncMapleAPI':
+        from .maple_async import AsyncMapleAPI
+        globals()[name] = AsyncMapleAPI
+        return AsyncMapleAPI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,17 +1,67 @@
 from typing import Union, List
 import logging
+import queue
+import threading
+import timeit
 import requests
 from requests import exceptions as request_exc
+from requests.adapters import HTTPAdapter
 from maple_structures import Article
+from maple_structures import ArticleLite
 from maple_structures import Topic
 from maple_structures import Model
 from maple_structures import ModelIteration
 from maple_structures import Processed
+from maple_structures import ProcessedBatch
+from .retry import RetryPolicy
 
 logger = logging.getLogger("MapleAPI")
 
 
+def _fetch_articles_page(mapleapi, limit: int, page: int, hours: int, skip: int, fields: list[str] = None):
+    """returns the articles of a page or None when there are no more articles."""
+    articles = mapleapi.article_get(
+        limit=limit,
+        page=page,
+        hours=hours,
+        skip=skip,
+        fields=fields,
+        )
+
+    if isinstance(articles, requests.Response):
+        return None
+    if len(articles) == 0:
+        return None
+    return articles
+
+
+def _prefetch_articles_pages(mapleapi, limit, page, hours, skip, fields, pages: queue.Queue, stop: threading.Event):
+    """fetches pages into a queue until there are no more articles or stop is set."""
+    while not stop.is_set():
+        try:
+            articles = _fetch_articles_page(mapleapi, limit, page, hours, skip, fields)
+        except Exception as exc:
+            articles = exc
+        # wait for space in the queue, unless the consumer stopped.
+        while not stop.is_set():
+            try:
+                pages.put(articles, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        if articles is None or isinstance(articles, Exception):
+            return
+        page += 1
+
+
 class Articles:
+    """Iterates through pages of articles.
+
+    When prefetch is larger than 0, a background thread keeps up to `prefetch` pages
+    fetched and deserialized ahead of the consumer. When fields is provided, pages hold
+    ArticleLite objects with only those fields.
+    """
+
     def __init__(
         self,
         mapleapi,
@@ -19,6 +69,8 @@ class Articles:
         page: int = 0,
         hours: int = None,
         skip : int = None,
+        prefetch: int = 0,
+        fields: list[str] = None,
     ) -> None:
         self._mapleapi = mapleapi
         self._limit = limit
@@ -26,78 +78,203 @@ class Articles:
         self._page = page
         self._hours = hours
         self._skip = skip
+        self._prefetch = prefetch
+        self._fields = fields
+        self._queue = None
+        self._stop = None
+        # set when the pages are exhausted or the iterator is closed, until iterated again.
+        self._closed = False
 
     def __iter__(self):
+        self.close()
+        self._closed = False
         self._page = self._page_start
         # if self._page is not None:
         #     self._page +=1
+        if self._prefetch > 0:
+            self._stop = threading.Event()
+            self._queue = queue.Queue(maxsize=self._prefetch)
+            # the thread does not reference self, so an abandoned iterator is
+            # garbage collected and stops the thread through __del__.
+            threading.Thread(
+                target=_prefetch_articles_pages,
+                args=(
+                    self._mapleapi,
+                    self._limit,
+                    self._page_start,
+                    self._hours,
+                    self._skip,
+                    self._fields,
+                    self._queue,
+                    self._stop),
+                name='ArticlesPrefetch',
+                daemon=True,
+            ).start()
         return self
 
     def __next__(self):
-        articles = self._mapleapi.article_get(
-            limit=self._limit,
-            page=self._page,
-            hours=self._hours,
-            skip=self._skip,
-            )
-
-        if isinstance(articles, requests.Response):
+        if self._closed:
             raise StopIteration
-        if len(articles) == 0:
+        if self._queue is not None:
+            articles = self._queue.get()
+            if isinstance(articles, Exception):
+                self.close()
+                raise articles
+            if articles is None:
+                self.close()
+                raise StopIteration
+            return articles
+
+        articles = _fetch_articles_page(
+            self._mapleapi, self._limit, self._page, self._hours, self._skip, self._fields)
+        if articles is None:
+            self.close()
             raise StopIteration
         self._page += 1
         return articles
 
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """stops the prefetching thread, if any. Next calls to next raise StopIteration."""
+        self._closed = True
+        if self._stop is not None:
+            self._stop.set()
+        self._stop = None
+        self._queue = None
+
 
 class MapleAPI:
-    def __init__(self, authority, *, apiversion="api/v1", suppress_errors=True) -> None:
+    def __init__(
+        self,
+        authority,
+        *,
+        apiversion="api/v1",
+        suppress_errors=True,
+        pool_size: int = 10,
+        retry_policy: RetryPolicy = None,
+        trusted_backend: bool = False,
+    ) -> None:
+        """Client for the maple backend.
+
+        Args:
+            authority (str): scheme, host and port of the backend, e.g. http://localhost:3000
+            apiversion (str, optional): Defaults to "api/v1".
+            suppress_errors (bool, optional): Defaults to True.
+            pool_size (int, optional): number of keep-alive connections kept by the session. Defaults to 10.
+            retry_policy (RetryPolicy, optional): retries and backoff used with retry_policy.call. The session itself does not retry. Defaults to RetryPolicy().
+            trusted_backend (bool, optional): articles from the backend are decoded without validation. Defaults to False.
+        """
         self._authority = authority
         self._apiversion = apiversion
         self._suppress_errors = suppress_errors
+        self._pool_size = pool_size
+        self._retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._trusted_backend = trusted_backend
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._latency = dict()
+        self._latency_lock = threading.Lock()
 
     @property
     def baseurl(self):
         """baseurl is the encoded url"""
         return f"{self._authority}/{self._apiversion}"
 
-    def _post(self, path: str, headers=None, params=None, body=None, timeout=10):
+    @property
+    def authority(self):
+        return self._authority
+
+    @property
+    def apiversion(self):
+        return self._apiversion
+
+    @property
+    def trusted_backend(self):
+        return self._trusted_backend
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self._retry_policy
+
+    @property
+    def session(self) -> requests.Session:
+        """keep-alive session shared by all requests of this client."""
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self._pool_size,
+                    pool_maxsize=self._pool_size,
+                    # retries are done by retry_policy.call only, so they are not multiplied.
+                    max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def close(self):
+        """closes the connections of the session."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    @property
+    def latency(self) -> dict:
+        """latency counters per endpoint, e.g. latency['GET article']['mean']."""
+        with self._latency_lock:
+            out = dict()
+            for endpoint, counter in self._latency.items():
+                out[endpoint] = dict(counter)
+                out[endpoint]['mean'] = counter['total'] / counter['count'] if counter['count'] else 0
+            return out
+
+    def reset_latency(self):
+        with self._latency_lock:
+            self._latency = dict()
+
+    def _record_latency(self, endpoint: str, elapsed: float, failed: bool):
+        with self._latency_lock:
+            counter = self._latency.setdefault(
+                endpoint, dict(count=0, errors=0, total=0.0, max=0.0))
+            counter['count'] += 1
+            counter['total'] += elapsed
+            counter['max'] = max(counter['max'], elapsed)
+            if failed:
+                counter['errors'] += 1
+
+    def _request(self, method: str, path: str, url: str, **kwargs):
         response = requests.Response()
+        failed = True
+        tstart = timeit.default_timer()
         try:
-            url = f"{self.baseurl}/{path}"
-            response = requests.post(
-                url, headers=headers, params=params, json=body, timeout=timeout)
+            response = self.session.request(method, url, **kwargs)
+            failed = not response.ok
         except Exception as exc:
-            logger.error(f"post: {url}. {exc}")
+            logger.error(f"{method.lower()}: {url}. {exc}")
+        self._record_latency(f"{method} {path}", timeit.default_timer() - tstart, failed)
         return response
 
+    def _post(self, path: str, headers=None, params=None, body=None, timeout=10):
+        return self._request(
+            'POST', path, f"{self.baseurl}/{path}",
+            headers=headers, params=params, json=body, timeout=timeout)
+
     def _put(self, path: str, headers=None, params=None, body=None, timeout=10):
-        response = requests.Response()
-        try:
-            url = f"{self.baseurl}/{path}"
-            response = requests.put(
-                url=url, headers=headers, params=params, json=body, timeout=timeout)
-        except Exception as exc:
-            logger.error(exc)
-        return response
+        return self._request(
+            'PUT', path, f"{self.baseurl}/{path}",
+            headers=headers, params=params, json=body, timeout=timeout)
 
     def _get(self, path: str, headers=None, params=None, timeout=10):
-        response = requests.Response()
-        try:
-            url = f"{self.baseurl}/{path}"
-            response = requests.get(
-                url=url, headers=headers, params=params, timeout=timeout)
-        except Exception as exc:
-            logger.error(exc)
-        return response
+        return self._request(
+            'GET', path, f"{self.baseurl}/{path}",
+            headers=headers, params=params, timeout=timeout)
 
     def _delete(self, path: str, uuid: str, timeout=10):
-        response = requests.Response()
-        try:
-            url = f"{self.baseurl}/{path}/{uuid}"
-            response = requests.delete(url=url, timeout=timeout)
-        except Exception as exc:
-            logger.error(exc)
-        return response
+        return self._request(
+            'DELETE', path, f"{self.baseurl}/{path}/{uuid}", timeout=timeout)
 
     def config_get(self):
         response = self._get("config")
@@ -118,7 +295,7 @@ class MapleAPI:
             if response.status_code != 201:
                 return response
             try:
-                return Article.from_json(response.json())
+                return Article.from_json(response.json(), trusted=self._trusted_backend)
             except request_exc.ConnectionError as exc:
                 logger.error("No connection to backend server. %s", exc)
             except Exception as exc:
@@ -136,7 +313,7 @@ class MapleAPI:
         if response.status_code is not None:
             if response.status_code == 200:
                 try:
-                    return Article.from_json(response.json())
+                    return Article.from_json(response.json(), trusted=self._trusted_backend)
                 except:
                     return response
         return response
@@ -148,7 +325,15 @@ class MapleAPI:
             hours: int = None,
             url: str = None,
             uuid: str = None,
-            skip: int = None):
+            skip: int = None,
+            fields: list[str] = None):
+        '''retrieves articles.
+
+        Args:
+            fields (list[str], optional): returns ArticleLite objects holding only these fields instead of Article. Defaults to None.
+        '''
+        if fields is not None:
+            ArticleLite.validate_fields(fields)
         params = dict()
         if limit is not None:
             params["limit"] = limit
@@ -170,7 +355,10 @@ class MapleAPI:
                 articles_json = response.json()
                 ret = []
                 for article_json in articles_json:
-                    ret.append(Article.from_json(article_json))
+                    if fields is not None:
+                        ret.append(ArticleLite.from_json(article_json, fields))
+                    else:
+                        ret.append(Article.from_json(article_json, trusted=self._trusted_backend))
                 return ret
             except Exception as exc:
                 logger.error(exc)
@@ -187,14 +375,30 @@ class MapleAPI:
                 logger.error(exc)
                 return 0
     
-    def article_iterator(self, limit: int = 100, page: int = None, hours: int = None, skip: int = None):
-        '''function to iterate through articles.'''
+    def article_iterator(
+            self,
+            limit: int = 100,
+            page: int = None,
+            hours: int = None,
+            skip: int = None,
+            prefetch: int = 0,
+            fields: list[str] = None):
+        '''function to iterate through articles.
+
+        Args:
+            prefetch (int, optional): number of pages fetched ahead in a background thread. Defaults to 0 (no prefetching).
+            fields (list[str], optional): pages hold ArticleLite objects with only these fields. Defaults to None.
+        '''
+        if fields is not None:
+            ArticleLite.validate_fields(fields)
         return iter(Articles(
             self,
             limit=limit if limit is not None else 100,
             page=page if page is not None else 0,
             hours=hours,
-            skip=skip))
+            skip=skip,
+            prefetch=prefetch,
+            fields=fields))
         # while True:
         #     articles = self.article_get(limit, page, hours)
         #     if isinstance(articles, requests.Response):
@@ -382,11 +586,15 @@ class MapleAPI:
         response = self._delete(path="model-iteration", uuid=uuid, timeout=timeout)
         return response.status_code
 
-    def processed_post_many(self, processed: list[Processed]):
+    def processed_post_many(self, processed: Union[list[Processed], ProcessedBatch]):
+        if isinstance(processed, ProcessedBatch):
+            body = processed.to_list()
+        else:
+            body = [proc.to_dict() for proc in processed]
         response = self._post(
             "processed/many", 
             params=None,
-            body=[proc.to_dict() for proc in processed])
+            body=body)
         
         if response.ok:
             if response.status_code != 201:
@@ -418,7 +626,7 @@ class MapleAPI:
                 raise ConnectionError()
             return {}
 
-    def processed_get(self, model_iteration_uuid: str, limit: int = None, skip: int= None , as_json: bool = False ):
+    def processed_get(self, model_iteration_uuid: str, limit: int = None, skip: int= None , as_json: bool = False, as_batch: bool = False):
         params = dict()
         params['modelIteration'] = model_iteration_uuid
         params['limit'] = limit
@@ -432,6 +640,8 @@ class MapleAPI:
                 processed_json = response.json()
                 if as_json:
                     return processed_json
+                if as_batch:
+                    return ProcessedBatch.from_list(processed_json)
                 ret = []
                 for proc_json in processed_json:
                     ret.append(Processed.from_dict(proc_json))
@@ -0,0 +1,522 @@
+'''Asynchronous client to communicate with the backend.'''
+from typing import List, Union
+import asyncio
+from collections import deque
+import logging
+import math
+import timeit
+import httpx
+from maple_structures import Article
+from maple_structures import ArticleLite
+from maple_structures import Topic
+from maple_structures import Model
+from maple_structures import ModelIteration
+from maple_structures import Processed
+from maple_structures import ProcessedBatch
+from .retry import RetryPolicy
+
+logger = logging.getLogger("AsyncMapleAPI")
+
+
+class AsyncMapleAPI:
+    """Asynchronous counterpart of MapleAPI built on httpx.
+
+    Methods have the same names and arguments as MapleAPI and return the same structures,
+    plus processed_get_all. Failed requests return an httpx.Response (status_code 0 when no
+    response was received). Requests are retried by `_request` following the retry policy;
+    the httpx transport does not retry.
+    """
+
+    def __init__(
+        self,
+        authority,
+        *,
+        apiversion="api/v1",
+        suppress_errors=True,
+        pool_size: int = 10,
+        retry_policy: RetryPolicy = None,
+        trusted_backend: bool = False,
+    ) -> None:
+        self._authority = authority
+        self._apiversion = apiversion
+        self._suppress_errors = suppress_errors
+        self._pool_size = pool_size
+        self._retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._trusted_backend = trusted_backend
+        self._client = None
+        self._latency = dict()
+
+    @classmethod
+    def from_maple_api(cls, maple_api, **kwargs):
+        """creates an AsyncMapleAPI with the same configuration of a MapleAPI."""
+        kwargs.setdefault('apiversion', maple_api.apiversion)
+        kwargs.setdefault('retry_policy', maple_api.retry_policy)
+        kwargs.setdefault('trusted_backend', maple_api.trusted_backend)
+        return cls(maple_api.authority, **kwargs)
+
+    @property
+    def baseurl(self):
+        """baseurl is the encoded url"""
+        return f"{self._authority}/{self._apiversion}"
+
+    @property
+    def authority(self):
+        return self._authority
+
+    @property
+    def apiversion(self):
+        return self._apiversion
+
+    @property
+    def trusted_backend(self):
+        return self._trusted_backend
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self._retry_policy
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """keep-alive client shared by all requests. Created on first use inside the running loop."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self._pool_size,
+                    max_keepalive_connections=self._pool_size),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    @property
+    def latency(self) -> dict:
+        """latency counters per endpoint, e.g. latency['GET article']['mean']."""
+        out = dict()
+        for endpoint, counter in self._latency.items():
+            out[endpoint] = dict(counter)
+            out[endpoint]['mean'] = counter['total'] / counter['count'] if counter['count'] else 0
+        return out
+
+    def reset_latency(self):
+        self._latency = dict()
+
+    def _record_latency(self, endpoint: str, elapsed: float, failed: bool):
+        counter = self._latency.setdefault(
+            endpoint, dict(count=0, errors=0, total=0.0, max=0.0))
+        counter['count'] += 1
+        counter['total'] += elapsed
+        counter['max'] = max(counter['max'], elapsed)
+        if failed:
+            counter['errors'] += 1
+
+    async def _request(self, method: str, path: str, url: str, **kwargs) -> httpx.Response:
+        response = httpx.Response(status_code=0)
+        attempt = 0
+        tstart = timeit.default_timer()
+        while True:
+            attempt += 1
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code not in self._retry_policy.status_forcelist:
+                    break
+                if method not in self._retry_policy.allowed_methods:
+                    break
+            except Exception as exc:
+                logger.error(f"{method.lower()}: {url}. {exc}")
+                if method not in self._retry_policy.allowed_methods:
+                    break
+            max_attempts = self._retry_policy.max_attempts
+            if max_attempts is not None and attempt >= max_attempts:
+                break
+            await asyncio.sleep(self._retry_policy.wait_time(attempt))
+        self._record_latency(
+            f"{method} {path}", timeit.default_timer() - tstart, not response.is_success)
+        return response
+
+    async def _post(self, path: str, headers=None, params=None, body=None, timeout=10):
+        return await self._request(
+            'POST', path, f"{self.baseurl}/{path}",
+            headers=headers, params=params, json=body, timeout=timeout)
+
+    async def _put(self, path: str, headers=None, params=None, body=None, timeout=10):
+        return await self._request(
+            'PUT', path, f"{self.baseurl}/{path}",
+            headers=headers, params=params, json=body, timeout=timeout)
+
+    async def _get(self, path: str, headers=None, params=None, timeout=10):
+        return await self._request(
+            'GET', path, f"{self.baseurl}/{path}",
+            headers=headers, params=params, timeout=timeout)
+
+    async def _delete(self, path: str, uuid: str, timeout=10):
+        return await self._request(
+            'DELETE', path, f"{self.baseurl}/{path}/{uuid}", timeout=timeout)
+
+    async def config_get(self):
+        response = await self._get("config")
+        if response.status_code != 200:
+            return response
+        try:
+            return response.json()
+        except Exception as exc:
+            logger.error(exc)
+            return {}
+
+    async def article_post(self, article: Article):
+        "Posts an article in the database."
+        response = await self._post("article", body=article.to_dict())
+        if response.status_code != 201:
+            return response
+        try:
+            return Article.from_json(response.json(), trusted=self._trusted_backend)
+        except Exception as exc:
+            if self._suppress_errors:
+                return None
+            raise exc
+
+    async def article_put(self, article: Article) -> Article:
+        response = await self._put("article", body=article.to_dict())
+        if response.status_code == 200:
+            try:
+                return Article.from_json(response.json(), trusted=self._trusted_backend)
+            except Exception:
+                return response
+        return response
+
+    async def article_get(
+            self,
+            limit: int = None,
+            page: int = None,
+            hours: int = None,
+            url: str = None,
+            uuid: str = None,
+            skip: int = None,
+            fields: list[str] = None):
+        if fields is not None:
+            ArticleLite.validate_fields(fields)
+        params = dict()
+        for key, value in dict(limit=limit, page=page, hours=hours, url=url, uuid=uuid, skip=skip).items():
+            if value is not None:
+                params[key] = value
+        response = await self._get("article", params=params)
+        if response.status_code != 200:
+            return response
+        try:
+            if fields is not None:
+                return [ArticleLite.from_json(article_json, fields) for article_json in response.json()]
+            return [Article.from_json(article_json, trusted=self._trusted_backend) for article_json in response.json()]
+        except Exception as exc:
+            logger.error(exc)
+            return []
+
+    async def article_count_get(self) -> int:
+        response = await self._get("article/count")
+        if response.status_code != 200:
+            return response
+        try:
+            return response.json()
+        except Exception as exc:
+            logger.error(exc)
+            return 0
+
+    async def article_iterator(
+            self,
+            limit: int = 100,
+            page: int = None,
+            hours: int = None,
+            skip: int = None,
+            prefetch: int = 4,
+            fields: list[str] = None):
+        """Iterates through pages of articles, keeping `prefetch` page requests in flight.
+
+        Pages are yielded in order. Without an hours filter, article_count_get is used to plan
+        the last page so no requests are made past the end.
+
+        Args:
+            limit (int, optional): articles per page. Defaults to 100.
+            page (int, optional): first page. Defaults to 0.
+            hours (int, optional): only articles of the last hours. Defaults to None.
+            skip (int, optional): articles skipped before the first page. Defaults to None.
+            prefetch (int, optional): number of concurrent page requests. Defaults to 4.
+            fields (list[str], optional): pages hold ArticleLite objects with only these fields. Defaults to None.
+
+        Yields:
+            list[Article]: a page of articles.
+        """
+        limit = limit if limit is not None else 100
+        page = page if page is not None else 0
+        last_page = None
+        if hours is None:
+            count = await self.article_count_get()
+            if isinstance(count, int):
+                last_page = math.ceil(max(count - (skip or 0), 0) / limit)
+
+        next_page = page
+        pending = deque()
+
+        def schedule():
+            nonlocal next_page
+            while len(pending) < max(prefetch, 1) and (last_page is None or next_page < last_page):
+                pending.append(asyncio.ensure_future(
+                    self.article_get(limit=limit, page=next_page, hours=hours, skip=skip, fields=fields)))
+                next_page += 1
+
+        try:
+            schedule()
+            while len(pending) > 0:
+                articles = await pending.popleft()
+                if isinstance(articles, httpx.Response) or len(articles) == 0:
+                    break
+                schedule()
+                yield articles
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def topic_post(self, topic: Topic):
+        "Posts a topic in the database."
+        response = await self._post("topic", body=topic.to_dict(include_model=True))
+        if response.status_code != 201:
+            return response
+        try:
+            return Topic.from_dict(response.json())
+        except Exception as exc:
+            if self._suppress_errors:
+                return None
+            raise exc
+
+    async def topic_get(self):
+        response = await self._get("topic")
+        if response.status_code != 200:
+            return response
+        try:
+            return [Topic.from_dict(topic_json) for topic_json in response.json()]
+        except Exception as exc:
+            logger.error(exc)
+            return []
+
+    async def topic_put(self, topic: Topic) -> Topic:
+        response = await self._put("topic", body=topic.to_dict())
+        if response.status_code == 200:
+            try:
+                return Topic.from_dict(response.json())
+            except Exception as exc:
+                logger.error(exc)
+                return response
+        return response
+
+    async def model_post(self, model: Model, include_topic: bool = False):
+        "Posts a model in the database."
+        response = await self._post("model", body=model.to_dict(include_topic=include_topic))
+        if response.status_code != 201:
+            return response
+        try:
+            return Model.from_dict(response.json())
+        except Exception as exc:
+            if self._suppress_errors:
+                return None
+            raise exc
+
+    async def model_get(self):
+        response = await self._get("model")
+        if response.status_code != 200:
+            return response
+        try:
+            return [Model.from_dict(model_json) for model_json in response.json()]
+        except Exception as exc:
+            logger.error(exc)
+            return []
+
+    async def model_put(self, model: Model, keep_fields: list[str] = None) -> Model:
+        body = model.to_dict()
+        if keep_fields is not None:
+            keep_fields = list(keep_fields) + ['uuid']
+            body = {key: val for key, val in body.items() if key in keep_fields}
+        response = await self._put("model", body=body)
+        if response.status_code == 200:
+            try:
+                return Model.from_dict(response.json())
+            except Exception:
+                return response
+        return response
+
+    async def model_delete(self, uuid: str):
+        response = await self._delete(path="model", uuid=uuid)
+        if response.status_code == 200:
+            try:
+                return Model.from_dict(response.json())
+            except Exception:
+                return response
+        return response
+
+    async def model_iteration_post(self, model_iteration: ModelIteration, include_model=True, include_topic=True):
+        "Posts a model iteration in the database."
+        response = await self._post(
+            "model-iteration",
+            body=model_iteration.to_dict(include_model=include_model, include_topic=include_topic))
+        if response.status_code != 201:
+            return response
+        try:
+            return ModelIteration.from_dict(response.json())
+        except Exception as exc:
+            if self._suppress_errors:
+                return None
+            raise exc
+
+    async def model_iteration_get(self, uuid: str = None, reduced: bool = None, type_: str = None, complete: bool = None, **kwargs) -> List[ModelIteration]:
+        params = dict()
+        for var, val in zip(['uuid', 'reduced', 'type', 'complete'], [uuid, reduced, type_, complete]):
+            if val is not None:
+                params[var] = str(val).lower() if isinstance(val, bool) else val
+        response = await self._get("model-iteration", params=params, **kwargs)
+        if response.status_code != 200:
+            return response
+        try:
+            return [ModelIteration.from_dict(model_iteration_json) for model_iteration_json in response.json()]
+        except Exception as exc:
+            logger.error(exc)
+            return []
+
+    async def model_iteration_put(self, model_iteration: ModelIteration, keep_fields: list[str] = None) -> ModelIteration:
+        body = model_iteration.to_dict()
+        if keep_fields is not None:
+            keep_fields = list(keep_fields) + ['uuid']
+            body = {key: item for key, item in body.items() if key in keep_fields}
+        response = await self._put("model-iteration", body=body)
+        if response.status_code == 200:
+            try:
+                return ModelIteration.from_dict(response.json())
+            except Exception:
+                return response
+        return response
+
+    async def model_iteration_delete(self, uuid: str, timeout=10):
+        response = await self._delete(path="model-iteration", uuid=uuid, timeout=timeout)
+        return response.status_code
+
+    async def processed_post_many(self, processed: Union[list[Processed], ProcessedBatch]):
+        if isinstance(processed, ProcessedBatch):
+            body = processed.to_list()
+        else:
+            body = [proc.to_dict() for proc in processed]
+        response = await self._post("processed/many", body=body)
+        if response.status_code != 201:
+            return response
+        return True
+
+    async def processed_post(self, processed: Processed) -> Processed:
+        "Posts a processed in the database."
+        response = await self._post("processed", body=processed.to_dict())
+        if response.status_code != 201:
+            return response
+        try:
+            return Processed.from_dict(response.json())
+        except Exception as exc:
+            if self._suppress_errors:
+                return None
+            raise exc
+
+    async def processed_get(self, model_iteration_uuid: str, limit: int = None, skip: int = None, as_json: bool = False, as_batch: bool = False):
+        """Retrieves a page of processed of a model iteration.
+
+        Raises:
+            Exception: if the response could not be decoded. An empty list would end pagination.
+        """
+        params = dict(modelIteration=model_iteration_uuid)
+        if limit is not None:
+            params['limit'] = limit
+        if skip is not None:
+            params['skip'] = skip
+        response = await self._get("processed", params=params)
+        if response.status_code != 200:
+            return response
+        try:
+            processed_json = response.json()
+            if as_json:
+                return processed_json
+            if as_batch:
+                return ProcessedBatch.from_list(processed_json)
+            return [Processed.from_dict(proc_json) for proc_json in processed_json]
+        except Exception as exc:
+            logger.error('Failed to decode processed. skip: %s. %s', skip, exc)
+            raise exc
+
+    async def processed_get_all(
+            self,
+            model_iteration_uuid: str,
+            limit: int = 1000,
+            concurrency: int = 4,
+            as_json: bool = False,
+            as_batch: bool = False):
+        """Retrieves all processed of a model iteration with up to `concurrency` requests in flight.
+
+        Pages are requested ahead assuming they are full, and retrieval stops at the first
+        empty page. When a page has fewer processed than requested (e.g. the backend caps
+        the page size), the pages requested after it are cancelled and requested again from
+        the end of that page.
+
+        Raises:
+            ConnectionError: if a page could not be retrieved.
+
+        Returns:
+            list | ProcessedBatch: all processed of the model iteration.
+        """
+        processed = ProcessedBatch(model_iteration_uuid=model_iteration_uuid) if as_batch else []
+        page_size = limit
+        next_skip = 0
+        # (skip, task) of the pages in flight, in order.
+        pending = deque()
+
+        def schedule():
+            nonlocal next_skip
+            while len(pending) < max(concurrency, 1):
+                pending.append((next_skip, asyncio.ensure_future(self.processed_get(
+                    model_iteration_uuid, limit=page_size, skip=next_skip, as_json=as_json, as_batch=as_batch))))
+                next_skip += page_size
+
+        def cancel():
+            for _, task in pending:
+                task.cancel()
+            pending.clear()
+
+        try:
+            schedule()
+            while len(pending) > 0:
+                skip, task = pending.popleft()
+                response = await task
+                if isinstance(response, httpx.Response):
+                    raise ConnectionError(
+                        f'Failed to retrieve processed. status code: {response.status_code}')
+                if len(response) == 0:
+                    break
+                processed.extend(response)
+                if len(response) < page_size:
+                    cancel()
+                    page_size = len(response)
+                    next_skip = skip + len(response)
+                schedule()
+        finally:
+            cancel()
+        return processed
+
+    async def processed_put(self, processed: Processed) -> Processed:
+        response = await self._put("processed", body=processed.to_dict())
+        if response.status_code == 200:
+            try:
+                return Processed.from_dict(response.json())
+            except Exception:
+                return response
+        return response
+
+    async def processed_delete(self, uuid: str):
+        response = await self._delete(path="processed", uuid=uuid)
+        return response.status_code
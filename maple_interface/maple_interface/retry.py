@@ -0,0 +1,85 @@
+'''Retry and backoff policy used to communicate with the backend.'''
+import logging
+import random
+import time
+from typing import Callable
+
+logger = logging.getLogger("RetryPolicy")
+
+
+class RetryPolicy:
+    """Central retry/backoff policy.
+
+    Retries are only done at the application level with `call`; the session of MapleAPI
+    does not retry, so a request is attempted at most max_attempts times. When the
+    attempts are exhausted `call` raises ConnectionError, use max_attempts=None to retry
+    forever.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        backoff_factor: float = 0.5,
+        backoff_max: float = 30,
+        jitter: float = 1.0,
+        status_forcelist: tuple[int] = (429, 500, 502, 503, 504),
+        allowed_methods: tuple[str] = ('DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT'),
+    ) -> None:
+        """
+        Args:
+            max_attempts (int, optional): maximum number of attempts, None retries forever. Defaults to 5.
+            backoff_factor (float, optional): base of the exponential backoff in seconds. Defaults to 0.5.
+            backoff_max (float, optional): maximum backoff in seconds. Defaults to 30.
+            jitter (float, optional): maximum random seconds added to each backoff. Defaults to 1.0.
+            status_forcelist (tuple[int], optional): status codes retried by the requests of AsyncMapleAPI.
+            allowed_methods (tuple[str], optional): http methods retried by AsyncMapleAPI. POST is not retried by default since it is not idempotent.
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.status_forcelist = tuple(status_forcelist)
+        self.allowed_methods = tuple(allowed_methods)
+
+    def wait_time(self, attempt: int) -> float:
+        """Seconds to wait after the given (1-based) failed attempt."""
+        backoff = min(self.backoff_max, self.backoff_factor * (2 ** (attempt - 1)))
+        return backoff + random.random() * self.jitter
+
+    def call(
+        self,
+        func: Callable,
+        *args,
+        is_success: Callable = None,
+        description: str = None,
+        **kwargs,
+    ):
+        """Calls func until is_success(result) is True or the attempts are exhausted.
+
+        Args:
+            func (Callable): function to call with args and kwargs.
+            is_success (Callable, optional): validates the result. Defaults to any result not raising.
+            description (str, optional): used in log messages. Defaults to func.__name__.
+
+        Raises:
+            ConnectionError: when max_attempts is reached without success.
+
+        Returns:
+            the result of the successful call.
+        """
+        description = description or getattr(func, '__name__', 'request')
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = func(*args, **kwargs)
+                if is_success is None or is_success(result):
+                    return result
+                logger.warning('Failed %s (attempt %d). %s', description, attempt, result)
+            except Exception as exc:
+                logger.warning('Failed %s (attempt %d). %s', description, attempt, exc)
+            if self.max_attempts is not None and attempt >= self.max_attempts:
+                raise ConnectionError(f'{description} failed after {attempt} attempts.')
+            wait_time = self.wait_time(attempt)
+            logger.debug('Reattempt %s in %.2f seconds', description, wait_time)
+            time.sleep(wait_time)
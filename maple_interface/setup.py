@@ -8,6 +8,6 @@ setup(
     url="https://github.com/ResearchComputingServices/maple/maple_interface",
     author="RCS Team",
     author_email="rogerselzler@cunet.carleton.ca",
-    install_requires=['requests'],
+    install_requires=['requests', 'httpx'],
     packages=["maple_interface"],
 )
@@ -0,0 +1,39 @@
+import unittest
+from maple_interface.maple import Articles
+
+
+class FakeMapleAPI:
+    def __init__(self, pages: int):
+        self.pages = pages
+        self.requested = []
+
+    def article_get(self, limit, page, hours, skip, fields):
+        self.requested.append(page)
+        return [f'article {page}'] if page < self.pages else []
+
+
+class TestArticles(unittest.TestCase):
+    def test_pages(self):
+        for prefetch in [0, 2]:
+            articles = iter(Articles(FakeMapleAPI(3), prefetch=prefetch))
+            self.assertEqual(list(articles), [['article 0'], ['article 1'], ['article 2']])
+            self.assertRaises(StopIteration, next, articles)
+
+    def test_stop_after_close(self):
+        for prefetch in [0, 2]:
+            api = FakeMapleAPI(10)
+            articles = iter(Articles(api, prefetch=prefetch))
+            self.assertEqual(next(articles), ['article 0'])
+            articles.close()
+            requested = len(api.requested)
+            self.assertRaises(StopIteration, next, articles)
+            # with prefetch, the thread may still finish the page it was fetching.
+            if prefetch == 0:
+                self.assertEqual(len(api.requested), requested)
+            # iterating again starts over.
+            self.assertEqual(next(iter(articles)), ['article 0'])
+            articles.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import unittest
+import httpx
+from maple_interface import RetryPolicy
+from maple_interface.maple_async import AsyncMapleAPI
+
+
+class FakeBackend:
+    """handler of an httpx.MockTransport serving processed and article pages."""
+
+    def __init__(self, processed: int = 0, articles: int = 0, max_page_size: int = None):
+        self.processed = [dict(uuid=f'p{index}', article=dict(uuid=f'a{index}')) for index in range(processed)]
+        self.articles = [dict(uuid=f'a{index}') for index in range(articles)]
+        self.max_page_size = max_page_size
+        self.requests = []
+        self.active = 0
+        self.invalid_skip = None
+
+    def delay(self, skip: int) -> float:
+        # later pages answer first.
+        return max(0.0, 0.05 - skip * 0.001)
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        params = dict(request.url.params)
+        self.requests.append((request.url.path, params))
+        self.active += 1
+        try:
+            if request.url.path.endswith('/article/count'):
+                return httpx.Response(200, json=len(self.articles))
+            limit = int(params.get('limit', 100))
+            if self.max_page_size is not None:
+                limit = min(limit, self.max_page_size)
+            if request.url.path.endswith('/processed'):
+                skip = int(params.get('skip', 0))
+                await asyncio.sleep(self.delay(skip))
+                if skip == self.invalid_skip:
+                    return httpx.Response(200, content=b'not json')
+                return httpx.Response(200, content=json.dumps(self.processed[skip:skip + limit]).encode())
+            skip = int(params.get('skip', 0)) + int(params.get('page', 0)) * limit
+            return httpx.Response(200, json=self.articles[skip:skip + limit])
+        finally:
+            self.active -= 1
+
+    def skips(self) -> list[int]:
+        return [int(params['skip']) for path, params in self.requests if path.endswith('/processed')]
+
+
+def create_api(backend: FakeBackend) -> AsyncMapleAPI:
+    api = AsyncMapleAPI('http://localhost:1', retry_policy=RetryPolicy(max_attempts=1))
+    api._client = httpx.AsyncClient(transport=httpx.MockTransport(backend))
+    return api
+
+
+class TestProcessedGetAll(unittest.TestCase):
+    def get_all(self, backend: FakeBackend, **kwargs):
+        async def run():
+            async with create_api(backend) as api:
+                processed = await api.processed_get_all('model-iteration', as_json=True, **kwargs)
+            await asyncio.sleep(0.1)
+            return processed
+
+        return asyncio.run(run())
+
+    def test_pages_in_order(self):
+        backend = FakeBackend(processed=45)
+        processed = self.get_all(backend, limit=10, concurrency=4)
+        self.assertEqual([item['uuid'] for item in processed], [f'p{index}' for index in range(45)])
+
+    def test_stops_on_empty_page(self):
+        backend = FakeBackend(processed=20)
+        processed = self.get_all(backend, limit=10, concurrency=4)
+        self.assertEqual(len(processed), 20)
+        # the pages requested past the end are cancelled.
+        self.assertEqual(backend.active, 0)
+        self.assertEqual(sorted(backend.skips())[:3], [0, 10, 20])
+
+    def test_page_size_capped_by_backend(self):
+        backend = FakeBackend(processed=25, max_page_size=4)
+        processed = self.get_all(backend, limit=10, concurrency=3)
+        self.assertEqual([item['uuid'] for item in processed], [f'p{index}' for index in range(25)])
+
+    def test_invalid_page_raises(self):
+        backend = FakeBackend(processed=30)
+        backend.invalid_skip = 10
+        with self.assertRaises(ValueError):
+            self.get_all(backend, limit=10, concurrency=2)
+
+    def test_failed_page_raises(self):
+        def handler(request):
+            return httpx.Response(404)
+
+        async def run():
+            api = AsyncMapleAPI('http://localhost:1', retry_policy=RetryPolicy(max_attempts=1))
+            api._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            async with api:
+                return await api.processed_get_all('model-iteration', as_json=True)
+
+        with self.assertRaises(ConnectionError):
+            asyncio.run(run())
+
+
+class TestArticleIterator(unittest.TestCase):
+    def iterate(self, backend: FakeBackend, **kwargs):
+        async def run():
+            async with create_api(backend) as api:
+                return [page async for page in api.article_iterator(fields=['uuid'], **kwargs)]
+
+        return asyncio.run(run())
+
+    def pages(self, backend: FakeBackend) -> list[int]:
+        return [int(params['page']) for path, params in backend.requests if path.endswith('/article')]
+
+    def test_pages_planned_from_count(self):
+        backend = FakeBackend(articles=25)
+        pages = self.iterate(backend, limit=10, prefetch=4)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        # no request past the last page.
+        self.assertEqual(sorted(self.pages(backend)), [0, 1, 2])
+
+    def test_pages_planned_with_skip(self):
+        backend = FakeBackend(articles=25)
+        pages = self.iterate(backend, limit=10, skip=5, prefetch=4)
+        self.assertEqual([article.uuid for page in pages for article in page], [f'a{index}' for index in range(5, 25)])
+        self.assertEqual(sorted(self.pages(backend)), [0, 1])
+
+    def test_first_page(self):
+        backend = FakeBackend(articles=25)
+        pages = self.iterate(backend, limit=10, page=1, prefetch=2)
+        self.assertEqual([len(page) for page in pages], [10, 5])
+        self.assertEqual(sorted(self.pages(backend)), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import asyncio
+import unittest
+import httpx
+from maple_interface import RetryPolicy
+from maple_interface.maple_async import AsyncMapleAPI
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.policy = RetryPolicy(max_attempts=3, backoff_factor=0, jitter=0)
+
+    def test_call_until_success(self):
+        results = iter([None, None, 'ok'])
+        out = self.policy.call(lambda: next(results), is_success=lambda r: r == 'ok')
+        self.assertEqual(out, 'ok')
+
+    def test_call_exhausted(self):
+        with self.assertRaises(ConnectionError):
+            self.policy.call(lambda: None, is_success=lambda r: r is not None)
+
+    def test_wait_time_is_bounded(self):
+        policy = RetryPolicy(backoff_factor=1, backoff_max=4, jitter=0.5)
+        for attempt in range(1, 10):
+            self.assertLessEqual(policy.wait_time(attempt), 4.5)
+
+    def test_session_does_not_retry(self):
+        from maple_interface import MapleAPI
+        api = MapleAPI('http://localhost:1', retry_policy=self.policy)
+        adapter = api.session.get_adapter('http://localhost:1')
+        self.assertEqual(adapter.max_retries.total, 0)
+
+    def test_async_single_retry_layer(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503)
+
+        async def run():
+            api = AsyncMapleAPI('http://localhost:1', retry_policy=self.policy)
+            api._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            async with api:
+                return await api.model_get()
+
+        response = asyncio.run(run())
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(calls), self.policy.max_attempts)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,27 @@
 '''maple_proc module'''
+import importlib
 
 from .utils import load_articles
-from . import process
-from .model import MapleModel, MapleBert
-from .processing import MapleProcessing
+
+# submodules and classes imported on first access, so importing the package (e.g. to use
+# load_articles) does not load bertopic, torch or nltk.
+_LAZY_ATTRIBUTES = dict(
+    process=('.process', None),
+    MapleModel=('.model', 'MapleModel'),
+    MapleBert=('.model', 'MapleBert'),
+    MapleProcessing=('.processing', 'MapleProcessing'),
+    MapleClassifier=('.classifier', 'MapleClassifier'),
+    ModelFamilyScheduler=('.scheduler', 'ModelFamilyScheduler'),
+)
+
+__all__ = ['load_articles', *_LAZY_ATTRIBUTES]
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    module = importlib.import_module(module_name, __name__)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
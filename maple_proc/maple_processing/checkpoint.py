@@ -0,0 +1,195 @@
+'''Checkpoints of model iterations, so a failed iteration can be resumed.'''
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+
+
+class IterationCheckpoint:
+    """Progress of a model iteration stored in `<model iteration path>/checkpoint`.
+
+    Phases are completed in the order of PHASES. Besides the phase, the checkpoint keeps
+    the classification cursor (every page before it was classified and posted), the
+    pages completed after the cursor, the articles already posted of pages posted in
+    chunks but not completed, the classified articles, the chatgpt results applied to topics and pickled objects (e.g. the trained
+    models). Without a path, the checkpoint is only kept in memory.
+
+    Args:
+        path (str, optional): model iteration directory. Defaults to None.
+        model_iteration_uuid (str, optional): uuid of the model iteration. Defaults to None.
+        model_family (str, optional): name of the model class of the iteration. Defaults to None.
+    """
+    DIRECTORY = 'checkpoint'
+    FILENAME = 'checkpoint.json'
+    ARTICLES_FILENAME = 'articles.jsonl'
+    PHASES = ('created', 'trained', 'classified', 'named', 'charted')
+
+    def __init__(self, path: str = None, model_iteration_uuid: str = None, model_family: str = None):
+        self.logger = logging.getLogger('IterationCheckpoint')
+        self.path = path
+        self.model_iteration_uuid = model_iteration_uuid
+        self.model_family = model_family
+        self.phase = 'created'
+        self.attempts = 0
+        self.cursor = 0
+        # completed pages after the cursor, i.e. after a page that was not completed.
+        self.pages = []
+        # uuids of the articles posted so far, by page, for pages posted in chunks and not completed.
+        self.posted = dict()
+        self.skip = None
+        self.article_classified = 0
+        self.topics = dict()
+        self.updated = None
+
+    @property
+    def directory(self) -> str:
+        return None if self.path is None else os.path.join(self.path, self.DIRECTORY)
+
+    def to_dict(self) -> dict:
+        return dict(
+            model_iteration_uuid=self.model_iteration_uuid,
+            model_family=self.model_family,
+            phase=self.phase,
+            attempts=self.attempts,
+            cursor=self.cursor,
+            pages=self.pages,
+            posted=self.posted,
+            skip=self.skip,
+            article_classified=self.article_classified,
+            topics=self.topics,
+            updated=self.updated,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'IterationCheckpoint':
+        """loads the checkpoint of a model iteration directory, or None if there is none."""
+        filename = os.path.join(path, cls.DIRECTORY, cls.FILENAME)
+        if not os.path.isfile(filename):
+            return None
+        with open(filename, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        checkpoint = cls(path, data['model_iteration_uuid'], data['model_family'])
+        for key in ['phase', 'attempts', 'cursor', 'skip', 'article_classified', 'topics', 'updated']:
+            setattr(checkpoint, key, data[key])
+        checkpoint.pages = data.get('pages', [])
+        checkpoint.posted = data.get('posted', {})
+        return checkpoint
+
+    @classmethod
+    def find(cls, datapath: str, model_families: list[str] = None) -> list['IterationCheckpoint']:
+        """checkpoints of the model iterations in datapath, oldest first."""
+        if not os.path.isdir(datapath):
+            return []
+        checkpoints = []
+        for name in os.listdir(datapath):
+            path = os.path.join(datapath, name)
+            if not os.path.isdir(path):
+                continue
+            try:
+                checkpoint = cls.load(path)
+            except (OSError, ValueError, KeyError) as exc:
+                logging.getLogger('IterationCheckpoint').error('Invalid checkpoint in %s. %s', path, exc)
+                continue
+            if checkpoint is None:
+                continue
+            if model_families is not None and checkpoint.model_family not in model_families:
+                continue
+            checkpoints.append(checkpoint)
+        return sorted(checkpoints, key=lambda checkpoint: checkpoint.updated or 0)
+
+    def save(self):
+        self.updated = time.time()
+        if self.path is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        filename = os.path.join(self.directory, self.FILENAME)
+        # written to a temporary file first, so a crash never leaves a partial checkpoint.
+        with open(f'{filename}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
+        os.replace(f'{filename}.tmp', filename)
+
+    def reached(self, phase: str) -> bool:
+        """whether phase was completed."""
+        return self.PHASES.index(self.phase) >= self.PHASES.index(phase)
+
+    def advance(self, phase: str):
+        """marks phase as completed."""
+        self.phase = phase
+        self.save()
+        self.logger.debug('Model iteration %s reached phase %s', self.model_iteration_uuid, phase)
+
+    def completed(self, page: int) -> bool:
+        """whether a page of articles was classified and posted."""
+        return page < self.cursor or page in self.pages
+
+    def record_page(self, page: int, articles: list[dict], article_classified: int):
+        """Records that a page of articles was classified and posted.
+
+        The cursor only moves past contiguous completed pages, so a page that was not
+        recorded is classified again when resuming.
+        """
+        if self.path is not None and len(articles) > 0:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, self.ARTICLES_FILENAME), 'a', encoding='utf-8') as file:
+                for article in articles:
+                    file.write(json.dumps(article) + '\n')
+        self.posted.pop(str(page), None)
+        if not self.completed(page):
+            self.pages.append(page)
+        while self.cursor in self.pages:
+            self.pages.remove(self.cursor)
+            self.cursor += 1
+        self.article_classified = article_classified
+        self.save()
+
+    def record_chunk(self, page: int, article_uuids: list[str]):
+        """records that the processed of some articles of a page were posted, before the page is completed."""
+        self.posted.setdefault(str(page), []).extend(article_uuids)
+        self.save()
+
+    def posted_articles(self, page: int) -> set[str]:
+        """uuids of the articles of a page recorded by record_chunk."""
+        return set(self.posted.get(str(page), []))
+
+    def articles(self) -> list[dict]:
+        """articles recorded by record_page."""
+        if self.path is None:
+            return []
+        filename = os.path.join(self.directory, self.ARTICLES_FILENAME)
+        if not os.path.isfile(filename):
+            return []
+        articles = dict()
+        with open(filename, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    article = json.loads(line)
+                except ValueError:
+                    # last line of a crashed write.
+                    continue
+                articles[article['uuid']] = article
+        return list(articles.values())
+
+    def record_topic(self, uuid: str, label: str, dot_summary):
+        """records the chatgpt results applied to a topic."""
+        self.topics[uuid] = dict(label=label, dot_summary=dot_summary)
+        self.save()
+
+    def save_object(self, name: str, value):
+        if self.path is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        filename = os.path.join(self.directory, f'{name}.pkl')
+        with open(f'{filename}.tmp', 'wb') as file:
+            pickle.dump(value, file)
+        os.replace(f'{filename}.tmp', filename)
+
+    def load_object(self, name: str):
+        with open(os.path.join(self.directory, f'{name}.pkl'), 'rb') as file:
+            return pickle.load(file)
+
+    def remove(self):
+        """removes the stored checkpoint, e.g. when the model iteration is complete."""
+        if self.path is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
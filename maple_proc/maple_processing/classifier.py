@@ -0,0 +1,308 @@
+'''Streaming classification of new articles with the latest complete model iteration.'''
+import asyncio
+import logging
+import os
+import pickle
+import queue
+import shutil
+import threading
+import time
+import timeit
+import numpy as np
+from requests import Response
+from maple_structures import ArticleLite, ModelIteration, ProcessedBatch
+from maple_interface import MapleAPI, AsyncMapleAPI
+from .model import MapleBert, MapleModel, TopicLookup
+from .embedding import EmbeddingStore, DEFAULT_EMBEDDING_MODEL
+from .processing import MapleProcessing
+from .utils import load_processed_articles, processed_article_uuids
+
+
+class MapleClassifier:
+    """Classifies articles as soon as they receive a chat_summary.
+
+    The models of the latest complete model iteration are loaded from
+    `model_iteration_datapath`. Articles are received from the chatgpt server
+    (`chat_summary_ready` event, if a chatgpt client is given) and from polling
+    recent articles, which also covers events missed while disconnected. Articles
+    are classified in micro-batches of at most `batch_size` articles, waiting at most
+    `max_latency` seconds after the first article of a batch, and the processed are
+    posted right away.
+    """
+    ARTICLE_FIELDS = ('uuid', 'url', 'createDate', 'chat_summary')
+
+    def __init__(
+        self, *,
+        maple: MapleAPI,
+        model: type[MapleModel] = MapleBert,
+        model_type: str = 'bert',
+        model_iteration_datapath: str = 'data',
+        embedding_cache_path: str = None,
+        batch_size: int = 32,
+        max_latency: float = 2.0,
+        poll_interval: float = 60,
+        poll_hours: float = 2,
+        reload_interval: float = 300,
+        chatgpt_client=None,
+    ):
+        """
+        Args:
+            maple (MapleAPI): the api used to fetch model iterations and articles, and post processed.
+            model (type[MapleModel], optional): model used to load the stored models. Defaults to MapleBert.
+            model_type (str, optional): type of the model iterations to use. Defaults to 'bert'.
+            model_iteration_datapath (str, optional): directory where MapleProcessing stores the model iterations. Defaults to 'data'.
+            embedding_cache_path (str, optional): directory of the embedding store. Defaults to a directory separated from MapleProcessing's store.
+            batch_size (int, optional): maximum number of articles per batch. Defaults to 32.
+            max_latency (float, optional): seconds waited after the first article of a batch. Defaults to 2.0.
+            poll_interval (float, optional): seconds between polls of recent articles. None disables polling. Defaults to 60.
+            poll_hours (float, optional): hours of articles fetched when polling. Defaults to 2.
+            reload_interval (float, optional): seconds between checks for a newer model iteration. Defaults to 300.
+            chatgpt_client (ChatgptClient, optional): client that receives chat_summary_ready events. Defaults to None.
+        """
+        self.logger = logging.getLogger('MapleClassifier')
+        self.maple_api = maple
+        self._model = model
+        self._model_type = model_type
+        self._model_iteration_datapath = model_iteration_datapath
+        self._embedding_cache_path = embedding_cache_path or os.path.join(
+            model_iteration_datapath, 'embeddings_classifier')
+        self._batch_size = batch_size
+        self._max_latency = max_latency
+        self._poll_interval = poll_interval
+        self._poll_hours = poll_hours
+        self._reload_interval = reload_interval
+        self._embedding_store = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # uuids waiting in the queue, and classified with the current model iteration.
+        self._pending = set()
+        self._classified = set()
+        self._stop = threading.Event()
+
+        self._model_iteration = None
+        self._models = None
+        self._topic_lookups = None
+        self._position_model = None
+
+        if chatgpt_client is not None:
+            chatgpt_client.add_chat_summary_ready_callback(self._on_chat_summary_ready)
+
+    @property
+    def model_iteration(self) -> ModelIteration:
+        return self._model_iteration
+
+    @property
+    def embedding_store(self) -> EmbeddingStore:
+        if self._embedding_store is None:
+            self._embedding_store = EmbeddingStore(
+                self._embedding_cache_path,
+                model_name=DEFAULT_EMBEDDING_MODEL)
+        return self._embedding_store
+
+    def submit(self, article) -> bool:
+        """Enqueues an article to be classified.
+
+        Returns:
+            bool: False if the article has no chat_summary or was already enqueued or classified.
+        """
+        if not hasattr(article, 'chat_summary') or not article.chat_summary:
+            return False
+        with self._lock:
+            if article.uuid in self._pending or article.uuid in self._classified:
+                return False
+            self._pending.add(article.uuid)
+        self._queue.put(article)
+        return True
+
+    def _on_chat_summary_ready(self, data: dict):
+        self.submit(ArticleLite.from_json(data, fields=self.ARTICLE_FIELDS))
+
+    def _latest_model_iteration(self) -> ModelIteration:
+        model_iterations = self.maple_api.model_iteration_get(type_=self._model_type, complete=True)
+        if isinstance(model_iterations, Response) or not model_iterations:
+            return None
+        return max(model_iterations, key=lambda model_iteration: model_iteration.createDate or '')
+
+    def _model_iteration_directory(self, uuid: str) -> str:
+        """directory with the stored files of a model iteration, extracting its archive if needed."""
+        directory = os.path.join(self._model_iteration_datapath, uuid)
+        if os.path.isfile(os.path.join(directory, MapleProcessing.POSITION_MODEL_FILENAME)):
+            return directory
+        archive = f'{directory}.zip'
+        if not os.path.isfile(archive):
+            return None
+        extracted = os.path.join(self._model_iteration_datapath, 'classifier', uuid)
+        if not os.path.isdir(extracted):
+            shutil.unpack_archive(archive, extracted)
+        return extracted
+
+    def _remove_extracted(self, keep: str):
+        """removes the directories extracted for model iterations other than keep."""
+        extracted_path = os.path.join(self._model_iteration_datapath, 'classifier')
+        if not os.path.isdir(extracted_path):
+            return
+        for uuid in os.listdir(extracted_path):
+            if uuid != keep:
+                shutil.rmtree(os.path.join(extracted_path, uuid), ignore_errors=True)
+                self.logger.debug('Removed extracted model iteration %s.', uuid)
+
+    def _retrieve_classified(self, model_iteration_uuid: str) -> set[str]:
+        """uuids of the articles with processed of the model iteration in the backend.
+
+        Raises:
+            ConnectionError: if the processed could not be retrieved.
+        """
+        async def retrieve():
+            async with AsyncMapleAPI.from_maple_api(self.maple_api) as maple_api:
+                return await maple_api.processed_get_all(
+                    model_iteration_uuid=model_iteration_uuid,
+                    as_json=True)
+        return processed_article_uuids(asyncio.run(retrieve()))
+
+    def load_latest(self) -> bool:
+        """Loads the latest complete model iteration if it is newer than the current one.
+
+        Returns:
+            bool: True if a model iteration was loaded.
+        """
+        model_iteration = self._latest_model_iteration()
+        if model_iteration is None:
+            self.logger.warning('No complete model iteration of type %s.', self._model_type)
+            return False
+        if self._model_iteration is not None and self._model_iteration.uuid == model_iteration.uuid:
+            return False
+        directory = self._model_iteration_directory(model_iteration.uuid)
+        position_model_path = None if directory is None else os.path.join(
+            directory, MapleProcessing.POSITION_MODEL_FILENAME)
+        if position_model_path is None or not os.path.isfile(position_model_path):
+            # iterations stored before the position model was saved can not be used.
+            self.logger.warning('Model iteration %s has no stored models yet.', model_iteration.uuid)
+            return False
+
+        tstart = timeit.default_timer()
+        # articles classified by the model iteration itself, and by this service, e.g. before a restart.
+        classified = set()
+        processed_path = os.path.join(directory, 'processed.json')
+        if os.path.isfile(processed_path):
+            classified = load_processed_articles(processed_path)
+        try:
+            classified |= self._retrieve_classified(model_iteration.uuid)
+        except Exception as exc:
+            # without them, articles would be classified and posted again.
+            self.logger.error(
+                'Failed to retrieve processed of model iteration %s. %s', model_iteration.uuid, exc)
+            return False
+
+        models = {
+            level: self._model.maple_load(os.path.join(directory, f'model_level{level}'))
+            for level in range(1, 4)}
+        with open(position_model_path, 'rb') as file:
+            position_model = pickle.load(file)
+        topic_lookups = {
+            level: TopicLookup(getattr(model_iteration, f'model_level{level}').topic)
+            for level in range(1, 4)}
+
+        with self._lock:
+            self._model_iteration = model_iteration
+            self._models = models
+            self._position_model = position_model
+            self._topic_lookups = topic_lookups
+            self._classified = classified
+        self._remove_extracted(keep=model_iteration.uuid)
+        self.logger.info(
+            'Loaded model iteration %s in %.2fs. %d articles already classified.',
+            model_iteration.uuid, timeit.default_timer()-tstart, len(classified))
+        return True
+
+    def classify(self, articles: list) -> ProcessedBatch:
+        """Classifies articles with the loaded model iteration."""
+        summaries = [article.chat_summary for article in articles]
+        embeddings = self.embedding_store.embed(summaries, uuids=[article.uuid for article in articles])
+        processed = ProcessedBatch(
+            model_iteration_uuid=self._model_iteration.uuid,
+            article=[article.uuid for article in articles],
+            position=self._position_model.transform(embeddings))
+        for level in range(1, 4):
+            topic_indexes, probabilities = self._models[level].transform(summaries, embeddings=embeddings)
+            setattr(processed, f'topic_level{level}',
+                    self._topic_lookups[level].uuid(topic_indexes).tolist())
+            setattr(processed, f'topic_level{level}_prob',
+                    np.asarray(probabilities, dtype=np.float64))
+        return processed
+
+    def _next_batch(self, timeout: float) -> list:
+        """waits up to timeout for an article, then collects a batch until it is full or max_latency expires."""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self._max_latency
+        while len(batch) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _process_batch(self, batch: list):
+        with self._lock:
+            for article in batch:
+                self._pending.discard(article.uuid)
+            articles = [article for article in batch if article.uuid not in self._classified]
+        if len(articles) == 0:
+            return
+        tstart = timeit.default_timer()
+        processed = self.classify(articles)
+        self.maple_api.retry_policy.call(
+            self.maple_api.processed_post_many,
+            processed,
+            is_success=lambda response: response is True,
+            description='post processed')
+        with self._lock:
+            self._classified.update(article.uuid for article in articles)
+        self.logger.info(
+            'Classified %d articles in %.2fs.', len(articles), timeit.default_timer()-tstart)
+
+    def _poll(self):
+        """enqueues recent articles with chat_summary, e.g. missed events."""
+        while not self._stop.is_set():
+            try:
+                count = 0
+                for articles in self.maple_api.article_iterator(
+                        hours=self._poll_hours, fields=self.ARTICLE_FIELDS):
+                    for article in articles:
+                        count += self.submit(article)
+                self.logger.debug('Polling enqueued %d articles.', count)
+            except Exception as exc:
+                self.logger.error('Failed polling articles. %s', exc)
+            self._stop.wait(self._poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """loads the latest model iteration and classifies articles until stop is called."""
+        while not self.load_latest():
+            if self._stop.wait(self._reload_interval):
+                return
+        if self._poll_interval is not None:
+            threading.Thread(target=self._poll, name='MapleClassifierPoll', daemon=True).start()
+
+        last_reload = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() - last_reload >= self._reload_interval:
+                last_reload = time.monotonic()
+                try:
+                    self.load_latest()
+                except Exception as exc:
+                    self.logger.error('Failed to load model iteration. %s', exc)
+            batch = self._next_batch(timeout=1)
+            if len(batch) == 0:
+                continue
+            try:
+                self._process_batch(batch)
+            except Exception as exc:
+                self.logger.error('Failed to classify %d articles. %s', len(batch), exc)
@@ -0,0 +1,89 @@
+'''State shared by the model levels of a model iteration.'''
+from collections import OrderedDict
+import hashlib
+import logging
+import threading
+import timeit
+import numpy as np
+
+
+class SharedReduction:
+    """Dimensionality reduction shared by all model levels of a model iteration.
+
+    BERTopic calls `fit` and `transform` on its umap_model with the same embeddings for
+    every level. Since all levels use identical parameters, the reduction is computed once
+    and the result is cached by the content of the embeddings array.
+    """
+
+    def __init__(self, umap_model, cache_size: int = 4):
+        """
+        Args:
+            umap_model: the underlying reduction model (e.g. UMAP).
+            cache_size (int, optional): number of reduced arrays to keep. Defaults to 4.
+        """
+        self.logger = logging.getLogger('SharedReduction')
+        self.umap_model = umap_model
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._fitted_key = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock')
+        state.pop('logger')
+        state['_cache'] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger('SharedReduction')
+
+    @staticmethod
+    def _key(embeddings) -> tuple:
+        embeddings = np.ascontiguousarray(embeddings)
+        return embeddings.shape, hashlib.sha1(embeddings.tobytes()).hexdigest()
+
+    def _cache_put(self, key, reduced):
+        self._cache[key] = reduced
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def fit(self, X, y=None):
+        key = self._key(X)
+        with self._lock:
+            if key != self._fitted_key:
+                tstart = timeit.default_timer()
+                self._cache.clear()
+                self._cache_put(key, self.umap_model.fit_transform(X, y=y))
+                self._fitted_key = key
+                self.logger.debug(
+                    'Fitted shared reduction on %d embeddings in %.2fs',
+                    len(X), timeit.default_timer()-tstart)
+        return self
+
+    def transform(self, X):
+        key = self._key(X)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            reduced = self.umap_model.transform(X)
+            self._cache_put(key, reduced)
+            return reduced
+
+    def fit_transform(self, X, y=None):
+        return self.fit(X, y=y).transform(X)
+
+
+class IterationContext:
+    """Holds the objects computed once per model iteration and shared by the model levels.
+
+    Args:
+        reduction (SharedReduction, optional): reduction used by every level. Defaults to None.
+    """
+
+    def __init__(self, reduction: SharedReduction = None):
+        self.reduction = reduction
@@ -0,0 +1,224 @@
+'''Persistent storage of sentence embeddings.'''
+import hashlib
+import json
+import logging
+import os
+import threading
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+
+class EmbeddingStore:
+    """On-disk embedding cache keyed by article uuid, content hash and embedding model.
+
+    Embeddings are appended to a raw float32 file which is memory-mapped for reads,
+    and their keys are appended to a text file, one key per row. Appending never
+    rewrites the existing rows or keys. index.json only holds the model name and the
+    dimension. Each embedding model has its own sub directory, so changing the model
+    never mixes vectors.
+    """
+    INDEX_FILENAME = 'index.json'
+    KEYS_FILENAME = 'keys.txt'
+    DATA_FILENAME = 'embeddings.f32'
+
+    def __init__(
+        self,
+        path: str,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        encoder=None,
+        batch_size: int = 64,
+    ):
+        """
+        Args:
+            path (str): directory where the stores are kept.
+            model_name (str, optional): name of the sentence transformer model. Defaults to DEFAULT_EMBEDDING_MODEL.
+            encoder (optional): object with an `encode(list[str])` method. Defaults to a SentenceTransformer(model_name) loaded on first use.
+            batch_size (int, optional): batch size used to encode missing documents. Defaults to 64.
+        """
+        self.logger = logging.getLogger('EmbeddingStore')
+        self._model_name = model_name
+        self._path = os.path.join(path, model_name.replace('/', '_'))
+        self._encoder = encoder
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._index = {}
+        self._dim = None
+        self._count = 0
+        self._data = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self._path, exist_ok=True)
+        self._load()
+
+    @property
+    def model_name(self):
+        return self._model_name
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self._encoder = SentenceTransformer(self._model_name)
+        return self._encoder
+
+    @property
+    def index_path(self):
+        return os.path.join(self._path, self.INDEX_FILENAME)
+
+    @property
+    def keys_path(self):
+        return os.path.join(self._path, self.KEYS_FILENAME)
+
+    @property
+    def data_path(self):
+        return os.path.join(self._path, self.DATA_FILENAME)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return key in self._index
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def key(cls, uuid: str, text: str) -> str:
+        """key used to identify an embedding in the store."""
+        return f"{uuid or ''}:{cls.content_hash(text)}"
+
+    def _reset(self):
+        """removes the stored embeddings, e.g. when the files can not be used."""
+        for path in [self.index_path, self.keys_path, self.data_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self._index = {}
+        self._dim = None
+        self._count = 0
+        self._data = None
+
+    def _read_keys(self, header: dict) -> list[str]:
+        """keys of the rows, in row order. Only complete lines are kept."""
+        if 'keys' in header:
+            # index of older stores, with all the keys in index.json.
+            keys = sorted(header['keys'], key=header['keys'].get)
+            self._write_keys(keys)
+            self._write_header()
+            return keys
+        if not os.path.exists(self.keys_path):
+            return []
+        with open(self.keys_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        keys = content.split('\n')
+        # the last element is empty, or a line interrupted while being written.
+        return keys[:-1]
+
+    def _write_keys(self, keys: list[str]):
+        tmp_path = self.keys_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.writelines(f'{key}\n' for key in keys)
+        os.replace(tmp_path, self.keys_path)
+
+    def _write_header(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(dict(model_name=self._model_name, dim=self._dim), file)
+        os.replace(tmp_path, self.index_path)
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            self._reset()
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                header = json.load(file)
+            if header.get('model_name') != self._model_name:
+                raise ValueError(f"store was created for {header.get('model_name')}")
+            self._dim = header['dim']
+            keys = self._read_keys(header)
+        except Exception as exc:
+            self.logger.error('Failed to load embedding index %s. Starting empty. %s', self.index_path, exc)
+            self._reset()
+            return
+
+        row_size = self._dim * np.dtype(np.float32).itemsize
+        if not os.path.exists(self.data_path):
+            if len(keys) > 0:
+                self.logger.warning('Embedding data %s is missing. Starting empty.', self.data_path)
+            rows = 0
+        else:
+            rows = os.path.getsize(self.data_path) // row_size
+        # rows without a key, or keys without a complete row, were interrupted while being written.
+        self._count = min(len(keys), rows)
+        if rows != self._count or not os.path.exists(self.data_path):
+            with open(self.data_path, 'ab') as file:
+                file.truncate(self._count * row_size)
+        if len(keys) != self._count or not os.path.exists(self.keys_path):
+            self._write_keys(keys[:self._count])
+        self._index = {key: row for row, key in enumerate(keys[:self._count])}
+        self._map()
+        self.logger.debug('Loaded %d embeddings from %s', self._count, self._path)
+
+    def _map(self):
+        if self._count == 0:
+            self._data = None
+            return
+        self._data = np.memmap(
+            self.data_path,
+            dtype=np.float32,
+            mode='r',
+            shape=(self._count, self._dim))
+
+    def _append(self, keys: list[str], embeddings: np.ndarray):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self._dim is None:
+            self._dim = embeddings.shape[1]
+            self._write_header()
+        elif embeddings.shape[1] != self._dim:
+            raise ValueError(
+                f'Embedding dimension {embeddings.shape[1]} does not match store dimension {self._dim}')
+        # rows are written before their keys, so a key never points to a missing row.
+        with open(self.data_path, 'ab') as file:
+            embeddings.tofile(file)
+        with open(self.keys_path, 'a', encoding='utf-8') as file:
+            file.writelines(f'{key}\n' for key in keys)
+        for row, key in enumerate(keys, start=self._count):
+            self._index[key] = row
+        self._count += len(keys)
+        self._map()
+
+    def embed(self, documents: list[str], uuids: list[str] = None) -> np.ndarray:
+        """Returns the embeddings of documents, encoding only the ones missing from the store.
+
+        Args:
+            documents (list[str]): the documents to embed.
+            uuids (list[str], optional): the uuid of the article of each document. Defaults to None.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(documents), dim).
+        """
+        if uuids is None:
+            uuids = [None] * len(documents)
+        if len(uuids) != len(documents):
+            raise ValueError('uuids and documents should have the same length')
+        if len(documents) == 0:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+
+        keys = [self.key(uuid, document) for uuid, document in zip(uuids, documents)]
+        with self._lock:
+            missing = {}
+            for key, document in zip(keys, documents):
+                if key not in self._index and key not in missing:
+                    missing[key] = document
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+            if len(missing) > 0:
+                self.logger.debug(
+                    'Encoding %d of %d documents not found in store.', len(missing), len(keys))
+                embeddings = self.encoder.encode(
+                    list(missing.values()), batch_size=self._batch_size)
+                self._append(list(missing.keys()), np.asarray(embeddings))
+            rows = np.fromiter((self._index[key] for key in keys), dtype=np.int64, count=len(keys))
+            return np.asarray(self._data[rows])
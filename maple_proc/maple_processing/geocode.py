@@ -0,0 +1,209 @@
+'''Persistent geocoding cache.'''
+import csv
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+
+class GeocodeCache:
+    """Geocode results stored in SQLite and keyed by the normalized place text.
+
+    Places not in the cache are geocoded with Nominatim (one shared, rate limited
+    geolocator) unless offline is set. Places that could not be geocoded are also
+    stored, so they are not requested again. The cache can be seeded from a local
+    gazetteer to work fully offline.
+    """
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS geocode (
+            key TEXT PRIMARY KEY,
+            text TEXT,
+            address TEXT,
+            latitude REAL,
+            longitude REAL,
+            address_type TEXT,
+            found INTEGER NOT NULL,
+            updated REAL NOT NULL
+        )'''
+
+    def __init__(
+        self,
+        path: str = ':memory:',
+        *,
+        geocoder=None,
+        offline: bool = False,
+        user_agent: str = 'maple',
+        min_delay_seconds: float = 1.0,
+    ):
+        """
+        Args:
+            path (str, optional): sqlite database file. Defaults to an in-memory database.
+            geocoder (optional): callable(text) returning a geopy Location or None. Defaults to a rate limited Nominatim geocoder created on first use.
+            offline (bool, optional): only cached places are returned. Defaults to False.
+            user_agent (str, optional): user agent of the Nominatim geolocator. Defaults to 'maple'.
+            min_delay_seconds (float, optional): minimum delay between Nominatim requests. Defaults to 1.0.
+        """
+        self.logger = logging.getLogger('GeocodeCache')
+        self._path = path
+        self._geocoder = geocoder
+        self._offline = offline
+        self._user_agent = user_agent
+        self._min_delay_seconds = min_delay_seconds
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(self._schema)
+        self._connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def offline(self):
+        return self._offline
+
+    @property
+    def geocoder(self):
+        if self._geocoder is None:
+            from geopy.geocoders import Nominatim
+            from geopy.extra.rate_limiter import RateLimiter
+            geolocator = Nominatim(user_agent=self._user_agent)
+            self._geocoder = RateLimiter(
+                geolocator.geocode, min_delay_seconds=self._min_delay_seconds)
+        return self._geocoder
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """key of a place text: case folded, without punctuation and repeated spaces."""
+        text = re.sub(r"[^\w\s'-]", ' ', text.casefold())
+        return ' '.join(text.split())
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        text, address, latitude, longitude, address_type, found = row
+        if not found:
+            return None
+        return dict(
+            text=text,
+            address=address,
+            latitude=latitude,
+            longitude=longitude,
+            address_type=address_type,
+        )
+
+    def _get(self, key: str):
+        return self._connection.execute(
+            'SELECT text, address, latitude, longitude, address_type, found FROM geocode WHERE key = ?',
+            (key,)).fetchone()
+
+    def _put_many(self, rows: list[tuple]):
+        self._connection.executemany(
+            'INSERT OR REPLACE INTO geocode '
+            '(key, text, address, latitude, longitude, address_type, found, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            rows)
+        self._connection.commit()
+
+    def put(self, text: str, latitude: float, longitude: float, address: str = None, address_type: str = None):
+        """stores the coordinates of a place."""
+        with self._lock:
+            self._put_many([(
+                self.normalize(text), text, address or text, latitude, longitude,
+                address_type or '', 1, time.time())])
+
+    def seed_gazetteer(self, path: str, delimiter: str = ',') -> int:
+        """Seeds the cache from a gazetteer file.
+
+        The file has a header with the columns name, latitude and longitude, and optionally
+        address and address_type. Existing entries are replaced.
+
+        Returns:
+            int: number of places stored.
+        """
+        rows = []
+        now = time.time()
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            for record in csv.DictReader(file, delimiter=delimiter):
+                try:
+                    rows.append((
+                        self.normalize(record['name']),
+                        record['name'],
+                        record.get('address') or record['name'],
+                        float(record['latitude']),
+                        float(record['longitude']),
+                        record.get('address_type') or '',
+                        1,
+                        now))
+                except (KeyError, TypeError, ValueError) as exc:
+                    self.logger.warning('Invalid gazetteer record %s. %s', record, exc)
+        with self._lock:
+            self._put_many(rows)
+        self.logger.debug('Seeded %d places from %s', len(rows), path)
+        return len(rows)
+
+    def _geocode(self, text: str) -> tuple:
+        try:
+            location = self.geocoder(text)
+        except Exception as exc:
+            # not cached, so it is attempted again later.
+            self.logger.error('Failed to geocode %s. %s', text, exc)
+            return None
+        if location is None:
+            return (self.normalize(text), text, None, None, None, None, 0, time.time())
+        return (
+            self.normalize(text),
+            text,
+            location.address,
+            location.latitude,
+            location.longitude,
+            location.raw.get('addresstype', '') if hasattr(location, 'raw') else '',
+            1,
+            time.time())
+
+    def lookup(self, text: str) -> dict:
+        """Geocodes a place.
+
+        Returns:
+            dict: text, address, latitude, longitude and address_type, or None if the place was not found.
+        """
+        return self.lookup_many([text])[text]
+
+    def lookup_many(self, texts: list[str]) -> dict:
+        """Geocodes places, requesting each unique place not in the cache only once.
+
+        Returns:
+            dict: text -> result of lookup.
+        """
+        keys = {text: self.normalize(text) for text in texts}
+        results = {}
+        # normalized key -> first text found with that key.
+        missing = {}
+        with self._lock:
+            for text, key in keys.items():
+                if key in results or key in missing:
+                    continue
+                row = self._get(key)
+                if row is None:
+                    missing[key] = text
+                else:
+                    results[key] = self._to_dict(row)
+        self.hits += len(results)
+        self.misses += len(missing)
+
+        if len(missing) > 0 and not self._offline:
+            rows = []
+            for key, text in missing.items():
+                row = self._geocode(text)
+                if row is not None:
+                    rows.append(row)
+                    results[key] = self._to_dict(row[1:7])
+            with self._lock:
+                self._put_many(rows)
+        return {text: results.get(key) for text, key in keys.items()}
@@ -0,0 +1,85 @@
+'''State kept between model iterations to update models incrementally.'''
+import time
+
+
+class IncrementalState:
+    """Models and results of the last complete model iteration of a model family.
+
+    Args:
+        models (dict): level -> trained MapleModel.
+        topics (dict): level -> {topic index: Topic} as stored in the backend.
+        documents (dict): uuid of the training articles -> (content hash, {level: topic index}).
+        classified (dict): uuid of the classified articles -> (content hash, topic indexes per level,
+            probabilities per level, position).
+        baseline_outlier_rate (float): outlier rate of level 1 when the models were fully trained.
+        position_version (int): version of the position model used for the positions.
+        trained_at (float, optional): time of the last full training. Defaults to now.
+    """
+
+    def __init__(
+        self,
+        models: dict,
+        topics: dict,
+        documents: dict,
+        classified: dict,
+        baseline_outlier_rate: float,
+        position_version: int,
+        trained_at: float = None,
+    ):
+        self.models = models
+        self.topics = topics
+        self.documents = documents
+        self.classified = classified
+        self.baseline_outlier_rate = baseline_outlier_rate
+        self.position_version = position_version
+        self.trained_at = trained_at if trained_at is not None else time.time()
+
+    def expired(self, full_retrain_hours: float) -> bool:
+        """whether a full retrain is due by schedule."""
+        if full_retrain_hours is None:
+            return False
+        return time.time() - self.trained_at >= full_retrain_hours * 3600
+
+    def is_known(self, uuid: str, content_hash: str) -> bool:
+        """whether the training article was used by the models with the same content."""
+        document = self.documents.get(uuid)
+        return document is not None and document[0] == content_hash
+
+
+def keyword_overlap(first: list[str], second: list[str]) -> float:
+    """jaccard similarity of two keyword lists."""
+    first, second = set(first or []), set(second or [])
+    if len(first) == 0 or len(second) == 0:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def match_topics(topic_info: list, previous_topics: dict, min_overlap: float = 0.5) -> dict:
+    """Matches the topics of an updated model with the topics of the previous iteration.
+
+    Pairs are matched from the highest keyword overlap down, each previous topic being
+    matched at most once. Topics whose keywords changed too much are not matched.
+
+    Args:
+        topic_info (list): TopicInfo of the updated model.
+        previous_topics (dict): topic index -> Topic of the previous iteration.
+        min_overlap (float, optional): minimum keyword overlap of a match. Defaults to 0.5.
+
+    Returns:
+        dict: index of the updated topic -> matched previous Topic.
+    """
+    pairs = []
+    for topic in topic_info:
+        for index, previous_topic in previous_topics.items():
+            overlap = keyword_overlap(topic.keyword, previous_topic.keyword)
+            if overlap >= min_overlap:
+                # prefer the same index when overlaps are equal.
+                pairs.append((overlap, topic.index == index, topic.index, index))
+    matches = dict()
+    matched_previous = set()
+    for _, _, topic_index, index in sorted(pairs, reverse=True):
+        if topic_index in matches or index in matched_previous:
+            continue
+        matches[topic_index] = previous_topics[index]
+        matched_previous.add(index)
+    return matches
@@ -0,0 +1,123 @@
+'''Process-wide pool of the http clients used by the LLM backends.'''
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger('LLMClientPool')
+
+
+class LLMClientPool:
+    """Reuses LLM clients, so requests keep their connections alive instead of paying
+    connection and TLS setup every time.
+
+    Clients are keyed by (provider, host, api_key) and by the running event loop, since
+    async clients can only be used from the loop that created them. Each client has a
+    bounded connection pool.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 32,
+        max_keepalive_connections: int = 8,
+        keepalive_expiry: float = 30.0,
+    ):
+        """
+        Args:
+            max_connections (int, optional): maximum connections of each client. Defaults to 32.
+            max_keepalive_connections (int, optional): idle connections kept alive by each openai client. Defaults to 8.
+            keepalive_expiry (float, optional): seconds an idle connection is kept alive. Defaults to 30.0.
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._clients = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def get(self, provider: str, host: str, api_key: str, factory):
+        """Client of (provider, host, api_key) for the running loop, created with factory if needed.
+
+        Clients of closed loops are dropped with a warning, they can not be closed anymore.
+        Close the clients before the loop is closed, e.g. with `run` or `close_clients`.
+        """
+        loop = asyncio.get_running_loop()
+        key = (provider, host, api_key, loop)
+        with self._lock:
+            for stale in [key_ for key_ in self._clients if key_[3].is_closed()]:
+                logger.warning(
+                    'Dropping %s client of a closed loop without closing it. '
+                    'Clients should be closed before their loop.', stale[0])
+                del self._clients[stale]
+            client = self._clients.get(key)
+            if client is None:
+                client = factory()
+                self._clients[key] = client
+        return client
+
+    def openai(self, api_key: str, base_url: str = None):
+        """AsyncOpenAI client of api_key."""
+        def factory():
+            import httpx
+            from openai import AsyncOpenAI
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry),
+                timeout=httpx.Timeout(600, connect=5.0),
+                follow_redirects=True)
+            return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        return self.get('openai', base_url, api_key, factory)
+
+    def session(self, host: str, api_key: str = None):
+        """aiohttp session of a personalized backend host."""
+        def factory():
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_expiry)
+            return aiohttp.ClientSession(connector=connector, trust_env=True)
+        return self.get('personalized', host, api_key, factory)
+
+    async def close(self):
+        """closes the clients of the running loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [key for key in self._clients if key[3] is loop]
+            clients = [self._clients.pop(key) for key in keys]
+        for key, client in zip(keys, clients):
+            try:
+                await client.close()
+            except Exception as exc:
+                logger.error('Failed to close %s client. %s', key[0], exc)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> LLMClientPool:
+    """the pool shared by the LLM helpers of maple_processing.process."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = LLMClientPool()
+        return _default_pool
+
+
+async def close_clients():
+    """closes the shared clients of the running loop, e.g. on shutdown."""
+    if _default_pool is not None:
+        await _default_pool.close()
+
+
+def run(coroutine):
+    """asyncio.run of coroutine, closing the shared clients it used before the loop is closed."""
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await close_clients()
+    return asyncio.run(main())
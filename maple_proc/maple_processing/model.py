@@ -1,9 +1,7 @@
 from abc import abstractmethod
 import logging
 import os
-from maple_chatgpt.chatgpt_client import ChatgptClient
 from maple_structures import Article
-from maple_interface import MapleAPI
 from maple_structures import Processed, ModelIteration, Model, Topic
 from bertopic import BERTopic
 from hdbscan import HDBSCAN
@@ -13,10 +11,11 @@ from sklearn.feature_extraction.text import CountVectorizer
 from bertopic.representation import KeyBERTInspired
 from bertopic.representation import BaseRepresentation
 from umap import UMAP
-import requests
 import timeit
-from sentence_transformers import SentenceTransformer
+import numpy as np
 from typing import List, Tuple, Union, Mapping, Any, Callable, Iterable
+from .embedding import DEFAULT_EMBEDDING_MODEL
+from .context import IterationContext, SharedReduction
 
 logging.getLogger('numba').setLevel(logging.WARNING)
 
@@ -38,6 +37,39 @@ class TopicInfo:
         self.representative_docs = representative_docs
         
 
+class TopicLookup:
+    """Maps the topic indexes returned by a model to Topic structures.
+
+    The lookup is an object array indexed by topic index (shifted so that the outlier
+    topic -1 is valid), so a whole page is assigned with a single gather.
+    """
+
+    def __init__(self, topics: list[Topic]):
+        by_index = {topic.index: topic for topic in topics or [] if topic.index is not None}
+        self._offset = -min(min(by_index, default=0), 0)
+        self._lookup = np.full(max(by_index, default=0) + self._offset + 1, None, dtype=object)
+        self._uuid_lookup = np.full(len(self._lookup), None, dtype=object)
+        for index, topic in by_index.items():
+            self._lookup[index + self._offset] = topic
+            self._uuid_lookup[index + self._offset] = topic.uuid
+
+    def _gather(self, lookup: np.ndarray, topic_indexes) -> np.ndarray:
+        indexes = np.asarray(topic_indexes, dtype=np.int64) + self._offset
+        if indexes.size > 0 and (indexes.min() < 0 or indexes.max() >= len(lookup)):
+            raise KeyError('Topic index not found in model structure.')
+        out = lookup[indexes]
+        if any(value is None for value in out):
+            raise KeyError('Topic index not found in model structure.')
+        return out
+
+    def __getitem__(self, topic_indexes) -> np.ndarray:
+        return self._gather(self._lookup, topic_indexes)
+
+    def uuid(self, topic_indexes) -> np.ndarray:
+        """topic uuids of the topic indexes."""
+        return self._gather(self._uuid_lookup, topic_indexes)
+
+
 class MapleModel:
     def __init__(self,
                  model_type: str = None,
@@ -85,6 +117,11 @@ class MapleModel:
     def model_structure(self, model: Model):
         setattr(self, '_model_structure', model)
 
+    def reset_model_structure(self):
+        """discards the model structure, so the model can be registered in a new model iteration."""
+        if hasattr(self, '_model_structure'):
+            delattr(self, '_model_structure')
+
     def _verify_functions(self):
         
         required_functions = ['fit', 'transform']
@@ -93,7 +130,12 @@ class MapleModel:
                 raise TypeError('Missing required method %s', fun)
 
     @classmethod
-    def create_model(cls, level: int, training_size: int = None):
+    def create_iteration_context(cls) -> IterationContext:
+        """creates the context shared by all levels of a model iteration."""
+        return IterationContext()
+
+    @classmethod
+    def create_model(cls, level: int, training_size: int = None, context: IterationContext = None):
         raise NotImplementedError('create_model method not implemented.')
 
     @abstractmethod
@@ -103,6 +145,20 @@ class MapleModel:
     @abstractmethod
     def maple_save(self, model_path: str):
         raise NotImplementedError()
+
+    @classmethod
+    def maple_load(cls, model_path: str):
+        """loads a model stored with maple_save. The loaded model only needs to support transform."""
+        raise NotImplementedError('maple_load method not implemented.')
+
+    def maple_update(self, documents: list[str], topics: list[int]):
+        """Updates a trained model with new documents without refitting it.
+
+        Args:
+            documents (list[str]): documents of the current training set.
+            topics (list[int]): topic index of each document.
+        """
+        raise NotImplementedError('maple_update method not implemented.')
     
 
 class MapleBert(MapleModel, BERTopic):
@@ -154,8 +210,21 @@ class MapleBert(MapleModel, BERTopic):
             level=1,
             **kwargs)
 
+    @staticmethod
+    def create_umap_model() -> UMAP:
+        return UMAP(n_neighbors=15,
+                    n_components=5,
+                    min_dist=0,
+                    metric='cosine',
+                    random_state=123)
+
     @classmethod
-    def create_model(cls, level: int, training_size: int = None):
+    def create_iteration_context(cls) -> IterationContext:
+        """All levels share the same UMAP parameters, so the reduction is computed once per iteration."""
+        return IterationContext(reduction=SharedReduction(cls.create_umap_model()))
+
+    @classmethod
+    def create_model(cls, level: int, training_size: int = None, context: IterationContext = None):
         dbscan_kwargs = dict(
             metric='euclidean',
             cluster_selection_method='eom',
@@ -182,11 +251,10 @@ class MapleBert(MapleModel, BERTopic):
 
         hdbscan_model = HDBSCAN(**dbscan_kwargs)
 
-        umap_model = UMAP(n_neighbors=15,
-                          n_components=5,
-                          min_dist=0,
-                          metric='cosine',
-                          random_state=123)
+        if context is not None and context.reduction is not None:
+            umap_model = context.reduction
+        else:
+            umap_model = cls.create_umap_model()
 
         vectorizer_model = CountVectorizer(
             stop_words='english',
@@ -196,7 +264,10 @@ class MapleBert(MapleModel, BERTopic):
         keybert_model = KeyBERTInspired()
         representation_model = {"KeyBERT": keybert_model}
 
+        # embeddings are precomputed by MapleProcessing, the embedding model is
+        # still needed by KeyBERTInspired and when saving the model.
         return cls(
+            embedding_model=DEFAULT_EMBEDDING_MODEL,
             hdbscan_model=hdbscan_model,
             umap_model=umap_model,
             vectorizer_model=vectorizer_model,
@@ -225,6 +296,41 @@ class MapleBert(MapleModel, BERTopic):
             )
         return out
 
+    def maple_update(self, documents: list[str], topics: list[int]):
+        """Recomputes the topic representations and sizes with the current documents.
+
+        The clusters are kept, so topic indexes do not change. Topics without documents
+        keep their representative documents, otherwise they would disappear.
+        """
+        import pandas as pd
+        documents = list(documents)
+        topics = [int(topic) for topic in topics]
+        present = set(topics)
+        for topic, representative_docs in self.representative_docs_.items():
+            if topic not in present:
+                documents.extend(representative_docs)
+                topics.extend([topic] * len(representative_docs))
+
+        self.update_topics(
+            documents,
+            topics=topics,
+            top_n_words=self.top_n_words,
+            n_gram_range=self.n_gram_range,
+            vectorizer_model=self.vectorizer_model,
+            ctfidf_model=self.ctfidf_model,
+            representation_model=self.representation_model)
+        self._save_representative_docs(
+            pd.DataFrame({'Document': documents, 'Topic': topics, 'ID': range(len(documents))}))
+
+    @classmethod
+    def maple_load(cls, model_path: str) -> BERTopic:
+        """Loads a model saved with maple_save.
+
+        The clustering and dimensionality reduction models are not stored in safetensors,
+        so the loaded model assigns documents to the most similar topic embedding.
+        """
+        return BERTopic.load(model_path, embedding_model=DEFAULT_EMBEDDING_MODEL)
+
     def maple_save(self, model_path: str):
         os.makedirs(model_path, exist_ok=True)
         self.save(
@@ -3,10 +3,8 @@ import logging
 import re
 import heapq
 import asyncio
-import aiohttp
-import nltk
-from openai import AsyncOpenAI, api_key
 from maple_structures import Article
+from .llm_clients import get_client_pool
 
 
 logger = logging.getLogger('maple_proc')
@@ -67,6 +65,7 @@ def word_frequency(
     tags_to_keep: list = None,
     min_word_size: int = None
 ):
+    import nltk
     word_count = {}
     for article in articles:
         data = nltk.sent_tokenize(article.content)
@@ -113,10 +112,36 @@ def sentiment_analysis(articles: list[Article]) -> None:
         article.sentiment = sentiment.polarity_scores(article.content)
         
 
-async def chatgpt_summary_v2(prompt, content: str, api_key: str):
-    client = AsyncOpenAI(api_key=api_key)
+async def _chat_completion(client, response_hook=None, **kwargs):
+    """Creates a chat completion.
+
+    Args:
+        client (AsyncOpenAI): the openai client.
+        response_hook (callable, optional): called with the response headers and the used tokens. Defaults to None.
+    """
+    if response_hook is None:
+        return await client.chat.completions.create(**kwargs)
+    response = await client.chat.completions.with_raw_response.create(**kwargs)
+    completion = response.parse()
+    usage = getattr(completion, 'usage', None)
+    response_hook(response.headers, None if usage is None else usage.total_tokens)
+    return completion
+
+
+def _check_response(response, response_hook=None):
+    """reports the headers of a personalized backend response and raises on 429."""
+    if response_hook is not None:
+        response_hook(response.headers, None)
+    if response.status == 429:
+        response.raise_for_status()
+
+
+async def chatgpt_summary_v2(prompt, content: str, api_key: str, response_hook=None):
+    client = get_client_pool().openai(api_key)
     
-    completion = await client.chat.completions.create(
+    completion = await _chat_completion(
+        client,
+        response_hook,
         model="gpt-3.5-turbo-16k",
         messages=[
             {
@@ -129,7 +154,7 @@ async def chatgpt_summary_v2(prompt, content: str, api_key: str):
     return completion.choices[0].message.content
 
 async def chatgpt_summary(content: str, api_key: str):
-    client = AsyncOpenAI(api_key=api_key)
+    client = get_client_pool().openai(api_key)
     
     completion = await client.chat.completions.create(
         model="gpt-3.5-turbo-16k",
@@ -147,11 +172,13 @@ default_prompts = {
     'summary': "summarize in less than 300 words the following content: ",
 }
 
-async def chatgpt_topic_name(keywords: list[str], api_key: str):
-    client = AsyncOpenAI(api_key=api_key)
+async def chatgpt_topic_name(keywords: list[str], api_key: str, response_hook=None):
+    client = get_client_pool().openai(api_key)
        
     content = ', '.join(keywords)
-    completion = await client.chat.completions.create(
+    completion = await _chat_completion(
+        client,
+        response_hook,
         model="gpt-3.5-turbo-16k",
         messages=[
             {
@@ -164,10 +191,12 @@ async def chatgpt_topic_name(keywords: list[str], api_key: str):
     return completion.choices[0].message.content
 
 
-async def chatgpt_bullet_summary(content: list[str], api_key: str):
-    client = AsyncOpenAI(api_key=api_key)
+async def chatgpt_bullet_summary(content: list[str], api_key: str, response_hook=None):
+    client = get_client_pool().openai(api_key)
 
-    completion = await client.chat.completions.create(
+    completion = await _chat_completion(
+        client,
+        response_hook,
         model="gpt-3.5-turbo-16k",
         messages=[
             {
@@ -192,7 +221,39 @@ async def personalized_summary(
     prompt: str = None,
     timeout: int = 300,
     max_tokens: int = None,
+    response_hook=None,
     ):
+    data = await personalized_summary_many(
+        host=host,
+        port=port,
+        model_type=model_type,
+        contents=[content],
+        api_key=api_key,
+        prompt=prompt,
+        timeout=timeout,
+        max_tokens=max_tokens,
+        response_hook=response_hook,
+    )
+    if len(data) == 0:
+        return None
+    return data[0]
+
+async def personalized_summary_many(
+    host: str, 
+    port: str, 
+    model_type: str,
+    contents: list[str], 
+    api_key: str | None,
+    prompt: str = None,
+    timeout: int = 300,
+    max_tokens: int = None,
+    response_hook=None,
+    ) -> list:
+    """Summarizes several articles with one request, so the backend can batch the inference.
+
+    Returns:
+        list: the summaries, in the order of contents.
+    """
     headers = {}
     if api_key is not None:
         headers["x-api-key"] = api_key
@@ -201,24 +262,25 @@ async def personalized_summary(
         
     body = {
         "model_type": model_type,
-        "articles": [content],
+        "articles": contents,
         "prompt": prompt,
         }
     if max_tokens is not None:
         body["max_tokens"] = max_tokens
         
-    async with aiohttp.ClientSession(trust_env=True) as session:
-        async with session.post(
-            f"{host}:{port}/llm/article_summary",
-            headers=headers,
-            timeout=timeout,
-            json=body,
-            ssl=False,
-            ) as response:
-            data =  await response.json()
-            if len(data) == 0:
-                return None
-            return data[0]
+    session = get_client_pool().session(f"{host}:{port}", api_key)
+    async with session.post(
+        f"{host}:{port}/llm/article_summary",
+        headers=headers,
+        timeout=timeout,
+        json=body,
+        ssl=False,
+        ) as response:
+        _check_response(response, response_hook)
+        data =  await response.json()
+        if len(data) > 0 and len(data) != len(contents):
+            raise ValueError(f'Expected {len(contents)} summaries, received {len(data)}.')
+        return data
 
 async def personalized_topic_name(
     host: str, 
@@ -229,6 +291,7 @@ async def personalized_topic_name(
     prompt: str = None,
     timeout: int = 300,
     max_tokens: int = None,
+    response_hook=None,
     ):
     headers = {}
     if api_key is not None:
@@ -243,18 +306,19 @@ async def personalized_topic_name(
     if max_tokens is not None:
         body["max_tokens"] = max_tokens
         
-    async with aiohttp.ClientSession(trust_env=True) as session:
-        async with session.post(
-            f"{host}:{port}/llm/topic_name",
-            headers=headers,
-            timeout=timeout,
-            json=body,
-            ssl=False,
-            ) as response:
-            data =  await response.json()
-            if len(data) == 0:
-                return None
-            return data
+    session = get_client_pool().session(f"{host}:{port}", api_key)
+    async with session.post(
+        f"{host}:{port}/llm/topic_name",
+        headers=headers,
+        timeout=timeout,
+        json=body,
+        ssl=False,
+        ) as response:
+        _check_response(response, response_hook)
+        data =  await response.json()
+        if len(data) == 0:
+            return None
+        return data
 
 async def personalized_bullet_point(host: str, 
     port: str, 
@@ -263,7 +327,8 @@ async def personalized_bullet_point(host: str,
     api_key: str | None,
     prompt: str = None,
     timeout: int = 300,
-    max_tokens: int = None,):
+    max_tokens: int = None,
+    response_hook=None,):
     headers = {}
     if api_key is not None:
         headers["x-api-key"] = api_key
@@ -275,22 +340,29 @@ async def personalized_bullet_point(host: str,
     if max_tokens is not None:
         body["max_tokens"] = max_tokens
         
-    async with aiohttp.ClientSession(trust_env=True) as session:
-        async with session.post(
-            f"{host}:{port}/llm/bullet_point",
-            headers=headers,
-            timeout=timeout,
-            json=body,
-            ssl=False,
-            ) as response:
-            data =  await response.json()
-            if len(data) == 0:
-                return None
-            return data
+    session = get_client_pool().session(f"{host}:{port}", api_key)
+    async with session.post(
+        f"{host}:{port}/llm/bullet_point",
+        headers=headers,
+        timeout=timeout,
+        json=body,
+        ssl=False,
+        ) as response:
+        _check_response(response, response_hook)
+        data =  await response.json()
+        if len(data) == 0:
+            return None
+        return data
 
 class LLMProcess:
-    def __init__(self, config:dict):
+    def __init__(self, config:dict, response_hook=None):
+        """
+        Args:
+            config (dict): the chatgpt config.
+            response_hook (callable, optional): called with the headers and used tokens of each response. Defaults to None.
+        """
         self.set_config(config)
+        self._response_hook = response_hook
     
     def set_config(self, config: dict):
         self._config = config
@@ -365,11 +437,11 @@ class LLMProcess:
     async def get_summary(self, content: str, chatgpt_api_key: str):
         model_type = self.get_model_type()
         if not self._config:
-            return await chatgpt_summary_v2(self.summary_prompt, content, api_key=chatgpt_api_key)
+            return await chatgpt_summary_v2(self.summary_prompt, content, api_key=chatgpt_api_key, response_hook=self._response_hook)
         else:
             api_key_ = self.get_api_key(chatgpt_api_key)
             if model_type == 'ChatGPT':
-                return await chatgpt_summary_v2(self.summary_prompt, content, api_key=api_key_)
+                return await chatgpt_summary_v2(self.summary_prompt, content, api_key=api_key_, response_hook=self._response_hook)
             elif model_type == 'Personalized':
                 return await personalized_summary(
                     host=self._config['model']['host'],
@@ -378,16 +450,44 @@ class LLMProcess:
                     content=content,
                     api_key=self.get_api_key(),
                     prompt=self.summary_prompt,
+                    response_hook=self._response_hook,
                 )
         
+    @property
+    def supports_batch_summary(self) -> bool:
+        """whether the backend summarizes several articles with one request."""
+        return bool(self._config) and self.get_model_type() == 'Personalized'
+
+    async def get_summaries(self, contents: list[str], chatgpt_api_key: str) -> list:
+        """Summaries of several articles, with one request if the backend supports it.
+
+        Returns:
+            list: the summaries, in the order of contents.
+        """
+        if not self.supports_batch_summary:
+            return list(await asyncio.gather(
+                *[self.get_summary(content, chatgpt_api_key) for content in contents]))
+        data = await personalized_summary_many(
+            host=self._config['model']['host'],
+            port=self._config['model']['port'],
+            model_type=self.get_model_name(),
+            contents=contents,
+            api_key=self.get_api_key(),
+            prompt=self.summary_prompt,
+            response_hook=self._response_hook,
+        )
+        if len(data) == 0:
+            return [None] * len(contents)
+        return data
+
     async def get_topic_name(self, keywords: list[str], chatgpt_api_key: str):
         model_type = self.get_model_type()
         if not self._config:
-            return await chatgpt_topic_name(keywords, chatgpt_api_key)
+            return await chatgpt_topic_name(keywords, chatgpt_api_key, response_hook=self._response_hook)
         else:
             api_key_ = self.get_api_key(chatgpt_api_key)
             if model_type == 'ChatGPT':
-                return await chatgpt_topic_name(keywords, api_key_)
+                return await chatgpt_topic_name(keywords, api_key_, response_hook=self._response_hook)
             elif model_type == 'Personalized':
                 return await personalized_topic_name(
                     host=self._config['model']['host'],
@@ -396,16 +496,17 @@ class LLMProcess:
                     keywords=keywords,
                     api_key=api_key_,
                     prompt=self.topic_name_prompt,
+                    response_hook=self._response_hook,
                 )
     
     async def get_bullet_summary(self, content: list[str], chatgpt_api_key: str):
         model_type = self.get_model_type()
         if not self._config:
-            return await chatgpt_bullet_summary(content, chatgpt_api_key)
+            return await chatgpt_bullet_summary(content, chatgpt_api_key, response_hook=self._response_hook)
         else:
             api_key_ = self.get_api_key(chatgpt_api_key)
             if model_type == 'ChatGPT':
-                return await chatgpt_bullet_summary(content, api_key_)
+                return await chatgpt_bullet_summary(content, api_key_, response_hook=self._response_hook)
             elif model_type == 'Personalized':
                 return await personalized_bullet_point(
                     host=self._config['model']['host'],
@@ -414,5 +515,6 @@ class LLMProcess:
                     articles=content,
                     api_key=api_key_,
                     prompt=self.bullet_summary_prompt,
+                    response_hook=self._response_hook,
                 )
         
\ No newline at end of file
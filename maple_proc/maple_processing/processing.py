@@ -1,30 +1,47 @@
+import asyncio
+import contextlib
 import logging
 import os
+import queue
 import shutil
-from attr import has
-from httpx import get
-from torch import Value
-from umap import UMAP
+import threading
 import timeit
 import time
 import random
 import json
+import pickle
+from copy import copy, deepcopy
+from typing import TYPE_CHECKING
+import numpy as np
 import requests
-from sentence_transformers import SentenceTransformer
 from requests import Response
-from copy import deepcopy
-from rtpt_research import RTPTResearch
-from maple_chatgpt.chatgpt_client import ChatgptClient
 # from maple_processing.process import chatgpt_bullet_summary
-from maple_structures import Article
-from maple_interface import MapleAPI
-from maple_structures import Processed, ModelIteration, Model, Topic
-from .model import MapleBert, MapleModel
+from maple_structures import Article, ArticleLite
+from maple_interface import MapleAPI, AsyncMapleAPI, RetryPolicy
+from maple_structures import Processed, ProcessedBatch, ModelIteration, Model, Topic
+from .model import MapleBert, MapleModel, TopicLookup
+from .embedding import EmbeddingStore, DEFAULT_EMBEDDING_MODEL
+from .incremental import IncrementalState, match_topics
+from .checkpoint import IterationCheckpoint
+
+if TYPE_CHECKING:
+    # socketio is only needed by the processes that use a chatgpt client.
+    from maple_chatgpt.chatgpt_client import ChatgptClient
 
 
 class MapleProcessing:
     DEBUG_LIMIT_PROCESS_COUNT = 2000
     ARTICLE_PAGE_SIZE=200
+    ARTICLE_PREFETCH=2
+    POST_QUEUE_SIZE=2
+    # only these article fields are used, so articles are kept as ArticleLite.
+    ARTICLE_FIELDS=('uuid', 'url', 'createDate', 'chat_summary')
+    # minimum number of new training articles to evaluate drift.
+    DRIFT_MIN_DOCUMENTS=20
+    # minimum keyword overlap for an updated topic to keep the label of a previous topic.
+    TOPIC_MATCH_MIN_OVERLAP=0.5
+    # position model stored with the model iteration, used by MapleClassifier.
+    POSITION_MODEL_FILENAME='position_model.pkl'
 
     def __init__(
         self, *,
@@ -34,10 +51,40 @@ class MapleProcessing:
         max_hours: float = 30*24,
         article_train_min_size: int = 400,
         debug_limits: bool = False,
-        chatgpt_client: ChatgptClient = None,
+        chatgpt_client: 'ChatgptClient' = None,
         model_iteration_datapath: str = 'data',
+        embedding_cache_path: str = None,
+        incremental: bool = False,
+        full_retrain_hours: float = 24,
+        drift_threshold: float = 0.2,
+        parallel_training: bool = False,
+        training_workers: int = None,
+        cpu_semaphore: threading.Semaphore = None,
+        embedding_store: EmbeddingStore = None,
+        checkpoint: bool = True,
+        max_resume_attempts: int = 3,
+        write_retry_policy: RetryPolicy = None,
         # **kwargs,
     ):
+        """
+        Args:
+            incremental (bool, optional): reuse the models of the last complete iteration, adding
+                the new training articles and reclassifying only new or changed articles. Defaults to False.
+            full_retrain_hours (float, optional): in incremental mode, hours between full retrains. Defaults to 24.
+            drift_threshold (float, optional): in incremental mode, a full retrain happens when the level 1
+                outlier rate of new training articles exceeds the rate of the last full training by this value. Defaults to 0.2.
+            parallel_training (bool, optional): train the model levels concurrently in worker processes. Defaults to False.
+            training_workers (int, optional): number of worker processes for parallel_training. Defaults to one per level.
+            cpu_semaphore (threading.Semaphore, optional): acquired only around the cpu bound phases (training, embedding,
+                position fitting and classification), to limit them across concurrent model families. Defaults to None.
+            embedding_store (EmbeddingStore, optional): embedding store shared with other instances. Defaults to a store in embedding_cache_path.
+            checkpoint (bool, optional): store the progress of model iterations, so a failed iteration is resumed
+                instead of deleted once its models are trained. Defaults to True.
+            max_resume_attempts (int, optional): attempts to resume a failed model iteration before deleting it. Defaults to 3.
+            write_retry_policy (RetryPolicy, optional): policy of the backend writes of a model iteration (processed,
+                topics, models and model iteration). Defaults to the policy of maple retrying forever, since a
+                write failing after hours of training would fail the whole model iteration.
+        """
         self.logger = logging.getLogger('MapleProcessing')
         self.maple_api = maple
         self._last_updated_maple_config = None
@@ -50,16 +97,41 @@ class MapleProcessing:
         self._debug_limits = debug_limits
         self._chatgpt_client = chatgpt_client
         self._model_iteration_datapath = model_iteration_datapath
+        self._embedding_cache_path = embedding_cache_path or os.path.join(
+            model_iteration_datapath, 'embeddings')
+        self._incremental = incremental
+        self._full_retrain_hours = full_retrain_hours
+        self._drift_threshold = drift_threshold
+        self._parallel_training = parallel_training
+        self._training_workers = training_workers
+        self._cpu_semaphore = cpu_semaphore
+        self._embedding_store = embedding_store
+        self._checkpointing = checkpoint
+        self._max_resume_attempts = max_resume_attempts
+        if write_retry_policy is None:
+            write_retry_policy = copy(maple.retry_policy)
+            write_retry_policy.max_attempts = None
+        self._write_retry_policy = write_retry_policy
+        # model family -> IncrementalState of its last complete iteration.
+        self._incremental_states = dict()
+        self._position_version = 0
         self._init_vars()
 
     def _init_vars(self):
         self.model_level1 = None
         self.model_level2 = None
         self.model_level3 = None
+        self._context = None
+        self._topic_lookups = None
         self._model_iteration = ModelIteration()
         self._training_data = []
         self._article_classified = []
         self._processed = []
+        # state whose classification can be reused, when models were updated incrementally.
+        self._incremental_state = None
+        self._classification_rows = dict()
+        self._requested_topic_uuids = set()
+        self._checkpoint = IterationCheckpoint()
     
     @property
     def maple_config(self):
@@ -80,6 +152,11 @@ class MapleProcessing:
             self.model_level3,
         ]
 
+    @property
+    def model_families(self) -> list[type[MapleModel]]:
+        """model families trained in each model iteration."""
+        return list(self._models)
+
     @property
     def model_iteration_path(self):
         if not hasattr(self, '_model_iteration_datapath'):
@@ -92,20 +169,40 @@ class MapleProcessing:
             self._model_iteration_datapath,
             self._model_iteration.uuid)
         
-    def _maple_embed_documents(self, documents: list[str]):
-        if not hasattr(self, '_sentence_transformer'):
-            self._sentence_transformer = SentenceTransformer(
-                'all-MiniLM-L6-v2')
-        return self._sentence_transformer.encode(documents)
+    @property
+    def embedding_store(self) -> EmbeddingStore:
+        if getattr(self, '_embedding_store', None) is None:
+            self._embedding_store = EmbeddingStore(
+                self._embedding_cache_path,
+                model_name=DEFAULT_EMBEDDING_MODEL)
+        return self._embedding_store
+
+    def _maple_embed_documents(self, documents: list[str], uuids: list[str] = None):
+        return self.embedding_store.embed(documents, uuids=uuids)
 
-    def _detect_positions(self, documents: list[str], fit: bool = False):
+    def _maple_embed_articles(self, articles: list[Article]):
+        """Embeds the chat_summary of articles, reusing embeddings stored in previous runs."""
+        tstart = timeit.default_timer()
+        articles = [article for article in articles if hasattr(article, 'chat_summary')]
+        embeddings = self._maple_embed_documents(
+            self._extract_chat_summaries(articles),
+            uuids=[article.uuid for article in articles])
+        self.logger.debug(
+            "Time for _maple_embed_articles: %.2fs (store hits: %d, misses: %d)",
+            timeit.default_timer()-tstart,
+            self.embedding_store.hits,
+            self.embedding_store.misses)
+        return embeddings
+
+    def _detect_positions(self, embeddings, fit: bool = False):
         tstart = timeit.default_timer()
-        embeddings = self._maple_embed_documents(documents)
         if not hasattr(self, '_umap_model'):
+            from umap import UMAP
             self._umap_model = UMAP(n_neighbors=10, n_components=2, min_dist=0.0,
                                     metric='cosine')
         if fit:
             self._umap_model.fit(embeddings)
+            self._position_version += 1
         positions = self._umap_model.transform(embeddings)
         self.logger.debug("Time for _detect_positions: %.2fs", timeit.default_timer()-tstart)
         return positions
@@ -123,7 +220,28 @@ class MapleProcessing:
             setattr(self, modelname, maple_model)
             self._model_iteration.add_model_level(
                 modelname, maple_model.model_structure)
+        self._post_model_iteration()
+
+    def _reuse_models(self, state: IncrementalState):
+        """Registers copies of the models of the last complete iteration in a new model iteration.
+
+        The models of state are not modified, so they are still valid if the iteration fails.
+        All levels are copied at once, so they keep sharing one reduction.
+        """
+        models = deepcopy(state.models)
+        for level in range(1, 4):
+            modelname = f'model_level{level}'
+            maple_model = models[level]
+            maple_model.reset_model_structure()
+            if level == 1:
+                self._model_iteration.type = maple_model.type
+                self._model_iteration.name = maple_model.name
+            setattr(self, modelname, maple_model)
+            self._model_iteration.add_model_level(
+                modelname, maple_model.model_structure)
+        self._post_model_iteration()
 
+    def _post_model_iteration(self):
         # Update database: create model_iteration and models.
         model_iteration = self.maple_api.model_iteration_post(
             self._model_iteration)
@@ -136,7 +254,9 @@ class MapleProcessing:
             self.model_level3.model_structure = model_iteration.model_level3
 
     def _classify_all_articles(self):
-        self._model_iteration.article_classified = 0
+        # classification continues after the pages recorded in the checkpoint.
+        self._model_iteration.article_classified = self._checkpoint.article_classified
+        self._article_classified = [ArticleLite.from_json(article) for article in self._checkpoint.articles()]
         self._update_model_iteration(keep_fields=['article_classified'])
         # update status to classifying
         for level in range(1, 4):
@@ -161,107 +281,89 @@ class MapleProcessing:
                 skip_article_count = 0
         else:
             skip_article_count = 0
+        if self._checkpoint.skip is None:
+            self._checkpoint.skip = skip_article_count
+            self._checkpoint.save()
+        else:
+            skip_article_count = self._checkpoint.skip
 
-        for articles_it in self.maple_api.article_iterator(limit=self.ARTICLE_PAGE_SIZE, page=0, skip=skip_article_count):
-            time_start = timeit.default_timer()
+        # topics do not change while classifying, so index->Topic lookups are built once.
+        self._topic_lookups = {
+            level: TopicLookup(getattr(self, f'model_level{level}').model_structure.topic)
+            for level in range(1, 4)}
 
-            # remove articles without chat_summaries.
-            articles = []
-            for article in articles_it:
-                if hasattr(article, 'chat_summary'):
-                    articles.append(article)
+        # Pipeline: the article iterator fetches pages in a background thread,
+        # this thread computes the classification, and the poster thread sends
+        # processed to the backend. Bounded queues provide backpressure.
+        stage_times = dict(fetch_wait=0.0, compute=0.0, post_wait=0.0, post=0.0)
+        post_queue = queue.Queue(maxsize=self.POST_QUEUE_SIZE)
+        # exception of the poster thread, raised in this thread to stop the iteration.
+        post_errors = []
+        poster = threading.Thread(
+            target=self._processed_poster,
+            args=(post_queue, stage_times, post_errors),
+            name='ProcessedPoster',
+            daemon=True)
+        poster.start()
+        articles_submitted = 0
+        page = self._checkpoint.cursor
+        if page > 0:
+            self.logger.info('Resuming classification from page %d.', page)
+        articles_iterator = self.maple_api.article_iterator(
+            limit=self.ARTICLE_PAGE_SIZE,
+            page=page,
+            skip=skip_article_count,
+            prefetch=self.ARTICLE_PREFETCH,
+            fields=self.ARTICLE_FIELDS)
+        try:
+            while len(post_errors) == 0:
+                tstart_fetch = timeit.default_timer()
+                articles_it = next(articles_iterator, None)
+                elapsed_fetch = timeit.default_timer()-tstart_fetch
+                stage_times['fetch_wait'] += elapsed_fetch
+                if articles_it is None:
+                    break
+                page += 1
+                if self._checkpoint.completed(page - 1):
+                    # posted before the iteration was resumed.
+                    continue
 
-            if len(articles) == 0:
-                continue
+                tstart_compute = timeit.default_timer()
+                articles, processed_list = self._classify_articles(articles_it)
+                elapsed_compute = timeit.default_timer()-tstart_compute
+                stage_times['compute'] += elapsed_compute
 
-            # extract summaries from articles
-            tstart_summaries = timeit.default_timer()
-            summaries = self._extract_chat_summaries(articles)
-            self.logger.debug("Extract summaries: %.2fs", timeit.default_timer()-tstart_summaries)
-            
-            tstart_positions = timeit.default_timer()
-            positions = self._detect_positions(summaries)
-            self.logger.debug("Detect positions: %.2fs",timeit.default_timer()-tstart_positions)
-            
-            # create processed objects
-            processed_list = []
-            for article, position in zip(articles, positions.tolist()):
-                processed_list.append(
-                    Processed(
-                        article=article,
-                        modelIteration=self._model_iteration,
-                        position=position,
-                    )
-                )
+                tstart_post_wait = timeit.default_timer()
+                post_queue.put((page - 1, articles, processed_list))
+                elapsed_post_wait = timeit.default_timer()-tstart_post_wait
+                stage_times['post_wait'] += elapsed_post_wait
+                articles_submitted += len(articles)
 
-            # classify on all levels, then set the processed fields
-            for level in range(1, 4):
-                tstart = timeit.default_timer()
-                self.logger.debug('Classifying %d articles using model %s', len(
-                    articles), f'model_level{level}')
-                model = getattr(self, f'model_level{level}')
-                topic_indexes, probabilities = model.transform(summaries)
-                for processed, topic_index, probs in zip(processed_list, topic_indexes, probabilities):
-                    topic = [
-                        topic for topic in model.model_structure.topic if topic.index == topic_index][0]
-                    setattr(processed, f'topic_level{level}', topic)
-                    setattr(processed, f'topic_level{level}_prob', probs)
-                elapsed=timeit.default_timer()-tstart
-                self.logger.debug("Classification time: %.2fs", elapsed)
-            # send all processed objects to backend
-            self.logger.debug(
-                'Posting %d processed on backend.', len(processed_list))
-            try:
-                tstart_post = timeit.default_timer()
-                response = self.maple_api.processed_post_many(processed_list)
-                
-                if isinstance(response, Response):
-                    self.logger.warning("Failed to post processed. %s, %d", response, response.status_code)
-                    pliststart = 0
-                    plistsize = 100
-                    self.logger.info("Breaking down processed into chunks of %d processed", plistsize)
-                    while True:
-                        if pliststart > len(processed_list):
-                            break
-                        response = self.maple_api.processed_post_many(
-                            processed_list[pliststart:(pliststart+plistsize)])
-                        if response is True:
-                            self.logger.debug('Successfully sent processed from %d to %d', pliststart, pliststart+plistsize)
-                            pliststart+= plistsize
-                        elif isinstance(response, Response):
-                            wait_time=random.random()*2
-                            self.logger.error('Failed to post processed. Reattempting in %.2fs. %s', response, wait_time)
-                            time.sleep(wait_time)
-                self.logger.debug("Time to post processed: %.2fs", timeit.default_timer()-tstart_post)
-                self._model_iteration.article_classified += len(processed_list)
-                self._update_model_iteration(keep_fields=['article_classified'])
-                
-                # store articles and processed
-                for var in ['_article_classified']:
-                    if not hasattr(self, var):
-                        setattr(self, var, [])
-
-                tstart_extend = timeit.default_timer()
-                getattr(
-                    self,
-                    '_article_classified'
-                ).extend(articles)
-                self.logger.debug("Time for extending articles: %.2fs",timeit.default_timer()-tstart_extend)
-            
-                
-            except Exception as exc:
-                self.logger.error('Failed to post processed. %s', exc)
+                self.logger.info(
+                    'Classification cycle for %d articles was %.2f seconds (waited %.2fs for fetch, %.2fs for poster). %d articles submitted.',
+                    len(articles),
+                    elapsed_compute,
+                    elapsed_fetch,
+                    elapsed_post_wait,
+                    articles_submitted)
 
-            self.logger.info(
-                'Classification cycle for %d articles was %f seconds. %d articles classified.',
-                len(articles),
-                timeit.default_timer()-time_start,
-                self._model_iteration.article_classified)
+                if self._debug_limits:
+                    if articles_submitted >= self.DEBUG_LIMIT_PROCESS_COUNT:
+                        break
+        finally:
+            post_queue.put(None)
+            poster.join()
+            articles_iterator.close()
+        if len(post_errors) > 0:
+            raise post_errors[0]
+
+        self.logger.info(
+            'Classification stage times: fetch wait %.2fs, compute %.2fs, poster wait (backpressure) %.2fs, post %.2fs.',
+            stage_times['fetch_wait'],
+            stage_times['compute'],
+            stage_times['post_wait'],
+            stage_times['post'])
 
-            if self._debug_limits:
-                if self._model_iteration.article_classified >= self.DEBUG_LIMIT_PROCESS_COUNT:
-                    break
-        
         # retrieve all processed.
         setattr(self, '_processed', self.retrieve_processed())
         # for level in range(1, 4):
@@ -269,27 +371,191 @@ class MapleProcessing:
         #             f'model_level{level}').status = 'complete'
         self._update_model_iteration(keep_fields=['article_classified'])
 
-    # def _classify_articles(self, articles: list[Article], create_processed: bool = True):
-    #     pass
+    def _classify_articles(self, articles: list[Article]):
+        """Compute stage of the classification pipeline.
+
+        When the models were updated incrementally, articles classified in the last
+        complete iteration with the same content keep their results.
+
+        Returns:
+            tuple: the articles with chat_summary and their ProcessedBatch.
+        """
+        # remove articles without chat_summaries.
+        articles = [article for article in articles if hasattr(article, 'chat_summary')]
+        if len(articles) == 0:
+            return articles, ProcessedBatch()
+
+        state = self._incremental_state
+        reused = []
+        computed = []
+        for article in articles:
+            content_hash = EmbeddingStore.content_hash(article.chat_summary)
+            row = state.classified.get(article.uuid) if state is not None else None
+            if row is not None and row[0] == content_hash:
+                reused.append((article, row))
+            else:
+                computed.append((article, content_hash))
+
+        processed = self._reuse_classification(reused)
+        with self._cpu_slot():
+            processed.extend(self._compute_classification(computed))
+        if len(reused) > 0:
+            self.logger.debug(
+                'Reused classification of %d articles, classified %d articles.', len(reused), len(computed))
+        return [article for article, _ in reused] + [article for article, _ in computed], processed
+
+    def _reuse_classification(self, reused: list[tuple]) -> ProcessedBatch:
+        processed = ProcessedBatch(
+            model_iteration_uuid=self._model_iteration.uuid,
+            article=[article.uuid for article, _ in reused],
+            position=[row[3] for _, row in reused])
+        for level in range(1, 4):
+            setattr(processed, f'topic_level{level}',
+                    self._topic_lookups[level].uuid([row[1][level-1] for _, row in reused]).tolist())
+            setattr(processed, f'topic_level{level}_prob',
+                    np.asarray([row[2][level-1] for _, row in reused], dtype=np.float64))
+        for article, row in reused:
+            self._classification_rows[article.uuid] = row
+        return processed
+
+    def _compute_classification(self, computed: list[tuple]) -> ProcessedBatch:
+        articles = [article for article, _ in computed]
+        if len(articles) == 0:
+            return ProcessedBatch()
+
+        # extract summaries from articles
+        summaries = self._extract_chat_summaries(articles)
+        embeddings = self._maple_embed_articles(articles)
+
+        tstart_positions = timeit.default_timer()
+        positions = self._detect_positions(embeddings)
+        self.logger.debug("Detect positions: %.2fs",timeit.default_timer()-tstart_positions)
+
+        # classify on all levels
+        processed = ProcessedBatch(
+            model_iteration_uuid=self._model_iteration.uuid,
+            article=[article.uuid for article in articles],
+            position=positions)
+        indexes = []
+        probs = []
+        for level in range(1, 4):
+            tstart = timeit.default_timer()
+            self.logger.debug('Classifying %d articles using model %s', len(
+                articles), f'model_level{level}')
+            model = getattr(self, f'model_level{level}')
+            topic_indexes, probabilities = model.transform(summaries, embeddings=embeddings)
+            setattr(processed, f'topic_level{level}',
+                    self._topic_lookups[level].uuid(topic_indexes).tolist())
+            setattr(processed, f'topic_level{level}_prob',
+                    np.asarray(probabilities, dtype=np.float64))
+            indexes.append(np.asarray(topic_indexes).tolist())
+            probs.append(getattr(processed, f'topic_level{level}_prob').tolist())
+            elapsed=timeit.default_timer()-tstart
+            self.logger.debug("Classification time: %.2fs", elapsed)
+
+        # kept for the next iteration in incremental mode.
+        if self._incremental:
+            for row, (article, content_hash) in enumerate(computed):
+                self._classification_rows[article.uuid] = (
+                    content_hash,
+                    tuple(level_indexes[row] for level_indexes in indexes),
+                    tuple(level_probs[row] for level_probs in probs),
+                    tuple(processed.position[row].tolist()))
+        return processed
+
+    def _processed_poster(self, post_queue: queue.Queue, stage_times: dict, post_errors: list):
+        """Post stage of the classification pipeline. Runs until it receives None.
+
+        When a page can not be posted, the exception is added to post_errors and the
+        following pages are discarded, so the classification stops and the page is not
+        recorded in the checkpoint.
+        """
+        while True:
+            item = post_queue.get()
+            if item is None:
+                return
+            if len(post_errors) > 0:
+                continue
+            page, articles, processed_list = item
+            tstart_post = timeit.default_timer()
+            try:
+                # pages without articles to classify are only recorded, keeping the cursor contiguous.
+                if len(articles) > 0:
+                    self._post_processed(page, articles, processed_list)
+                self._checkpoint.record_page(
+                    page,
+                    [dict(
+                        uuid=article.uuid,
+                        url=article.url,
+                        createDate=getattr(article, 'createDate', None),
+                        chat_summary=article.chat_summary,
+                    ) for article in articles],
+                    self._model_iteration.article_classified)
+            except Exception as exc:
+                self.logger.error('Failed to post processed of page %d. %s', page, exc)
+                post_errors.append(exc)
+                continue
+            elapsed = timeit.default_timer()-tstart_post
+            stage_times['post'] += elapsed
+            self.logger.debug(
+                "Time to post processed: %.2fs. %d articles classified. %d pages waiting to be posted.",
+                elapsed,
+                self._model_iteration.article_classified,
+                post_queue.qsize())
+
+    def _post_processed(self, page: int, articles: list[Article], processed_list: ProcessedBatch):
+        """Posts the processed of a page of articles.
+
+        When the whole page can not be posted at once, it is posted in chunks and every
+        posted chunk is recorded in the checkpoint, so a resumed iteration only posts the
+        processed of the remaining articles of the page.
+        """
+        article_count = len(processed_list)
+        posted = self._checkpoint.posted_articles(page)
+        if len(posted) > 0:
+            # part of the page was posted before the iteration failed.
+            processed_list = processed_list.take(
+                [row for row, article_uuid in enumerate(processed_list.article) if article_uuid not in posted])
+            self.logger.info('Page %d was partially posted, posting the %d remaining processed.', page, len(processed_list))
+            response = None
+        else:
+            # send all processed objects to backend
+            self.logger.debug(
+                'Posting %d processed on backend.', len(processed_list))
+            response = self.maple_api.processed_post_many(processed_list)
+            if isinstance(response, Response):
+                self.logger.warning("Failed to post processed. %s, %d", response, response.status_code)
+
+        if response is not True:
+            plistsize = 100
+            self.logger.info("Breaking down processed into chunks of %d processed", plistsize)
+            for pliststart in range(0, len(processed_list), plistsize):
+                chunk = processed_list[pliststart:(pliststart+plistsize)]
+                self._write_retry_policy.call(
+                    self.maple_api.processed_post_many,
+                    chunk,
+                    is_success=lambda response: response is True,
+                    description='post processed')
+                self._checkpoint.record_chunk(page, chunk.article)
+                self.logger.debug('Successfully sent processed from %d to %d', pliststart, pliststart+plistsize)
+        self._model_iteration.article_classified += article_count
+        self._update_model_iteration(keep_fields=['article_classified'])
+
+        # store articles
+        self._article_classified.extend(articles)
+
     def retrieve_processed(self):
-        processed = []
-        request_size=1000
-        skip = 0
-        try:
-            while True:
-                response = self.maple_api.processed_get(
+        async def retrieve():
+            async with AsyncMapleAPI.from_maple_api(self.maple_api) as maple_api:
+                return await maple_api.processed_get_all(
                     model_iteration_uuid=self._model_iteration.uuid,
-                    limit=request_size,
-                    skip=skip,
+                    limit=1000,
+                    concurrency=4,
                     as_json=True)
-                if isinstance(response, requests.Response):
-                    self.logger.warning('Failed to retrieve processed. limit: %d, skip: %d', request_size, skip)
-                else:
-                    if len(response) == 0:
-                        break
-                    else:
-                        skip+=request_size
-                        processed.extend(response)
+
+        processed = []
+        try:
+            processed = asyncio.run(retrieve())
         except Exception as exc:
             self.logger.error("Failed to retrieve processed. %s", exc)
         self.logger.debug('Retrieved %d processed from backend.', len(processed))
@@ -303,7 +569,10 @@ class MapleProcessing:
         flag_message = False
         while len(self._training_data) < self._article_train_min_size:
             self._training_data = []
-            for articles in self.maple_api.article_iterator(hours=article_hours):
+            for articles in self.maple_api.article_iterator(
+                    hours=article_hours,
+                    prefetch=self.ARTICLE_PREFETCH,
+                    fields=self.ARTICLE_FIELDS):
                 for article in articles:
                     if hasattr(article, 'chat_summary'):
                         self._training_data.append(article)
@@ -324,75 +593,243 @@ class MapleProcessing:
                 summaries.append(article.chat_summary)
         return summaries
 
-    def _train_models(self, documents: list[str]):
+    def _set_training_status(self, level: int):
+        model_structure = getattr(self, f'model_level{level}').model_structure
+        model_structure.status = 'training'
+        return self._update_model_structure(
+            level,
+            model_structure=model_structure,
+            keep_fields=['status'])
+
+    def _train_models(self, documents: list[str], embeddings=None):
+        if self._parallel_training and embeddings is not None:
+            self._train_models_parallel(documents, embeddings)
+            return
         for level in range(1, 4):
             model_name = f'model_level{level}'
             model = getattr(self, model_name, None)
 
             # update status of model on backend
-            model_structure = model.model_structure
-            model_structure.status = 'training'
-
-            model_structure = self._update_model_structure(
-                level,
-                model_structure=model_structure,
-                keep_fields=['status'])
+            model_structure = self._set_training_status(level)
 
             # start training
             start_training_time = timeit.default_timer()
             self.logger.debug('Start training model %s %s',
                               model.name, model_name)
-            _, _ = model.fit_transform(documents)
+            with self._cpu_slot():
+                _, _ = model.fit_transform(documents, embeddings=embeddings)
             training_time = timeit.default_timer() - start_training_time
             
             self.logger.debug('Training time for model %s %s was %f',
                               model.name, model_name, training_time)
 
-            # Create topics on dababase
+            self._post_topics_and_save(level, model, model_structure)
+
+        self._update_article_trained(len(documents))
+
+    def _train_models_parallel(self, documents: list[str], embeddings):
+        """Trains all levels concurrently in worker processes (see training.train_levels)."""
+        from .training import train_levels
+        model_structures = {level: self._set_training_status(level) for level in range(1, 4)}
+        models = {level: getattr(self, f'model_level{level}') for level in range(1, 4)}
+
+        start_training_time = timeit.default_timer()
+        with self._cpu_slot():
+            results = train_levels(
+                models,
+                documents,
+                embeddings,
+                reduction=None if self._context is None else self._context.reduction,
+                embedding_model=self._embedding_backend(models[1].embedding_model),
+                max_workers=self._training_workers)
+        self.logger.debug('Parallel training time was %f', timeit.default_timer() - start_training_time)
+
+        for level in range(1, 4):
+            model, topic_info, training_time = results[level]
+            self.logger.debug('Training time for model %s model_level%d was %f',
+                              model.name, level, training_time)
+            model.model_structure = models[level].model_structure
+            setattr(self, f'model_level{level}', model)
+            self._post_topics_and_save(level, model, model_structures[level], topic_info=topic_info)
+
+        self._update_article_trained(len(documents))
+
+    def _embedding_backend(self, embedding_model):
+        """embedding model shared by the models trained in worker processes, loaded once."""
+        if getattr(self, '_embedding_backends', None) is None:
+            self._embedding_backends = dict()
+        if not isinstance(embedding_model, str):
+            return embedding_model
+        if embedding_model not in self._embedding_backends:
+            from bertopic.backend._utils import select_backend
+            self._embedding_backends[embedding_model] = select_backend(embedding_model)
+        return self._embedding_backends[embedding_model]
+
+    def _update_models(self, documents: list[str], topics: dict, state: IncrementalState):
+        """Updates the models of the last complete iteration with the current training articles.
+
+        Args:
+            documents (list[str]): chat summaries of the training articles.
+            topics (dict): level -> topic index of each document.
+            state (IncrementalState): state of the last complete iteration.
+        """
+        for level in range(1, 4):
+            model_name = f'model_level{level}'
+            model = getattr(self, model_name, None)
+            model_structure = self._set_training_status(level)
+
+            start_training_time = timeit.default_timer()
+            with self._cpu_slot():
+                model.maple_update(documents, topics[level])
+            self.logger.debug('Update time for model %s %s was %f',
+                              model.name, model_name, timeit.default_timer() - start_training_time)
+
+            self._post_topics_and_save(
+                level, model, model_structure, previous_topics=state.topics[level])
+
+        self._update_article_trained(len(documents))
+
+    def _plan_incremental_update(self, state: IncrementalState, summaries: list[str], embeddings) -> dict:
+        """Assigns the current training articles to the topics of the last complete iteration.
+
+        Articles already used by the models keep their topics, new or changed articles are
+        classified with the models.
+
+        Returns:
+            dict: level -> topic index of each training article, or None if a full retrain
+                is needed because the new articles drifted from the trained topics.
+        """
+        new_rows = [
+            row for row, (article, summary) in enumerate(zip(self._training_data, summaries))
+            if not state.is_known(article.uuid, EmbeddingStore.content_hash(summary))]
+        topics = dict()
+        for level in range(1, 4):
+            topics[level] = [
+                state.documents[article.uuid][1][level] if state.documents.get(article.uuid) else None
+                for article in self._training_data]
+        if len(new_rows) == 0:
+            return topics
+
+        new_summaries = [summaries[row] for row in new_rows]
+        new_embeddings = np.asarray(embeddings)[new_rows]
+        for level in range(1, 4):
+            topic_indexes, _ = state.models[level].transform(new_summaries, embeddings=new_embeddings)
+            topic_indexes = np.asarray(topic_indexes)
+            if level == 1 and len(new_rows) >= self.DRIFT_MIN_DOCUMENTS:
+                outlier_rate = float(np.mean(topic_indexes == -1))
+                self.logger.debug(
+                    'Outlier rate of %d new articles: %.2f (baseline %.2f)',
+                    len(new_rows), outlier_rate, state.baseline_outlier_rate)
+                if outlier_rate > state.baseline_outlier_rate + self._drift_threshold:
+                    self.logger.info(
+                        'Topic drift detected (outlier rate %.2f). Retraining models.', outlier_rate)
+                    return None
+            for row, topic_index in zip(new_rows, topic_indexes.tolist()):
+                topics[level][row] = topic_index
+        return topics
+
+    def _incremental_plan(self, model: MapleModel, summaries: list[str], embeddings) -> tuple:
+        """state and topics to update the models of a family incrementally, or (None, None)."""
+        if not self._incremental:
+            return None, None
+        state = self._incremental_states.get(model)
+        if state is None:
+            return None, None
+        if state.expired(self._full_retrain_hours):
+            self.logger.info('Scheduled full retrain of %s.', model.__name__)
+            return None, None
+        topics = self._plan_incremental_update(state, summaries, embeddings)
+        if topics is None:
+            return None, None
+        return state, topics
+
+    def _save_incremental_state(self, summaries: list[str], topics: dict, previous: IncrementalState = None):
+        """Keeps the models and results of a complete iteration for the next iteration."""
+        models = {level: getattr(self, f'model_level{level}') for level in range(1, 4)}
+        if topics is None:
+            # full training: use the topics assigned when fitting.
+            topics = {level: models[level].topics_ for level in range(1, 4)}
+            baseline_outlier_rate = float(np.mean(np.asarray(topics[1]) == -1))
+            trained_at = None
+        else:
+            baseline_outlier_rate = previous.baseline_outlier_rate
+            trained_at = previous.trained_at
+        documents = {
+            article.uuid: (
+                EmbeddingStore.content_hash(summary),
+                {level: int(topics[level][row]) for level in range(1, 4)})
+            for row, (article, summary) in enumerate(zip(self._training_data, summaries))}
+        return IncrementalState(
+            models=models,
+            topics={
+                level: {topic.index: topic for topic in (models[level].model_structure.topic or [])}
+                for level in range(1, 4)},
+            documents=documents,
+            classified=self._classification_rows,
+            baseline_outlier_rate=baseline_outlier_rate,
+            position_version=self._position_version,
+            trained_at=trained_at)
+
+    def _post_topics_and_save(
+            self, level: int, model: MapleModel, model_structure: Model,
+            previous_topics: dict = None, topic_info: list = None):
+        """Creates the topics of a trained model in the backend and saves the model.
+
+        Topics matching a topic of previous_topics by keywords keep its label and summary, so
+        they are not requested again to chatgpt. topic_info is computed from the model if not given.
+        """
+        # Create topics on dababase
+        if topic_info is None:
             topic_info = model.maple_get_topic_info()
-            for topic in topic_info:
-                if topic.prevalence < 0:
-                    topic.prevalence = 0
-                if topic.prevalence > 1:
-                    topic.prevalence = 1
-                    
-                topic_structure = Topic(
-                    name = topic.name,
-                    keyword = topic.keyword,
-                    label = topic.label,
-                    index= topic.index,
-                    prevalence = topic.prevalence,
-                    model = model_structure
-                )
-                topic_structure = self._update_topic_structure(
-                    level=level,
-                    topic=topic_structure)
+        matched_topics = match_topics(
+            topic_info, previous_topics or {}, min_overlap=self.TOPIC_MATCH_MIN_OVERLAP)
+        for topic in topic_info:
+            if topic.prevalence < 0:
+                topic.prevalence = 0
+            if topic.prevalence > 1:
+                topic.prevalence = 1
                 
-                self._chatgpt_topic_name(topic=topic_structure)
-                self._chatgpt_topic_bullet_summary(
-                    topic=topic_structure,
-                    representative_docs=topic.representative_docs)
-
-            # update model_structure with topics
-            # model_structure = self._update_model_structure(level=level, model_structure=model_structure)
-
-            model_path = os.path.join(
-                self._model_iteration_datapath,
-                self._model_iteration.uuid,
-                f'model_level{level}')
-            os.makedirs(model_path, exist_ok=True)
-            model.maple_save(model_path=model_path)
+            topic_structure = Topic(
+                name = topic.name,
+                keyword = topic.keyword,
+                label = topic.label,
+                index= topic.index,
+                prevalence = topic.prevalence,
+                model = model_structure
+            )
+            previous_topic = matched_topics.get(topic.index)
+            if previous_topic is not None and previous_topic.label:
+                topic_structure.label = previous_topic.label
+                topic_structure.dot_summary = previous_topic.dot_summary
+            topic_structure = self._update_topic_structure(
+                level=level,
+                topic=topic_structure)
+            if previous_topic is not None and previous_topic.label:
+                continue
             
+            self._chatgpt_topic_name(topic=topic_structure)
+            self._chatgpt_topic_bullet_summary(
+                topic=topic_structure,
+                representative_docs=topic.representative_docs)
+
+        # update model_structure with topics
+        # model_structure = self._update_model_structure(level=level, model_structure=model_structure)
+
+        model_path = os.path.join(
+            self._model_iteration_datapath,
+            self._model_iteration.uuid,
+            f'model_level{level}')
+        os.makedirs(model_path, exist_ok=True)
+        model.maple_save(model_path=model_path)
+
+    def _update_article_trained(self, article_trained: int):
         # update model iteration on backend
-        self._model_iteration.article_trained = len(documents)
+        self._model_iteration.article_trained = article_trained
 
-        # TODO try catch
-        while True:
-            try:
-                self._update_model_iteration(keep_fields=['article_trained'])
-                break
-            except Exception as exc:
-                self.logger.warning('Failed to update model iteration. Reattempting... %s', exc)
+        self._write_retry_policy.call(
+            self._update_model_iteration,
+            keep_fields=['article_trained'],
+            description='update model iteration')
 
     def _chatgpt_topic_bullet_summary(self, topic: Topic, representative_docs: list[str] ):
         data=dict(
@@ -404,6 +841,7 @@ class MapleProcessing:
         )
     
     def _chatgpt_topic_name(self, topic: Topic):
+        self._requested_topic_uuids.add(topic.uuid)
         data = dict(
             uuid = topic.uuid,
             keyword = topic.keyword,
@@ -433,7 +871,7 @@ class MapleProcessing:
             model_name = f"model_level{level}"
             model = getattr(self, model_name)
             for topic in model.model_structure.topic:
-                if topic.uuid:
+                if topic.uuid in self._requested_topic_uuids:
                     topic_mapping[topic.uuid] = topic
 
         def get_topic_name_mapping():
@@ -483,6 +921,7 @@ class MapleProcessing:
                 level=topic_levels[topic_uuid],
                 topic=topic
             )
+            self._checkpoint.record_topic(topic_uuid, topic.label, topic.dot_summary)
            
     def _update_topic_structure(self, level: int, topic: Topic):
         model_name = f"model_level{level}"
@@ -495,27 +934,19 @@ class MapleProcessing:
                     topic_in_model_structure = i
                     break
         
+        is_topic = lambda response: isinstance(response, Topic)
         if topic_in_model_structure is None:
-            while True:
-                updated_topic = self.maple_api.topic_post(topic)
-                if isinstance(updated_topic, Topic):
-                    topic = updated_topic
-                    model.model_structure.add_topic(topic)
-                    # self._update_model_structure(level=level, model_structure=model.model_structure)
-                    break
-                else:
-                    self.logger.warning('Failed to post topic. Reattempting... %s', updated_topic)
-                    time.sleep(random.random()*2)
+            topic = self._write_retry_policy.call(
+                self.maple_api.topic_post, topic,
+                is_success=is_topic,
+                description='post topic')
+            model.model_structure.add_topic(topic)
         else:
-            while True:
-                updated_topic = self.maple_api.topic_put(topic)
-                if isinstance(updated_topic, Topic):
-                    topic=updated_topic
-                    model.model_structure.topic[topic_in_model_structure] = topic
-                    # self._update_model_structure(level=level, model_structure=model.model_structure)
-                    break
-                else:
-                    self.logger.warning("Failed updating topic. Reattempting... %s", updated_topic)
+            topic = self._write_retry_policy.call(
+                self.maple_api.topic_put, topic,
+                is_success=is_topic,
+                description='update topic')
+            model.model_structure.topic[topic_in_model_structure] = topic
         
         return topic
     
@@ -524,23 +955,15 @@ class MapleProcessing:
         level: int,
         model_structure: Model,
         keep_fields: list[str] = None):
-        while True:
-            updated_model_structure = self.maple_api.model_put(model_structure)
-            if isinstance(updated_model_structure, Model):
-                if keep_fields is not None:
-                    for key in keep_fields:
-                        setattr(model_structure, key, getattr(updated_model_structure, key))
-                else:
-                    model_structure = updated_model_structure
-                break
-            else:
-                self.logger.warning(
-                    'Failed to update model structure. %s', 
-                    updated_model_structure)
-                wait_time = random.random()*2
-                self.logger.debug("Reattempt in %.2f seconds", wait_time)
-                time.sleep(wait_time)
-                continue
+        updated_model_structure = self._write_retry_policy.call(
+            self.maple_api.model_put, model_structure,
+            is_success=lambda response: isinstance(response, Model),
+            description='update model structure')
+        if keep_fields is not None:
+            for key in keep_fields:
+                setattr(model_structure, key, getattr(updated_model_structure, key))
+        else:
+            model_structure = updated_model_structure
             
         setattr(self._model_iteration, f"model_level{level}", model_structure)
         setattr(
@@ -594,7 +1017,7 @@ class MapleProcessing:
                     uuid=article.uuid,
                     url = article.url,
                     content = article.chat_summary,
-                    createDate = article.createDate,
+                    createDate = getattr(article, 'createDate', None),
                 )
             )
         
@@ -612,7 +1035,15 @@ class MapleProcessing:
                     json.dump(var_to_store['value'], file, indent=2)
             except Exception as exc:
                 self.logger.error('Failed to store file %s. %s', var_to_store['name'], exc)
+        try:
+            with open(os.path.join(self.model_iteration_path, self.POSITION_MODEL_FILENAME), 'wb') as file:
+                pickle.dump(self._umap_model, file)
+        except Exception as exc:
+            self.logger.error('Failed to store file %s. %s', self.POSITION_MODEL_FILENAME, exc)
         
+        # the checkpoint is not needed once the model iteration is stored.
+        self._checkpoint.remove()
+
         # zip directory now.
         shutil.make_archive(self.model_iteration_path, 'zip', self.model_iteration_path)
 
@@ -625,7 +1056,7 @@ class MapleProcessing:
             articles.append(dict(
                 uuid= article.uuid,
                 url = article.url,
-                createDate= article.createDate,
+                createDate= getattr(article, 'createDate', None),
                 content=article.chat_summary,
             ))
         
@@ -638,6 +1069,7 @@ class MapleProcessing:
                 topic_map[topic.uuid] = topic
                 topic_level_map[topic.uuid] = level
         
+        from rtpt_research import RTPTResearch
         tstart_rtpt = timeit.default_timer()
         rtpt = RTPTResearch(
             processed = deepcopy(self._processed),
@@ -667,22 +1099,31 @@ class MapleProcessing:
                             timeit.default_timer()-tstart)
         
     def _on_model_iteration_fail(self):
+        checkpoint = self._checkpoint
+        if (checkpoint.path is not None and checkpoint.reached('trained')
+                and checkpoint.attempts < self._max_resume_attempts):
+            self.logger.warning(
+                'Model iteration %s kept to be resumed from phase %s.',
+                checkpoint.model_iteration_uuid, checkpoint.phase)
+            self._cleanup()
+            return
         if hasattr(self, '_model_iteration'):
             if self._model_iteration.uuid is not None:
                 try:
                     self.remove_model_iteration_directory()
                 except Exception as exc:
                     self.logger.error("Failed to remove model directory. %s", exc )
-                response = self.maple_api.model_iteration_delete(self._model_iteration.uuid)
-                while response not in [200,]:
-                    if response == 200:
-                        self.logger.info ("Deleted model iteration %s in the backend.", self._model_iteration.uuid)
-                    else:
-                        self.logger.critical(
-                            "Failed to delete model iteration %s in the backend. Response: %d.",
-                            self._model_iteration.uuid,
-                            response)
-                        response = self.maple_api.model_iteration_delete(self.model_iteration_path.uuid)
+                try:
+                    self.maple_api.retry_policy.call(
+                        self.maple_api.model_iteration_delete, self._model_iteration.uuid,
+                        is_success=lambda response: response == 200,
+                        description='delete model iteration')
+                    self.logger.info ("Deleted model iteration %s in the backend.", self._model_iteration.uuid)
+                except ConnectionError as exc:
+                    self.logger.critical(
+                        "Failed to delete model iteration %s in the backend. %s",
+                        self._model_iteration.uuid,
+                        exc)
                 
         self._cleanup()
         
@@ -695,68 +1136,227 @@ class MapleProcessing:
         self._chatgpt_client.topic_bullet_summary_results = []
         self._chatgpt_client.topic_name_results = []
         
+    def _cpu_slot(self):
+        """slot of the cpu semaphore shared with other model families, if any."""
+        if self._cpu_semaphore is None:
+            return contextlib.nullcontext()
+        return self._cpu_semaphore
+
+    def run_iteration(self) -> bool:
+        """Runs one model iteration for every model family.
+
+        Backend writes are retried with write_retry_policy, which retries forever by default.
+
+        Raises:
+            ConnectionError: if the backend could not be reached after the retry attempts.
+                `run` then fails the model iteration, which is kept to be resumed if its
+                models were already trained.
+
+        Returns:
+            bool: False if there were not enough training articles.
+        """
+        self._init_vars()
+
+        # Fetch training data.
+        try:
+            self._fetch_training_data()
+            summaries = self._extract_chat_summaries(self._training_data)
+        except ValueError as exc:
+            self.logger.info('Could not retrieve enough data. %s', exc)
+            return False
+
+        with self._cpu_slot():
+            training_embeddings = self._maple_embed_articles(self._training_data)
+            plans = {
+                model: self._incremental_plan(model, summaries, training_embeddings)
+                for model in self._models}
+        # positions of reused classifications are only valid while the position model is kept.
+        if any(state is None for state, _ in plans.values()) or not hasattr(self, '_umap_model'):
+            with self._cpu_slot():
+                self._detect_positions(training_embeddings, fit=True)
+
+        # create a model iteration and models
+        for model in self._models:
+            state, topics = plans[model]
+            self._run_model_family(model, summaries, training_embeddings, state, topics)
+        return True
+
+    def _run_model_family(self, model: MapleModel, summaries: list[str], training_embeddings, state: IncrementalState, topics: dict):
+        """create (or reuse) -> train -> classify -> chatgpt -> charts -> store for a model family."""
+        self._context = None
+        self._incremental_state = None
+        self._classification_rows = dict()
+        self._requested_topic_uuids = set()
+        self._article_classified = []
+        # Model iteration that will be used to keep track of models and status
+        self._model_iteration = ModelIteration()
+        self._checkpoint = IterationCheckpoint()
+
+        if state is not None:
+            self.logger.info('Updating models of %s incrementally.', model.__name__)
+            self._reuse_models(state)
+            self._create_checkpoint(model)
+            self._update_models(documents=summaries, topics=topics, state=state)
+            if state.position_version == self._position_version:
+                self._incremental_state = state
+        else:
+            # Context shared by all levels (e.g. dimensionality reduction)
+            self._context = model.create_iteration_context()
+
+            # Create models for all levels
+            self._create_models(
+                model,
+                training_size=len(self._training_data),
+                context=self._context)
+            self._create_checkpoint(model)
+
+            self._train_models(documents=summaries, embeddings=training_embeddings)
+        self._save_trained_checkpoint()
+
+        self._finish_model_family()
+
+        if self._incremental:
+            self._incremental_states[model] = self._save_incremental_state(
+                summaries, topics, previous=state)
+
+    def _finish_model_family(self):
+        """runs the phases after training that were not completed yet according to the checkpoint."""
+        if not self._checkpoint.reached('classified'):
+            self._classify_all_articles()
+            self._checkpoint.advance('classified')
+        
+        if not self._checkpoint.reached('named'):
+            self._chatgpt_tasks()
+            self._checkpoint.advance('named')
+        
+        if not self._checkpoint.reached('charted'):
+            self._create_chart_data()
+            self._checkpoint.advance('charted')
+        
+        # Set status of model_iteration to complete.
+        for level in range(1, 4):
+            model_structure = getattr(self._model_iteration,
+                    f'model_level{level}')
+            model_structure.status = 'complete'
+            model_structure.path = os.path.join(
+                self.model_iteration_path,
+                f'model_level{level}'
+            )
+            self._update_model_structure(
+                level=level,
+                model_structure=model_structure,
+                keep_fields=['status'])
+        # self._update_model_iteration(keep_fields=['status'])
+        
+        self._store_data()
+        
+        self._cleanup()
+
+    def _create_checkpoint(self, model: MapleModel):
+        self._checkpoint = IterationCheckpoint(
+            self.model_iteration_path if self._checkpointing else None,
+            model_iteration_uuid=self._model_iteration.uuid,
+            model_family=model.__name__)
+        self._checkpoint.save()
+
+    def _save_trained_checkpoint(self):
+        """stores the trained models and the position model, so the iteration can be resumed."""
+        if self._checkpointing:
+            for level in range(1, 4):
+                model = getattr(self, f'model_level{level}')
+                # the embedding model is loaded again when resuming.
+                embedding_model = model.embedding_model
+                model.embedding_model = None
+                try:
+                    self._checkpoint.save_object(f'model_level{level}', model)
+                finally:
+                    model.embedding_model = embedding_model
+            self._checkpoint.save_object('position_model', self._umap_model)
+        self._checkpoint.advance('trained')
+
+    def _resume_model_iterations(self):
+        """Resumes the model iterations of this instance's model families that failed after training."""
+        families = [model.__name__ for model in self._models]
+        for checkpoint in IterationCheckpoint.find(self._model_iteration_datapath, families):
+            self._init_vars()
+            self._checkpoint = checkpoint
+            if not checkpoint.reached('trained') or checkpoint.attempts >= self._max_resume_attempts:
+                self.logger.warning(
+                    'Model iteration %s can not be resumed (phase %s, %d attempts).',
+                    checkpoint.model_iteration_uuid, checkpoint.phase, checkpoint.attempts)
+                self._model_iteration = ModelIteration()
+                self._model_iteration.uuid = checkpoint.model_iteration_uuid
+                self._checkpoint = IterationCheckpoint()
+                self._on_model_iteration_fail()
+                continue
+            checkpoint.attempts += 1
+            checkpoint.save()
+            self.logger.info(
+                'Resuming model iteration %s from phase %s (attempt %d).',
+                checkpoint.model_iteration_uuid, checkpoint.phase, checkpoint.attempts)
+            self._resume_model_family(checkpoint)
+
+    def _resume_model_family(self, checkpoint: IterationCheckpoint):
+        model_iterations = self.maple_api.model_iteration_get(uuid=checkpoint.model_iteration_uuid)
+        if isinstance(model_iterations, Response) or len(model_iterations) == 0:
+            raise ValueError(f'Model iteration {checkpoint.model_iteration_uuid} not found in the backend.')
+        self._model_iteration = model_iterations[0]
+
+        for level in range(1, 4):
+            maple_model = checkpoint.load_object(f'model_level{level}')
+            maple_model.embedding_model = self._embedding_backend(DEFAULT_EMBEDDING_MODEL)
+            maple_model.model_structure = getattr(self._model_iteration, f'model_level{level}')
+            setattr(self, f'model_level{level}', maple_model)
+        self._umap_model = checkpoint.load_object('position_model')
+        # positions of previous classifications can not be reused with this position model.
+        self._position_version += 1
+
+        if not checkpoint.reached('named'):
+            # requests sent before the failure were lost.
+            self._request_missing_topic_tasks()
+        if checkpoint.reached('classified'):
+            self._article_classified = [ArticleLite.from_json(article) for article in checkpoint.articles()]
+            self._processed = self.retrieve_processed()
+
+        self._finish_model_family()
+
+    def _request_missing_topic_tasks(self):
+        """requests chatgpt topic names and summaries of topics without recorded results."""
+        for level in range(1, 4):
+            model = getattr(self, f'model_level{level}')
+            topics = {topic.index: topic for topic in (model.model_structure.topic or [])}
+            for topic_info in model.maple_get_topic_info():
+                topic = topics.get(topic_info.index)
+                if topic is None or topic.uuid in self._checkpoint.topics:
+                    continue
+                self._chatgpt_topic_name(topic=topic)
+                self._chatgpt_topic_bullet_summary(
+                    topic=topic,
+                    representative_docs=topic_info.representative_docs)
+
     def run(self, *, run_once: bool = False):
         run_count = 0
         while True:
             try:
-                self._init_vars()
-            
                 iteration_time_start = timeit.default_timer()
                 run_count += 1
                 if run_once and run_count > 1:
                     break
 
-                # Fetch training data.
-                try:
-                    self._fetch_training_data()
-                    summaries = self._extract_chat_summaries(self._training_data)
-                except ValueError as exc:
-                    self.logger.info('Could not retrieve enough data. %s', exc)
-                    continue
-                
-                self._detect_positions(summaries, fit=True)
-
-                # create a model iteration and models
-                for model in self._models:
-                    # Model iteration that will be used to keep track of models and status
-                    self._model_iteration = ModelIteration()
+                if self._checkpointing:
+                    self._resume_model_iterations()
 
-                    # Create models for all levels
-                    self._create_models(
-                        model, training_size=len(self._training_data))
-
-                    self._train_models(documents=summaries)
-
-                    self._classify_all_articles()
-                    
-                    self._chatgpt_tasks()
-                    
-                    self._create_chart_data()
-                    
-                    # Set status of model_iteration to complete.
-                    for level in range(1, 4):
-                        model_structure = getattr(self._model_iteration,
-                                f'model_level{level}')
-                        model_structure.status = 'complete'
-                        model_structure.path = os.path.join(
-                            self.model_iteration_path,
-                            f'model_level{level}'
-                        )
-                        self._update_model_structure(
-                            level=level,
-                            model_structure=model_structure,
-                            keep_fields=['status'])
-                    # self._update_model_iteration(keep_fields=['status'])
-                    
-                    self._store_data()
-                    
-                    self._cleanup()
+                if not self.run_iteration():
+                    continue
                     
                 iteration_time = timeit.default_timer()-iteration_time_start
                 self.logger.info(
                     'Iteration for %s ended in %.2f seconds',
                     self._model_iteration.name,
                     iteration_time)
+            except ConnectionError as exc:
+                self.logger.critical('Failed model iteration, the backend is unreachable. %s', exc)
+                self._on_model_iteration_fail()
             except Exception as exc:
                 self.logger.critical('Failed model iteration. %s on line %d', exc, exc.__traceback__.tb_lineno)
                 self._on_model_iteration_fail()
@@ -0,0 +1,66 @@
+'''Concurrent model iterations of several model families.'''
+import logging
+import threading
+from typing import Callable
+from .embedding import EmbeddingStore
+from .model import MapleModel
+from .processing import MapleProcessing
+
+
+class ModelFamilyScheduler:
+    """Runs the model iterations of several model families concurrently.
+
+    Each model family has its own MapleProcessing (and chatgpt client), running in its own
+    thread, so the cpu bound training of one family overlaps with the network bound
+    classification, chatgpt and chart phases of another. The cpu bound phases are limited
+    by a semaphore shared by all families, and all families share one embedding store.
+    """
+
+    def __init__(
+        self,
+        models: list[type[MapleModel]],
+        create_processing: Callable[..., MapleProcessing],
+        max_cpu_jobs: int = 1,
+        embedding_store: EmbeddingStore = None,
+    ):
+        """
+        Args:
+            models (list[type[MapleModel]]): the model families, each one running in its own MapleProcessing.
+            create_processing (Callable[..., MapleProcessing]): called with the list of models of a family and
+                the `cpu_semaphore` and `embedding_store` keyword arguments, to create its MapleProcessing.
+            max_cpu_jobs (int, optional): number of families allowed in a cpu bound phase at the same time. Defaults to 1.
+            embedding_store (EmbeddingStore, optional): store shared by all families. Defaults to the store of the first family.
+
+        Raises:
+            ValueError: if no model is given, or a model is not a MapleModel.
+        """
+        if len(models) == 0:
+            raise ValueError('At least one model is required.')
+        for model in models:
+            if not isinstance(model, type) or not issubclass(model, MapleModel):
+                raise ValueError(f'{model} is not a MapleModel.')
+        self.logger = logging.getLogger('ModelFamilyScheduler')
+        self._cpu_semaphore = threading.BoundedSemaphore(max_cpu_jobs)
+        self._processings = []
+        for model in models:
+            processing = create_processing(
+                [model],
+                cpu_semaphore=self._cpu_semaphore,
+                embedding_store=embedding_store)
+            embedding_store = processing.embedding_store
+            self._processings.append(processing)
+
+    def run(self, *, run_once: bool = False):
+        """runs every model family in its own thread until they finish (only with run_once)."""
+        threads = []
+        for processing in self._processings:
+            name = '_'.join(model.__name__ for model in processing.model_families)
+            thread = threading.Thread(
+                target=processing.run,
+                kwargs=dict(run_once=run_once),
+                name=f'MapleProcessing-{name}')
+            thread.start()
+            self.logger.info('Started model family %s', name)
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,197 @@
+'''Training of the model levels in parallel worker processes.'''
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import pickle
+import timeit
+import numpy as np
+
+logger = logging.getLogger('training')
+
+
+class SharedArray:
+    """numpy array stored in shared memory, so worker processes can read it without copies.
+
+    Only the descriptor (name, shape and dtype) is pickled, workers attach to the block.
+    """
+
+    def __init__(self, name: str, shape: tuple, dtype: str):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self._shm = None
+
+    @classmethod
+    def create(cls, array: np.ndarray) -> 'SharedArray':
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = cls(shm.name, array.shape, array.dtype.str)
+        shared._shm = shm
+        shared.array()[...] = array
+        return shared
+
+    def __getstate__(self):
+        return dict(name=self.name, shape=self.shape, dtype=self.dtype)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def array(self) -> np.ndarray:
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        return np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=self._shm.buf)
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    def unlink(self):
+        shm = self._shm or shared_memory.SharedMemory(name=self.name)
+        shm.close()
+        shm.unlink()
+        self._shm = None
+
+
+class SharedDocuments:
+    """list of strings stored in shared memory as utf-8 bytes and offsets."""
+
+    def __init__(self, data: SharedArray, offsets: SharedArray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def create(cls, documents: list[str]) -> 'SharedDocuments':
+        encoded = [document.encode('utf-8') for document in documents]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(document) for document in encoded])
+        return cls(
+            SharedArray.create(np.frombuffer(b''.join(encoded), dtype=np.uint8)),
+            SharedArray.create(offsets))
+
+    def documents(self) -> list[str]:
+        data = self.data.array()
+        offsets = self.offsets.array()
+        return [
+            bytes(data[offsets[i]:offsets[i+1]]).decode('utf-8')
+            for i in range(len(offsets) - 1)]
+
+    def close(self):
+        self.data.close()
+        self.offsets.close()
+
+    def unlink(self):
+        self.data.unlink()
+        self.offsets.unlink()
+
+
+class PrecomputedReduction:
+    """Reduction model used in the workers, returning the reduction computed by the parent."""
+
+    def __init__(self, reduced: SharedArray):
+        self.reduced = reduced
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        reduced = self.reduced.array()
+        if len(X) != len(reduced):
+            raise ValueError('PrecomputedReduction can only transform the training embeddings.')
+        return reduced
+
+    def fit_transform(self, X, y=None):
+        return self.transform(X)
+
+
+def _fit_level(payload: bytes, documents: SharedDocuments, embeddings: SharedArray) -> bytes:
+    """fits a pickled model in a worker process.
+
+    Returns:
+        bytes: pickled (model, topic_info, training_time). The model is pickled before the
+            shared memory is closed, since it may hold views of it.
+    """
+    tstart = timeit.default_timer()
+    model = pickle.loads(payload)
+    precomputed = model.umap_model if isinstance(model.umap_model, PrecomputedReduction) else None
+    try:
+        model.fit_transform(documents.documents(), embeddings=embeddings.array())
+        topic_info = model.maple_get_topic_info()
+        if precomputed is not None:
+            model.umap_model = None
+        # the embedding model is assigned again in the parent instead of being sent back.
+        model.embedding_model = None
+        return pickle.dumps((model, topic_info, timeit.default_timer()-tstart))
+    finally:
+        documents.close()
+        embeddings.close()
+        if precomputed is not None:
+            precomputed.reduced.close()
+
+
+def train_levels(
+    models: dict,
+    documents: list[str],
+    embeddings: np.ndarray,
+    reduction=None,
+    embedding_model=None,
+    max_workers: int = None,
+) -> dict:
+    """Fits the models of all levels concurrently in spawned worker processes.
+
+    The documents, the embeddings and the reduced embeddings are placed in shared memory.
+    When a shared reduction is given, it is fitted once in the parent and the workers use
+    its result. The fitted models get the shared reduction and the embedding model back.
+
+    Args:
+        models (dict): level -> unfitted MapleModel.
+        documents (list[str]): the training documents.
+        embeddings (np.ndarray): embeddings of the documents.
+        reduction (SharedReduction, optional): reduction shared by all levels. Defaults to None.
+        embedding_model (optional): embedding model assigned to the fitted models. Defaults to None.
+        max_workers (int, optional): number of worker processes. Defaults to one per level.
+
+    Returns:
+        dict: level -> (fitted model, topic info, training time in seconds).
+    """
+    embeddings = np.asarray(embeddings)
+    shared = []
+    try:
+        shared_documents = SharedDocuments.create(documents)
+        shared.append(shared_documents)
+        shared_embeddings = SharedArray.create(embeddings)
+        shared.append(shared_embeddings)
+
+        payloads = dict()
+        if reduction is not None:
+            tstart = timeit.default_timer()
+            shared_reduced = SharedArray.create(reduction.fit_transform(embeddings))
+            shared.append(shared_reduced)
+            logger.debug('Shared reduction computed in %.2fs', timeit.default_timer()-tstart)
+        for level, model in models.items():
+            umap_model = model.umap_model
+            if reduction is not None:
+                model.umap_model = PrecomputedReduction(shared_reduced)
+            try:
+                payloads[level] = pickle.dumps(model)
+            finally:
+                model.umap_model = umap_model
+
+        results = dict()
+        with ProcessPoolExecutor(
+                max_workers=max_workers or len(models),
+                mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {
+                level: executor.submit(_fit_level, payload, shared_documents, shared_embeddings)
+                for level, payload in payloads.items()}
+            for level, future in futures.items():
+                model, topic_info, training_time = pickle.loads(future.result())
+                if reduction is not None:
+                    model.umap_model = reduction
+                model.embedding_model = embedding_model
+                results[level] = (model, topic_info, training_time)
+        return results
+    finally:
+        for item in shared:
+            item.unlink()
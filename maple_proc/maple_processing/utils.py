@@ -4,28 +4,214 @@ import os
 import json
 from json.decoder import JSONDecodeError
 import logging
+import threading
+from typing import Callable, Iterable, Iterator
 from maple_structures import Article
+from .geocode import GeocodeCache
+
+
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment"
+# torch intra-op threads, set once when the sentiment model is loaded. None keeps torch's setting.
+SENTIMENT_NUM_THREADS = None
+SPACY_MODEL = "en_core_web_sm"
+# components of SPACY_MODEL not needed for named entities.
+NER_DISABLED_COMPONENTS = ['tagger', 'attribute_ruler', 'parser', 'lemmatizer']
+GEP_LABELS = ('GPE', 'FAC')
+GEOCODE_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'maple', 'geocode.sqlite')
+
+# nltk data used by the functions of this module, by registry name.
+NLTK_RESOURCES = {
+    'nltk_preprocess': [
+        ('tokenizers/punkt', 'punkt'),
+        ('corpora/stopwords', 'stopwords'),
+        ('corpora/wordnet', 'wordnet'),
+    ],
+    'nltk_vader': [
+        ('sentiment/vader_lexicon.zip', 'vader_lexicon'),
+    ],
+}
 
 
-#The packages and line below are needed for the location function
-import spacy
-from geopy.geocoders import Nominatim
-nlp = spacy.load("en_core_web_sm")
-#-----------------------------------------------------------------
+logger = logging.getLogger("maple_proc:utils")
 
 
-#The packages below are needed for sentiment analysis
-from transformers import AutoTokenizer
-from transformers import AutoModelForSequenceClassification
-from scipy.special import softmax
+class ModelRegistry:
+    """Thread-safe registry of heavy models loaded on first use.
+
+    Each model is loaded once by its loader, even when requested concurrently by
+    several threads. Loading a model does not block the retrieval of other models.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable):
+        """registers the loader of a model. The loader is called on first use."""
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def set(self, name: str, model):
+        """replaces the model, e.g. with one configured differently."""
+        with self._lock:
+            self._locks.setdefault(name, threading.Lock())
+            self._models[name] = model
+
+    def get(self, name: str):
+        """returns the model, loading it if needed.
+
+        Raises:
+            KeyError: if no loader was registered for name.
+        """
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f'No model registered as {name}.')
+            lock = self._locks[name]
+        with lock:
+            if name not in self._models:
+                logger.debug('Loading %s', name)
+                self._models[name] = self._loaders[name]()
+            return self._models[name]
+
+    def warmup(self, names: list[str] = None):
+        """loads the models in names (default: all registered models)."""
+        for name in (names if names is not None else list(self._loaders)):
+            self.get(name)
+
+
+def _load_spacy():
+    import spacy
+    return spacy.load(SPACY_MODEL)
+
+
+def _load_sentiment_tokenizer():
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+
+
+def _load_sentiment_model():
+    from transformers import AutoModelForSequenceClassification
+    if SENTIMENT_NUM_THREADS is not None:
+        # the thread count is global to the process, so it is not changed around each inference.
+        import torch
+        torch.set_num_threads(SENTIMENT_NUM_THREADS)
+    return AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL)
+
+
+def _nltk_resources_loader(name: str):
+    def load():
+        import nltk
+        for path, package in NLTK_RESOURCES[name]:
+            try:
+                nltk.data.find(path)
+            except LookupError:
+                nltk.download(package, quiet=True)
+        return True
+    return load
 
-MODEL = f"cardiffnlp/twitter-roberta-base-sentiment"
-tokenizer = AutoTokenizer.from_pretrained(MODEL)
-model = AutoModelForSequenceClassification.from_pretrained(MODEL)
-#------------------------------------------------------------------
 
+def _load_nltk_lemmatizer():
+    models.get('nltk_preprocess')
+    from nltk.stem import WordNetLemmatizer
+    return WordNetLemmatizer()
 
-logger = logging.getLogger("maple_proc:utils")
+
+def _load_nltk_stopwords():
+    models.get('nltk_preprocess')
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+
+def _load_geocode_cache():
+    os.makedirs(os.path.dirname(GEOCODE_CACHE_PATH), exist_ok=True)
+    return GeocodeCache(GEOCODE_CACHE_PATH)
+
+
+def _load_nltk_vader_analyzer():
+    models.get('nltk_vader')
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+
+models = ModelRegistry()
+models.register('spacy', _load_spacy)
+models.register('sentiment_tokenizer', _load_sentiment_tokenizer)
+models.register('sentiment_model', _load_sentiment_model)
+models.register('nltk_preprocess', _nltk_resources_loader('nltk_preprocess'))
+models.register('nltk_vader', _nltk_resources_loader('nltk_vader'))
+models.register('nltk_lemmatizer', _load_nltk_lemmatizer)
+models.register('nltk_stopwords', _load_nltk_stopwords)
+models.register('nltk_vader_analyzer', _load_nltk_vader_analyzer)
+models.register('geocode_cache', _load_geocode_cache)
+
+
+def get_nlp():
+    """spaCy pipeline used for named entities."""
+    return models.get('spacy')
+
+
+def get_sentiment_model():
+    """tokenizer and model used for sentiment analysis."""
+    return models.get('sentiment_tokenizer'), models.get('sentiment_model')
+
+
+def get_geocode_cache() -> GeocodeCache:
+    """geocode cache used by get_coordinates and get_locations."""
+    return models.get('geocode_cache')
+
+
+def configure_geocode_cache(
+    path: str = GEOCODE_CACHE_PATH,
+    gazetteer: str = None,
+    offline: bool = False,
+) -> GeocodeCache:
+    """Replaces the geocode cache used by get_coordinates and get_locations.
+
+    Args:
+        path (str, optional): sqlite database file. Defaults to GEOCODE_CACHE_PATH.
+        gazetteer (str, optional): csv file with name, latitude and longitude columns used to seed the cache. Defaults to None.
+        offline (bool, optional): places not in the cache are not geocoded online. Defaults to False.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    cache = GeocodeCache(path, offline=offline)
+    if gazetteer is not None:
+        cache.seed_gazetteer(gazetteer)
+    models.set('geocode_cache', cache)
+    return cache
+
+
+def warmup(names: list[str] = None):
+    """Loads models ahead of their first use, e.g. when a service starts.
+
+    Args:
+        names (list[str], optional): models to load. Defaults to all registered models.
+    """
+    models.warmup(names)
+
+
+# module attributes kept for compatibility with code that used the former globals.
+_LAZY_ATTRIBUTES = dict(
+    nlp='spacy',
+    tokenizer='sentiment_tokenizer',
+    model='sentiment_model',
+)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return models.get(_LAZY_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def load_articles(path: str) -> list:
@@ -58,22 +244,67 @@ def load_articles(path: str) -> list:
     return out
 
 
+def processed_article_uuids(processed: list[dict]) -> set[str]:
+    """uuids of the articles of processed as returned by the backend, where article is an object."""
+    return {item['article']['uuid'] for item in processed}
+
+
+def load_processed_articles(path: str) -> set[str]:
+    """uuids of the articles of a processed.json stored by MapleProcessing.
+
+    processed.json holds the processed as returned by the backend.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return processed_article_uuids(json.load(file))
+
+
 #===========================================================================================
 #This function retrieves the geopolotical and facilities locations from a text
 #using the spacy library
 #===========================================================================================
 def _get_GEP_locations(text):
-    gep={}
-    doc = nlp(text)
-    for ent in doc.ents:
-        if (ent.label_ == "GPE") or (ent.label_ == "FAC"):  # GPE refers to geopolitical entity (location)
-            l = ent.text
-            if l.lower() not in gep.keys():
-                gep[l.lower()]=1
-            else:
-                gep[l.lower()] = gep[l.lower()] + 1
-            #print(ent.text, ent.start_char, ent.end_char, ent.label_)
-    return gep
+    return next(iter_GEP_locations([text]))
+
+
+#===========================================================================================
+#This function extracts the named entities of many texts using nlp.pipe
+#===========================================================================================
+def extract_entities(
+    texts: Iterable[str],
+    labels: Iterable[str] = None,
+    batch_size: int = 64,
+    n_process: int = 1,
+) -> Iterator[list[tuple[str, str]]]:
+    """Streams the named entities of texts, in the order of texts.
+
+    The texts are processed in batches by nlp.pipe with the components that are not
+    needed for named entities disabled.
+
+    Args:
+        texts (Iterable[str]): texts, e.g. a generator over the article table.
+        labels (Iterable[str], optional): entity labels to keep. Defaults to all labels.
+        batch_size (int, optional): texts per batch. Defaults to 64.
+        n_process (int, optional): processes used by spaCy. Defaults to 1.
+
+    Yields:
+        list[tuple[str, str]]: (text, label) of the entities of each text.
+    """
+    nlp = get_nlp()
+    labels = set(labels) if labels is not None else None
+    disable = [name for name in NER_DISABLED_COMPONENTS if name in nlp.pipe_names]
+    for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable):
+        yield [
+            (ent.text, ent.label_) for ent in doc.ents
+            if labels is None or ent.label_ in labels]
+
+
+def iter_GEP_locations(texts: Iterable[str], batch_size: int = 64, n_process: int = 1) -> Iterator[dict]:
+    """Streams the geopolitical and facility locations of texts as {location: count}."""
+    for entities in extract_entities(texts, labels=GEP_LABELS, batch_size=batch_size, n_process=n_process):
+        gep = {}
+        for text, _ in entities:
+            gep[text.lower()] = gep.get(text.lower(), 0) + 1
+        yield gep
 
 
 #==========================================================================================
@@ -81,6 +312,7 @@ def _get_GEP_locations(text):
 #==========================================================================================
 def _get_most_popular_location(geps):
     max = 0
+    loc = None
     for key, value in geps.items():
         location = value
         if location["frequency"] > max:
@@ -93,7 +325,7 @@ def _get_most_popular_location(geps):
 #==========================================================================================
 #This function gets the coordinates (latitude and longitude) for a given location
 #==========================================================================================
-def get_coordinates(loc, count):
+def get_coordinates(loc, count, geocoded: dict = None):
     location = {
                  "text": "",
                  "address": "",
@@ -101,20 +333,18 @@ def get_coordinates(loc, count):
                  "address_type" : "",
                  "frequency" : 0
                 }
-    try:
-        geolocator = Nominatim(user_agent="sample_app")
-
-        location_obj = geolocator.geocode(loc)
-        location["text"] = loc
-        location["address"] = location_obj.address
+    if geocoded is None:
+        geocoded = get_geocode_cache().lookup(loc)
+    location["text"] = loc
+    # an empty dict means the place was not found.
+    if geocoded:
+        location["address"] = geocoded["address"]
         geo = {}
-        geo["latitude"] = location_obj.latitude
-        geo["longitude"] = location_obj.longitude
+        geo["latitude"] = geocoded["latitude"]
+        geo["longitude"] = geocoded["longitude"]
         location["geolocation"] = geo
-        location["address_type"] = location_obj.raw["addresstype"]
+        location["address_type"] = geocoded["address_type"]
         location["frequency"] = count
-    except Exception as exc:
-        print (exc)
     return location
 
 
@@ -123,28 +353,62 @@ def get_coordinates(loc, count):
 #This functions retrieves the location and its coordinates mentioned in a text
 #==========================================================================================
 def get_location(text):
+    return get_locations([text])[0]
 
-    ret_locations = {}
-
-    #Step 1. Get GEP/FAC locations using spacy
-    geps = _get_GEP_locations(text)
-
-    #Step 2. Get the geocoordinates
-    locations = {}
-    for loc, count in geps.items():
-        locations[loc] = get_coordinates(loc, count)
 
-    #Step 2. Get the location that was most popular
-    main = {}
-    key_popular = _get_most_popular_location(locations)
-    main[key_popular]=locations[key_popular]
-
-    #Step 3. Organize data structure
-    ret_locations["main"]= main
-    locations.pop(key_popular)
-    ret_locations["others"] = locations
-
-    return ret_locations
+#==========================================================================================
+#This functions retrieves the locations of many texts, geocoding each place once
+#==========================================================================================
+def get_locations(texts: list[str], batch_size: int = 64, n_process: int = 1) -> list[dict]:
+    """Locations mentioned in each text, as returned by get_location.
+
+    Places found in all texts are geocoded together, so each unique place is looked up
+    once per call.
+    """
+    return list(iter_locations(texts, batch_size=batch_size, n_process=n_process, chunk_size=None))
+
+
+def iter_locations(
+    texts: Iterable[str],
+    batch_size: int = 64,
+    n_process: int = 1,
+    chunk_size: int = 1000,
+) -> Iterator[dict]:
+    """Streams the locations of texts, as returned by get_location.
+
+    Args:
+        texts (Iterable[str]): texts, e.g. a generator over the article table.
+        batch_size (int, optional): texts per nlp.pipe batch. Defaults to 64.
+        n_process (int, optional): processes used by spaCy. Defaults to 1.
+        chunk_size (int, optional): texts whose places are geocoded together. None geocodes all texts together. Defaults to 1000.
+    """
+    geps_chunk = []
+    for geps in iter_GEP_locations(texts, batch_size=batch_size, n_process=n_process):
+        geps_chunk.append(geps)
+        if chunk_size is not None and len(geps_chunk) >= chunk_size:
+            yield from _geocode_GEP_locations(geps_chunk)
+            geps_chunk = []
+    yield from _geocode_GEP_locations(geps_chunk)
+
+
+def _geocode_GEP_locations(geps_per_text: list[dict]) -> Iterator[dict]:
+    #Step 1. Get the geocoordinates of the unique places
+    places = {loc for geps in geps_per_text for loc in geps}
+    geocoded = get_geocode_cache().lookup_many(list(places)) if places else {}
+
+    for geps in geps_per_text:
+        locations = {}
+        for loc, count in geps.items():
+            locations[loc] = get_coordinates(loc, count, geocoded=geocoded[loc] or {})
+
+        #Step 2. Get the location that was most popular
+        main = {}
+        key_popular = _get_most_popular_location(locations)
+        if key_popular is not None:
+            main[key_popular] = locations.pop(key_popular)
+
+        #Step 3. Organize data structure
+        yield dict(main=main, others=locations)
 
 
 
@@ -180,24 +444,69 @@ def split_in_paragraphs(text):
 #This function gets the sentiment value of an article
 #==========================================================================
 def bert_get_sentiment_of_article(article_text):
-    #Get the paragraphs
-    lines = split_in_paragraphs(article_text)
+    return bert_get_sentiment_of_articles([article_text])[0]
+
 
-    #Obtain sentiment value of each paragraph
-    sentiment_lines = {}
-    i=0
-    for line in lines:
-        if len(line)>0:
-            label, score = bert_get_sentiment_of_text(line)
-            sentiment_lines[i] = {"label" : label, "score" : score}
-            i=i+1
-    return sentiment_lines
+#==========================================================================
+#This function gets the sentiment value of the paragraphs of many articles
+#==========================================================================
+def bert_get_sentiment_of_articles(
+    article_texts: list[str],
+    batch_size: int = 32,
+    max_length: int = 512,
+) -> list[dict]:
+    """Sentiment of every paragraph of many articles with batched inference.
+
+    Paragraphs of all articles are sorted by length and grouped in padded batches, so
+    each forward pass handles similar lengths with little padding. The torch thread count
+    is set by SENTIMENT_NUM_THREADS when the model is loaded.
+
+    Args:
+        article_texts (list[str]): text of the articles.
+        batch_size (int, optional): paragraphs per forward pass. Defaults to 32.
+        max_length (int, optional): paragraphs are truncated to this number of tokens. Defaults to 512.
+
+    Returns:
+        list[dict]: for each article, {paragraph index: {"label": label, "score": score}}
+            as returned by bert_get_sentiment_of_article.
+    """
+    import torch
+    tokenizer, model = get_sentiment_model()
+
+    # flatten paragraphs of all articles keeping (article index, paragraph index).
+    paragraphs = []
+    for article_index, article_text in enumerate(article_texts):
+        lines = [line for line in split_in_paragraphs(article_text) if len(line) > 0]
+        for paragraph_index, line in enumerate(lines):
+            paragraphs.append((article_index, paragraph_index, line))
+    paragraphs.sort(key=lambda paragraph: len(paragraph[2]))
+
+    sentiments = [{} for _ in article_texts]
+    with torch.inference_mode():
+        for start in range(0, len(paragraphs), batch_size):
+            batch = paragraphs[start:start+batch_size]
+            encoded_text = tokenizer(
+                [paragraph[2] for paragraph in batch],
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors='pt')
+            output = model(**encoded_text)
+            scores = torch.softmax(output[0], dim=-1).numpy()
+            for (article_index, paragraph_index, _), paragraph_scores in zip(batch, scores):
+                label, score = max_score(paragraph_scores)
+                sentiments[article_index][paragraph_index] = {"label" : label, "score" : score}
+
+    # keep paragraphs in their original order.
+    return [dict(sorted(sentiment.items())) for sentiment in sentiments]
 
 
 #==========================================================================
 #This function gets the sentiment value of a text
 #==========================================================================
 def bert_get_sentiment_of_text(text):
+    from scipy.special import softmax
+    tokenizer, model = get_sentiment_model()
     encoded_text = tokenizer(text, return_tensors='pt')
     output = model(**encoded_text)
     scores = output[0][0].detach().numpy()
@@ -212,25 +521,20 @@ def bert_get_sentiment_of_text(text):
     return label, score
 
 
-#======================================================================
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-nltk.download('all')
-
 #======================================================================
 def nltk_preprocess_text(text):
+    models.get('nltk_preprocess')
+    from nltk.tokenize import word_tokenize
 
     # Tokenize the text
     tokens = word_tokenize(text.lower())
 
     # Remove stop words
-    filtered_tokens = [token for token in tokens if token not in stopwords.words('english')]
+    stop_words = models.get('nltk_stopwords')
+    filtered_tokens = [token for token in tokens if token not in stop_words]
 
     # Lemmatize the tokens
-    lemmatizer = WordNetLemmatizer()
+    lemmatizer = models.get('nltk_lemmatizer')
     lemmatized_tokens = [lemmatizer.lemmatize(token) for token in filtered_tokens]
 
     # Join the tokens back into a string
@@ -268,7 +572,7 @@ def nltk_max_score(scores):
 
 #=====================================================================================
 def nltk_sentiment_text(text):
-    analyzer = SentimentIntensityAnalyzer()
+    analyzer = models.get('nltk_vader_analyzer')
     pre_pro_text = nltk_preprocess_text(text)
     scores = analyzer.polarity_scores(pre_pro_text)
     label, score, overall = nltk_max_score(scores)
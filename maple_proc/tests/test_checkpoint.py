@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from maple_processing.checkpoint import IterationCheckpoint
+
+
+class TestIterationCheckpoint(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'uuid-1')
+        self.checkpoint = IterationCheckpoint(self.path, 'uuid-1', 'MapleBert')
+        self.checkpoint.save()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_phases(self):
+        self.assertFalse(self.checkpoint.reached('trained'))
+        self.checkpoint.advance('classified')
+        loaded = IterationCheckpoint.load(self.path)
+        self.assertTrue(loaded.reached('trained'))
+        self.assertTrue(loaded.reached('classified'))
+        self.assertFalse(loaded.reached('named'))
+
+    def test_progress(self):
+        self.checkpoint.record_page(0, [dict(uuid='a', chat_summary='A')], 1)
+        self.checkpoint.record_page(1, [dict(uuid='b', chat_summary='B')], 2)
+        self.checkpoint.record_topic('topic', 'label', ['summary'])
+        self.checkpoint.save_object('model_level1', dict(value=1))
+
+        loaded = IterationCheckpoint.load(self.path)
+        self.assertEqual(loaded.cursor, 2)
+        self.assertEqual(loaded.article_classified, 2)
+        self.assertEqual([article['uuid'] for article in loaded.articles()], ['a', 'b'])
+        self.assertEqual(loaded.topics['topic']['label'], 'label')
+        self.assertEqual(loaded.load_object('model_level1'), dict(value=1))
+
+    def test_find(self):
+        other = IterationCheckpoint(os.path.join(self.tmpdir.name, 'uuid-2'), 'uuid-2', 'MapleLDA')
+        other.save()
+        found = IterationCheckpoint.find(self.tmpdir.name, ['MapleBert'])
+        self.assertEqual([checkpoint.model_iteration_uuid for checkpoint in found], ['uuid-1'])
+        self.checkpoint.remove()
+        self.assertEqual(IterationCheckpoint.find(self.tmpdir.name, ['MapleBert']), [])
+
+    def test_in_memory(self):
+        checkpoint = IterationCheckpoint()
+        checkpoint.record_page(0, [dict(uuid='a')], 1)
+        checkpoint.advance('trained')
+        self.assertEqual(checkpoint.cursor, 1)
+        self.assertEqual(checkpoint.articles(), [])
+
+    def test_resume_after_failed_page(self):
+        self.checkpoint.record_page(0, [dict(uuid='a')], 1)
+        # page 1 failed to post, page 2 was posted before the iteration stopped.
+        self.checkpoint.record_page(2, [dict(uuid='c')], 2)
+        self.assertEqual(self.checkpoint.cursor, 1)
+
+        resumed = IterationCheckpoint.load(self.path)
+        self.assertEqual(resumed.cursor, 1)
+        self.assertFalse(resumed.completed(1))
+        self.assertTrue(resumed.completed(2))
+        self.assertFalse(resumed.completed(3))
+        resumed.record_page(1, [dict(uuid='b')], 3)
+        self.assertEqual(resumed.cursor, 3)
+        self.assertEqual(resumed.pages, [])
+        self.assertEqual(
+            sorted(article['uuid'] for article in IterationCheckpoint.load(self.path).articles()),
+            ['a', 'b', 'c'])
+
+    def test_partially_posted_page(self):
+        self.checkpoint.record_chunk(1, ['a', 'b'])
+        self.checkpoint.record_chunk(1, ['c'])
+
+        resumed = IterationCheckpoint.load(self.path)
+        self.assertEqual(resumed.posted_articles(1), {'a', 'b', 'c'})
+        self.assertEqual(resumed.posted_articles(2), set())
+        resumed.record_page(1, [dict(uuid='a'), dict(uuid='b'), dict(uuid='c'), dict(uuid='d')], 4)
+        self.assertEqual(IterationCheckpoint.load(self.path).posted_articles(1), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import pickle
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from maple_processing.embedding import EmbeddingStore
+
+try:
+    from maple_processing.classifier import MapleClassifier
+except ImportError:
+    # the model dependencies (bertopic) are not installed.
+    MapleClassifier = None
+
+MODEL_ITERATION_UUID = 'model-iteration'
+
+
+class FakeEncoder:
+    def encode(self, documents, batch_size=None):
+        return np.asarray([[len(document), 1.0] for document in documents], dtype=np.float32)
+
+
+class FakePositionModel:
+    def transform(self, embeddings):
+        return np.zeros((len(embeddings), 2))
+
+
+class FakeModel:
+    @classmethod
+    def maple_load(cls, model_path):
+        return cls()
+
+    def transform(self, documents, embeddings=None):
+        return [0] * len(documents), [0.5] * len(documents)
+
+
+class FakeBackend:
+    """processed of the backend, with the AsyncMapleAPI used to retrieve them."""
+
+    def __init__(self, articles=()):
+        self.processed = [dict(article=dict(uuid=uuid)) for uuid in articles]
+        self.fail = False
+
+    def post(self, processed):
+        self.processed.extend(dict(article=dict(uuid=uuid)) for uuid in processed.article)
+        return True
+
+    def from_maple_api(self, maple_api):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def processed_get_all(self, model_iteration_uuid, as_json=False, **kwargs):
+        if self.fail:
+            raise ConnectionError('backend unreachable')
+        return list(self.processed)
+
+
+def article(uuid):
+    return SimpleNamespace(uuid=uuid, chat_summary=f'summary of {uuid}')
+
+
+@unittest.skipIf(MapleClassifier is None, 'bertopic is not installed')
+class TestMapleClassifier(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        directory = os.path.join(self.tmpdir.name, MODEL_ITERATION_UUID)
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'position_model.pkl'), 'wb') as file:
+            pickle.dump(FakePositionModel(), file)
+        self.backend = FakeBackend(['a1'])
+        patcher = mock.patch('maple_processing.classifier.AsyncMapleAPI', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def create_maple(self):
+        model_iteration = SimpleNamespace(uuid=MODEL_ITERATION_UUID, createDate='2024-01-01')
+        for level in range(1, 4):
+            setattr(model_iteration, f'model_level{level}', SimpleNamespace(
+                topic=[SimpleNamespace(index=0, uuid=f'topic-{level}')]))
+        maple = mock.MagicMock()
+        maple.model_iteration_get.return_value = [model_iteration]
+        maple.retry_policy.call.side_effect = lambda function, *args, **kwargs: function(*args)
+        maple.processed_post_many.side_effect = self.backend.post
+        return maple
+
+    def create_classifier(self, **kwargs):
+        kwargs.setdefault('max_latency', 0.01)
+        classifier = MapleClassifier(
+            maple=self.create_maple(),
+            model=FakeModel,
+            model_iteration_datapath=self.tmpdir.name,
+            poll_interval=None,
+            **kwargs)
+        classifier._embedding_store = EmbeddingStore(
+            os.path.join(self.tmpdir.name, 'embeddings'), encoder=FakeEncoder())
+        return classifier
+
+    def test_batch_by_size(self):
+        classifier = self.create_classifier(batch_size=2, max_latency=10)
+        for uuid in ['b1', 'b2', 'b3']:
+            self.assertTrue(classifier.submit(article(uuid)))
+        tstart = time.monotonic()
+        batch = classifier._next_batch(timeout=1)
+        self.assertLess(time.monotonic() - tstart, 1)
+        self.assertEqual([item.uuid for item in batch], ['b1', 'b2'])
+        self.assertEqual(classifier._queue.qsize(), 1)
+
+    def test_batch_by_latency(self):
+        classifier = self.create_classifier(batch_size=10, max_latency=0.05)
+        classifier.submit(article('b1'))
+        tstart = time.monotonic()
+        batch = classifier._next_batch(timeout=1)
+        self.assertLess(time.monotonic() - tstart, 1)
+        self.assertEqual([item.uuid for item in batch], ['b1'])
+        self.assertEqual(classifier._next_batch(timeout=0.01), [])
+
+    def test_skip_classified(self):
+        classifier = self.create_classifier()
+        self.assertTrue(classifier.load_latest())
+        # a1 was classified before, b1 has no chat_summary.
+        self.assertFalse(classifier.submit(article('a1')))
+        self.assertFalse(classifier.submit(SimpleNamespace(uuid='b1', chat_summary=None)))
+        self.assertTrue(classifier.submit(article('a2')))
+        self.assertFalse(classifier.submit(article('a2')))
+        classifier._process_batch(classifier._next_batch(timeout=1))
+        self.assertEqual(classifier.maple_api.processed_post_many.call_count, 1)
+        posted = classifier.maple_api.processed_post_many.call_args[0][0]
+        self.assertEqual(list(posted.article), ['a2'])
+        self.assertFalse(classifier.submit(article('a2')))
+
+    def test_restart(self):
+        classifier = self.create_classifier()
+        classifier.load_latest()
+        classifier.submit(article('a2'))
+        classifier._process_batch(classifier._next_batch(timeout=1))
+
+        # a new instance knows the articles posted by the previous one.
+        restarted = self.create_classifier()
+        self.assertTrue(restarted.load_latest())
+        self.assertFalse(restarted.submit(article('a2')))
+        self.assertEqual(sorted(item['article']['uuid'] for item in self.backend.processed), ['a1', 'a2'])
+
+    def test_load_fails_without_backend(self):
+        self.backend.fail = True
+        classifier = self.create_classifier()
+        self.assertFalse(classifier.load_latest())
+        self.assertIsNone(classifier.model_iteration)
+
+
+if __name__ == '__main__':
+    unittest.main()
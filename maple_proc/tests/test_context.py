@@ -0,0 +1,61 @@
+import pickle
+import unittest
+import numpy as np
+from maple_processing.context import IterationContext, SharedReduction
+
+
+class FakeUMAP:
+    def __init__(self):
+        self.fitted = 0
+        self.transformed = 0
+
+    def fit_transform(self, X, y=None):
+        self.fitted += 1
+        return np.asarray(X)[:, :2] * 2
+
+    def transform(self, X):
+        self.transformed += 1
+        return np.asarray(X)[:, :2] * 2
+
+
+class TestSharedReduction(unittest.TestCase):
+    def setUp(self) -> None:
+        self.umap = FakeUMAP()
+        self.context = IterationContext(reduction=SharedReduction(self.umap))
+        self.embeddings = np.arange(12, dtype=np.float32).reshape(4, 3)
+
+    def test_reused_by_all_levels(self):
+        # each level fits its own model, as BERTopic does, on the same embeddings.
+        reduced = [
+            self.context.reduction.fit(self.embeddings).transform(self.embeddings)
+            for _ in range(3)]
+        self.assertEqual(self.umap.fitted, 1)
+        self.assertEqual(self.umap.transformed, 0)
+        for value in reduced[1:]:
+            self.assertIs(value, reduced[0])
+        # an equal copy of the input is found by content.
+        self.context.reduction.transform(self.embeddings.copy())
+        self.assertEqual(self.umap.transformed, 0)
+
+    def test_invalidated_when_input_changes(self):
+        reduction = self.context.reduction
+        reduction.fit_transform(self.embeddings)
+        changed = self.embeddings.copy()
+        changed[0, 0] += 1
+        reduced = reduction.fit_transform(changed)
+        self.assertEqual(self.umap.fitted, 2)
+        np.testing.assert_array_equal(reduced, changed[:, :2] * 2)
+        # new embeddings are transformed by the fitted model, not taken from the cache.
+        reduction.transform(self.embeddings[:2])
+        self.assertEqual(self.umap.transformed, 1)
+
+    def test_pickle_drops_cache(self):
+        self.context.reduction.fit(self.embeddings)
+        restored = pickle.loads(pickle.dumps(self.context.reduction))
+        self.assertEqual(len(restored._cache), 0)
+        restored.transform(self.embeddings)
+        self.assertEqual(restored.umap_model.transformed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
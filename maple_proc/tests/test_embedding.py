@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from maple_processing.embedding import EmbeddingStore
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, documents, batch_size=None):
+        self.encoded.extend(documents)
+        return np.array([[len(document), 1.0] for document in documents], dtype=np.float32)
+
+
+class TestEmbeddingStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def store(self, encoder=None):
+        return EmbeddingStore(self.tmpdir.name, model_name='fake', encoder=encoder or FakeEncoder())
+
+    def test_append_and_reload(self):
+        encoder = FakeEncoder()
+        store = self.store(encoder)
+        store.embed(['a', 'bb'], uuids=['1', '2'])
+        embeddings = store.embed(['bb', 'ccc'], uuids=['2', '3'])
+        self.assertEqual(encoder.encoded, ['a', 'bb', 'ccc'])
+        np.testing.assert_array_equal(embeddings[:, 0], [2, 3])
+
+        encoder = FakeEncoder()
+        reloaded = self.store(encoder)
+        self.assertEqual(len(reloaded), 3)
+        embeddings = reloaded.embed(['ccc', 'a'], uuids=['3', '1'])
+        self.assertEqual(encoder.encoded, [])
+        np.testing.assert_array_equal(embeddings[:, 0], [3, 1])
+
+    def test_interrupted_append(self):
+        store = self.store()
+        store.embed(['a', 'bb'], uuids=['1', '2'])
+        # a row written without its key, and a partial key line.
+        with open(store.data_path, 'ab') as file:
+            np.zeros(2, dtype=np.float32).tofile(file)
+        with open(store.keys_path, 'a', encoding='utf-8') as file:
+            file.write('3:partial')
+        reloaded = self.store()
+        self.assertEqual(len(reloaded), 2)
+        embeddings = reloaded.embed(['ccc'], uuids=['3'])
+        np.testing.assert_array_equal(embeddings[:, 0], [3])
+        self.assertEqual(len(self.store()), 3)
+
+    def test_missing_data_file(self):
+        store = self.store()
+        store.embed(['a', 'bb'], uuids=['1', '2'])
+        os.remove(store.data_path)
+        encoder = FakeEncoder()
+        reloaded = self.store(encoder)
+        self.assertEqual(len(reloaded), 0)
+        embeddings = reloaded.embed(['bb'], uuids=['2'])
+        self.assertEqual(encoder.encoded, ['bb'])
+        np.testing.assert_array_equal(embeddings[:, 0], [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
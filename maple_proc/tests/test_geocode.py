@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from maple_processing.geocode import GeocodeCache
+
+
+class Location:
+    def __init__(self, address, latitude, longitude):
+        self.address = address
+        self.latitude = latitude
+        self.longitude = longitude
+        self.raw = dict(addresstype='city')
+
+
+class TestGeocodeCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.requests = []
+        places = {'Ottawa': Location('Ottawa, Ontario, Canada', 45.42, -75.69)}
+
+        def geocoder(text):
+            self.requests.append(text)
+            return places.get(text)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'geocode.sqlite')
+        self.cache = GeocodeCache(self.path, geocoder=geocoder)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_unique_places_geocoded_once(self):
+        results = self.cache.lookup_many(['Ottawa', 'ottawa', ' OTTAWA. ', 'Atlantis'])
+        self.assertEqual(sorted(self.requests), ['Atlantis', 'Ottawa'])
+        self.assertEqual(results['ottawa']['latitude'], 45.42)
+        self.assertEqual(results[' OTTAWA. ']['address'], 'Ottawa, Ontario, Canada')
+        self.assertIsNone(results['Atlantis'])
+
+        # not found places are cached as well.
+        self.cache.lookup_many(['Ottawa', 'Atlantis'])
+        self.assertEqual(len(self.requests), 2)
+
+    def test_persistent(self):
+        self.cache.lookup('Ottawa')
+        self.cache.close()
+        cache = GeocodeCache(self.path, offline=True)
+        self.assertEqual(cache.lookup('Ottawa')['longitude'], -75.69)
+        cache.close()
+        self.cache = GeocodeCache(self.path, offline=True)
+
+    def test_gazetteer_offline(self):
+        gazetteer = os.path.join(self.tmpdir.name, 'gazetteer.csv')
+        with open(gazetteer, 'w', encoding='utf-8') as file:
+            file.write('name,latitude,longitude,address_type\n')
+            file.write('Toronto,43.65,-79.38,city\n')
+            file.write('Invalid,,,\n')
+        cache = GeocodeCache(offline=True)
+        self.assertEqual(cache.seed_gazetteer(gazetteer), 1)
+        self.assertEqual(cache.lookup('toronto')['address_type'], 'city')
+        self.assertIsNone(cache.lookup('Ottawa'))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
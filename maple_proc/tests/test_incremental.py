@@ -0,0 +1,62 @@
+import time
+import unittest
+from maple_processing.incremental import IncrementalState, match_topics
+
+
+class Topic:
+    def __init__(self, index, keyword):
+        self.index = index
+        self.keyword = keyword
+
+
+class TestIncrementalState(unittest.TestCase):
+    def create_state(self, trained_at=None):
+        return IncrementalState(
+            models={},
+            topics={},
+            documents={'a': ('hash-a', {1: 0, 2: 1, 3: -1})},
+            classified={},
+            baseline_outlier_rate=0.1,
+            position_version=1,
+            trained_at=trained_at)
+
+    def test_expired(self):
+        self.assertFalse(self.create_state().expired(24))
+        self.assertTrue(self.create_state(time.time() - 25 * 3600).expired(24))
+        self.assertFalse(self.create_state(time.time() - 25 * 3600).expired(None))
+
+    def test_is_known(self):
+        state = self.create_state()
+        self.assertTrue(state.is_known('a', 'hash-a'))
+        self.assertFalse(state.is_known('a', 'changed'))
+        self.assertFalse(state.is_known('b', 'hash-a'))
+
+
+
+class TestMatchTopics(unittest.TestCase):
+    def test_match_by_keywords(self):
+        previous_topics = {
+            0: Topic(0, ['election', 'vote', 'party', 'poll']),
+            1: Topic(1, ['storm', 'rain', 'flood', 'wind']),
+            2: Topic(2, ['market', 'stock', 'bank', 'rate']),
+        }
+        topic_info = [
+            # same keywords, different index.
+            Topic(0, ['storm', 'rain', 'flood', 'wind']),
+            Topic(1, ['election', 'vote', 'party', 'campaign']),
+            # keywords changed, the label can not be reused.
+            Topic(2, ['hockey', 'game', 'team', 'rate']),
+        ]
+        matches = match_topics(topic_info, previous_topics, min_overlap=0.5)
+        self.assertIs(matches[0], previous_topics[1])
+        self.assertIs(matches[1], previous_topics[0])
+        self.assertNotIn(2, matches)
+
+    def test_previous_topic_matched_once(self):
+        previous_topics = {0: Topic(0, ['a', 'b'])}
+        topic_info = [Topic(0, ['a', 'b']), Topic(1, ['a', 'b'])]
+        self.assertEqual(list(match_topics(topic_info, previous_topics)), [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+from maple_processing import llm_clients
+from maple_processing.llm_clients import LLMClientPool
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class TestLLMClientPool(unittest.TestCase):
+    def test_reuse_and_close(self):
+        pool = LLMClientPool()
+
+        async def run():
+            first = pool.get('openai', None, 'a', FakeClient)
+            self.assertIs(pool.get('openai', None, 'a', FakeClient), first)
+            other = pool.get('openai', None, 'b', FakeClient)
+            self.assertIsNot(other, first)
+            self.assertEqual(len(pool), 2)
+            await pool.close()
+            self.assertTrue(first.closed and other.closed)
+            self.assertEqual(len(pool), 0)
+
+        asyncio.run(run())
+
+    def test_clients_per_loop(self):
+        pool = LLMClientPool()
+
+        async def get():
+            return pool.get('personalized', 'http://host:1', None, FakeClient)
+
+        first = asyncio.run(get())
+        # the client of the closed loop is dropped instead of being reused.
+        with self.assertLogs('LLMClientPool', level='WARNING'):
+            second = asyncio.run(get())
+        self.assertIsNot(first, second)
+        self.assertFalse(first.closed)
+        self.assertEqual(len(pool), 1)
+
+    def test_run_closes_clients(self):
+        pool = llm_clients.get_client_pool()
+
+        async def get():
+            return pool.get('personalized', 'http://host:2', None, FakeClient)
+
+        client = llm_clients.run(get())
+        self.assertTrue(client.closed)
+        self.assertEqual(len(pool), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
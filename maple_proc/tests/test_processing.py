@@ -0,0 +1,132 @@
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from requests import Response
+from maple_structures import Model, ModelIteration, ProcessedBatch
+from maple_interface import RetryPolicy
+from maple_processing.checkpoint import IterationCheckpoint
+from maple_processing.context import SharedReduction
+from maple_processing.incremental import IncrementalState
+
+try:
+    from maple_processing.processing import MapleProcessing
+except ImportError:
+    # the model dependencies (bertopic) are not installed.
+    MapleProcessing = None
+
+
+class Reduction:
+    def __init__(self):
+        self.transformed = 0
+
+    def fit_transform(self, X, y=None):
+        return np.asarray(X)[:, :2]
+
+    def transform(self, X):
+        self.transformed += 1
+        return np.asarray(X)[:, :2]
+
+
+class Model_:
+    """stand-in for a trained MapleModel."""
+
+    def __init__(self, umap_model):
+        self.umap_model = umap_model
+        self.type = 'bert'
+        self.name = 'BERTopic'
+        self.model_structure = Model()
+
+    def reset_model_structure(self):
+        self.model_structure = Model()
+
+
+@unittest.skipIf(MapleProcessing is None, 'bertopic is not installed')
+class TestReuseModels(unittest.TestCase):
+    def test_levels_share_reduction(self):
+        reduction = SharedReduction(Reduction())
+        state = IncrementalState(
+            models={level: Model_(reduction) for level in range(1, 4)},
+            topics={},
+            documents={},
+            classified={},
+            baseline_outlier_rate=0.0,
+            position_version=0)
+        processing = MapleProcessing(maple=mock.MagicMock(), models=[])
+        with mock.patch.object(processing, '_post_model_iteration'):
+            processing._reuse_models(state)
+
+        umap_models = [getattr(processing, f'model_level{level}').umap_model for level in range(1, 4)]
+        self.assertIsNot(umap_models[0], reduction)
+        self.assertIs(umap_models[0], umap_models[1])
+        self.assertIs(umap_models[0], umap_models[2])
+        # the reduction of a page is computed once for all levels.
+        embeddings = np.random.rand(5, 4)
+        for umap_model in umap_models:
+            umap_model.transform(embeddings)
+        self.assertEqual(umap_models[0].umap_model.transformed, 1)
+
+
+@unittest.skipIf(MapleProcessing is None, 'bertopic is not installed')
+class TestWriteRetryPolicy(unittest.TestCase):
+    def test_writes_retried_forever(self):
+        maple = mock.MagicMock()
+        maple.retry_policy = RetryPolicy(max_attempts=5)
+        processing = MapleProcessing(maple=maple, models=[])
+        self.assertIsNone(processing._write_retry_policy.max_attempts)
+        self.assertEqual(maple.retry_policy.max_attempts, 5)
+        policy = RetryPolicy(max_attempts=2)
+        processing = MapleProcessing(maple=maple, models=[], write_retry_policy=policy)
+        self.assertIs(processing._write_retry_policy, policy)
+
+
+@unittest.skipIf(MapleProcessing is None, 'bertopic is not installed')
+class TestPostProcessed(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.posted = []
+        self.fail_chunk = None
+        self.processing = self.create_processing()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def post_many(self, batch):
+        if len(batch) > 100:
+            response = Response()
+            response.status_code = 413
+            return response
+        if len(self.posted) == self.fail_chunk:
+            raise ConnectionError('backend unreachable')
+        self.posted.append(list(batch.article))
+        return True
+
+    def create_processing(self):
+        maple = mock.MagicMock()
+        maple.processed_post_many.side_effect = self.post_many
+        processing = MapleProcessing(maple=maple, models=[], write_retry_policy=RetryPolicy(max_attempts=1))
+        processing._model_iteration = ModelIteration()
+        processing._model_iteration.article_classified = 0
+        processing._checkpoint = IterationCheckpoint.load(self.tmpdir.name) or IterationCheckpoint(self.tmpdir.name)
+        processing._update_model_iteration = mock.MagicMock()
+        return processing
+
+    def test_resume_partially_posted_page(self):
+        articles = [f'a{index}' for index in range(250)]
+        batch = ProcessedBatch(model_iteration_uuid='model-iteration', article=articles)
+        self.fail_chunk = 1
+        with self.assertRaises(ConnectionError):
+            self.processing._post_processed(3, [], batch)
+        self.assertEqual(self.posted, [articles[:100]])
+
+        # the resumed iteration classifies the page again and only posts what is missing.
+        self.fail_chunk = None
+        resumed = self.create_processing()
+        resumed._post_processed(3, [], batch)
+        posted = [article for chunk in self.posted for article in chunk]
+        self.assertEqual(sorted(posted), sorted(articles))
+        self.assertEqual(resumed._model_iteration.article_classified, 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
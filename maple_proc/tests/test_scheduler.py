@@ -0,0 +1,88 @@
+import threading
+import time
+import unittest
+
+try:
+    from maple_processing.model import MapleModel
+    from maple_processing.scheduler import ModelFamilyScheduler
+except ImportError:
+    # the model dependencies (bertopic) are not installed.
+    ModelFamilyScheduler = None
+
+
+class Processing:
+    """stand-in for the MapleProcessing of a model family, with one cpu bound phase."""
+
+    def __init__(self, models, recorder, cpu_semaphore=None, embedding_store=None):
+        self.model_families = models
+        self.embedding_store = embedding_store or object()
+        self.cpu_semaphore = cpu_semaphore
+        self.recorder = recorder
+        self.run_once = None
+
+    def run(self, *, run_once=False):
+        self.run_once = run_once
+        self.recorder.started.wait(timeout=5)
+        with self.cpu_semaphore:
+            self.recorder.enter()
+            time.sleep(0.05)
+            self.recorder.leave()
+
+
+class Recorder:
+    def __init__(self, families: int):
+        # every family waits for the others, so the runs must be concurrent.
+        self.started = threading.Barrier(families)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def enter(self):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def leave(self):
+        with self._lock:
+            self.active -= 1
+
+
+@unittest.skipIf(ModelFamilyScheduler is None, 'bertopic is not installed')
+class TestModelFamilyScheduler(unittest.TestCase):
+    def create_scheduler(self, families: int, max_cpu_jobs: int):
+        models = [type(f'Model{index}', (MapleModel,), {}) for index in range(families)]
+        recorder = Recorder(families)
+        processings = []
+
+        def create_processing(models, **kwargs):
+            processings.append(Processing(models, recorder, **kwargs))
+            return processings[-1]
+
+        scheduler = ModelFamilyScheduler(models, create_processing, max_cpu_jobs=max_cpu_jobs)
+        return scheduler, processings, recorder
+
+    def test_families_run_concurrently(self):
+        scheduler, processings, recorder = self.create_scheduler(2, max_cpu_jobs=2)
+        scheduler.run(run_once=True)
+        self.assertFalse(recorder.started.broken)
+        self.assertEqual(recorder.max_active, 2)
+        self.assertEqual([processing.run_once for processing in processings], [True, True])
+        # the families share the embedding store of the first one.
+        self.assertIs(processings[1].embedding_store, processings[0].embedding_store)
+
+    def test_cpu_phases_limited(self):
+        scheduler, processings, recorder = self.create_scheduler(3, max_cpu_jobs=1)
+        scheduler.run(run_once=True)
+        self.assertFalse(recorder.started.broken)
+        self.assertEqual(recorder.max_active, 1)
+        self.assertIs(processings[0].cpu_semaphore, processings[2].cpu_semaphore)
+
+    def test_not_a_model(self):
+        with self.assertRaises(ValueError):
+            ModelFamilyScheduler([object], lambda models, **kwargs: None)
+        with self.assertRaises(ValueError):
+            ModelFamilyScheduler([], lambda models, **kwargs: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from maple_processing.training import SharedArray, SharedDocuments, train_levels
+
+
+class Reduction:
+    def __init__(self):
+        self.fitted = 0
+
+    def fit_transform(self, X, y=None):
+        self.fitted += 1
+        return np.asarray(X)[:, :2]
+
+
+class Model:
+    """picklable stand-in for a MapleModel."""
+
+    def __init__(self, level):
+        self.level = level
+        self.umap_model = None
+        self.embedding_model = 'embedding'
+
+    def fit_transform(self, documents, embeddings=None):
+        reduced = self.umap_model.transform(embeddings)
+        self.topics_ = [int(value > 0) for value in reduced[:, 0]]
+        self.documents_ = list(documents)
+        return self.topics_, None
+
+    def maple_get_topic_info(self):
+        return sorted(set(self.topics_))
+
+
+class TestTraining(unittest.TestCase):
+    def test_shared_array(self):
+        array = np.arange(12, dtype=np.float32).reshape(3, 4)
+        shared = SharedArray.create(array)
+        try:
+            np.testing.assert_array_equal(shared.array(), array)
+        finally:
+            shared.unlink()
+
+    def test_shared_documents(self):
+        documents = ['first', 'segundo é', '']
+        shared = SharedDocuments.create(documents)
+        try:
+            self.assertEqual(shared.documents(), documents)
+        finally:
+            shared.unlink()
+
+    def test_train_levels(self):
+        embeddings = np.array([[1.0, 0.0, 5.0], [-1.0, 1.0, 5.0], [2.0, 3.0, 5.0]])
+        documents = ['a', 'b', 'c']
+        reduction = Reduction()
+        models = {level: Model(level) for level in range(1, 4)}
+        results = train_levels(models, documents, embeddings, reduction=reduction, embedding_model='shared')
+        self.assertEqual(reduction.fitted, 1)
+        for level in range(1, 4):
+            model, topic_info, _ = results[level]
+            self.assertEqual(model.level, level)
+            self.assertEqual(model.topics_, [1, 0, 1])
+            self.assertEqual(model.documents_, documents)
+            self.assertEqual(topic_info, [0, 1])
+            self.assertIs(model.umap_model, reduction)
+            self.assertEqual(model.embedding_model, 'shared')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from maple_processing import utils
+from maple_processing.utils import ModelRegistry, load_processed_articles
+
+IMPORT_TIME_BUDGET = 2.0
+HEAVY_MODULES = ['spacy', 'torch', 'transformers', 'nltk', 'bertopic', 'scipy', 'geopy']
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_budget(self):
+        code = (
+            "import json, sys, timeit\n"
+            "tstart = timeit.default_timer()\n"
+            "from maple_processing.utils import load_articles\n"
+            "elapsed = timeit.default_timer() - tstart\n"
+            f"print(json.dumps(dict(elapsed=elapsed, loaded=[m for m in {HEAVY_MODULES!r} if m in sys.modules])))\n"
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        self.assertEqual(result['loaded'], [])
+        self.assertLess(result['elapsed'], IMPORT_TIME_BUDGET)
+
+
+class TestModelRegistry(unittest.TestCase):
+    def test_loaded_once(self):
+        calls = []
+        registry = ModelRegistry()
+        registry.register('model', lambda: calls.append(1) or object())
+        self.assertFalse(registry.is_loaded('model'))
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(registry.get('model')))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_warmup(self):
+        registry = ModelRegistry()
+        registry.register('a', object)
+        registry.register('b', object)
+        registry.warmup(['a'])
+        self.assertTrue(registry.is_loaded('a'))
+        self.assertFalse(registry.is_loaded('b'))
+
+    def test_unknown_model(self):
+        with self.assertRaises(KeyError):
+            ModelRegistry().get('unknown')
+
+
+class TestSentimentModel(unittest.TestCase):
+    def load(self, num_threads):
+        torch = mock.MagicMock()
+        transformers = mock.MagicMock()
+        with mock.patch.dict(sys.modules, torch=torch, transformers=transformers), \
+                mock.patch.object(utils, 'SENTIMENT_NUM_THREADS', num_threads):
+            utils._load_sentiment_model()
+        return torch
+
+    def test_threads_set_at_load(self):
+        torch = self.load(2)
+        torch.set_num_threads.assert_called_once_with(2)
+
+    def test_threads_kept_by_default(self):
+        torch = self.load(None)
+        torch.set_num_threads.assert_not_called()
+
+
+
+class TestLoadProcessedArticles(unittest.TestCase):
+    def test_stored_processed(self):
+        # processed as returned by the backend and stored by MapleProcessing._store_data.
+        processed = [
+            dict(
+                uuid=f'processed-{index}',
+                createDate='2024-01-01T00:00:00.000Z',
+                modifyDate='2024-01-01T00:00:00.000Z',
+                article=dict(uuid=f'article-{index}', title='title', url=f'https://example.com/{index}'),
+                modelIteration=dict(uuid='model-iteration'),
+                topic_level1=dict(uuid='topic-1'),
+                topic_level1_prob=0.5,
+                topic_level2=dict(uuid='topic-2'),
+                topic_level2_prob=0.4,
+                topic_level3=dict(uuid='topic-3'),
+                topic_level3_prob=0.3,
+                position=[0.1, 0.2],
+            )
+            for index in range(3)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'processed.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(processed, file, indent=2)
+            self.assertEqual(load_processed_articles(path), {'article-0', 'article-1', 'article-2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,3 @@
 '''Maple structures module'''
-from .maple import Comments, Article, Author
-from .model import Topic, Model, ModelIteration, Processed
+from .maple import Comments, Article, ArticleLite, Author
+from .model import Topic, Model, ModelIteration, Processed, ProcessedBatch
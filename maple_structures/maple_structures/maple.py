@@ -273,25 +273,34 @@ class Article(Base):
 
     _suppress_errors = False
 
+    # name -> (attribute name, is list, secondary type). Built once with the descriptors.
+    _schema = {}
+
     def __init__(self):
         super().__init__()
         setattr(self, "_author", [])
-        for prop in self._properties:
+
+    @classmethod
+    def _install_properties(cls):
+        '''creates the property descriptors and the decoding schema of the class.'''
+        cls._schema = {}
+        for prop in cls._properties:
             setattr(
-                Article,
+                cls,
                 prop["name"],
                 _default_property(
                     prop["name"],
                     prop["type"],
                     prop["default"],
-                    secondary_type=None
-                    if "secondary_type" not in prop.keys()
-                    else prop["secondary_type"],
-                    validator=None
-                    if "validator" not in prop.keys()
-                    else prop["validator"],
+                    secondary_type=prop.get("secondary_type"),
+                    validator=prop.get("validator"),
                 ),
             )
+            cls._schema[prop["name"]] = (
+                f"_{prop['name']}",
+                prop["type"] is list,
+                prop.get("secondary_type"),
+            )
 
     @property
     def default_keys(self):
@@ -337,8 +346,15 @@ class Article(Base):
         return out
 
     @staticmethod
-    def from_json(data, *, mapping=None):
-        '''constructs an article provided the json'''
+    def from_json(data, *, mapping=None, trusted=False):
+        '''constructs an article provided the json
+
+        Args:
+            data (dict | str): the article as a dictionary or json formatted string.
+            mapping (dict, optional): renames keys of data. Defaults to None.
+            trusted (bool, optional): data comes from a trusted source (e.g. the maple backend),
+                so type checks and validators are skipped. Defaults to False.
+        '''
         if isinstance(data, str):
             try:
                 data = json.loads(data)
@@ -349,7 +365,7 @@ class Article(Base):
         if mapping is not None:
             converted = dict()
 
-            for key in data.keys():
+            for key in list(data.keys()):
                 if key in mapping.keys():
                     converted[mapping[key]] = data.pop(key)
 
@@ -359,43 +375,91 @@ class Article(Base):
             data.update(converted)
 
         article = Article()
-
-        properties = {}
-        for property in article._properties:
-            name = property.copy().pop("name")
-            properties[name] = property
-
-        for key in data.keys():
-            if key in properties.keys():
-                if key == 'metadata':
-                    invalid_metadata_keys = ['_author']
-                    for metadata_key in data[key]:
-                        if metadata_key not in invalid_metadata_keys:
-                            setattr(article, metadata_key,
-                                    data[key][metadata_key])
-                else:
-                    if properties[key]["type"] is list:
-                        outlist = []
-                        if isinstance(data[key], list):
-                            for item in data[key]:
-                                try:
-                                    outlist.append(
-                                        properties[key]["secondary_type"].from_json(
-                                            item)
-                                    )
-                                except:
-                                    outlist.append(item)
-                        setattr(article, key, outlist)
-                    else:
-                        if hasattr(properties[key]["type"], 'from_json'):
-                            setattr(
-                                article, key, properties[key]["type"].from_json(data[key]))
-                        else:
-                            setattr(article, key, data[key])
+        schema = Article._schema
+        attributes = article.__dict__
+
+        for key, value in data.items():
+            if key not in schema:
+                setattr(article, key, value)
+                continue
+            if key == 'metadata':
+                for metadata_key in value:
+                    if metadata_key != '_author':
+                        setattr(article, metadata_key, value[metadata_key])
+                continue
+            attribute, is_list, secondary_type = schema[key]
+            if is_list:
+                outlist = []
+                if isinstance(value, list):
+                    for item in value:
+                        try:
+                            outlist.append(secondary_type.from_json(item))
+                        except:
+                            outlist.append(item)
+                value = outlist
+            if trusted:
+                if value is not None:
+                    attributes[attribute] = value
             else:
-                setattr(article, key, data[key])
+                setattr(article, key, value)
         return article
 
     @classmethod
     def from_dict(cls, data):
         return cls.from_json(data)
+
+
+
+class ArticleLite:
+    '''Compact, slotted projection of an Article.
+
+    Only the requested fields are materialized. Fields that were not requested or not
+    present are left unset, so `hasattr(article, 'chat_summary')` works as for Article.
+    '''
+    __slots__ = ('uuid', 'url', 'title', 'content', 'chat_summary', 'createDate', 'modifyDate')
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            if value is not None:
+                setattr(self, key, value)
+
+    @classmethod
+    def validate_fields(cls, fields):
+        '''raises ValueError if a field is not supported by ArticleLite.'''
+        invalid = [field for field in fields if field not in cls.__slots__]
+        if len(invalid) > 0:
+            raise ValueError(f"ArticleLite does not support fields {invalid}.")
+
+    @classmethod
+    def from_json(cls, data, fields: list[str] = None):
+        '''constructs an ArticleLite from the json of an article.
+
+        Args:
+            data (dict | str): the article as a dictionary or json formatted string.
+            fields (list[str], optional): fields to keep. Defaults to all slots.
+        '''
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except JSONDecodeError:
+                raise ValueError(f"Invalid json format. {data}")
+        if fields is None:
+            fields = cls.__slots__
+        # attributes that are not Article properties (e.g. chat_summary) are stored in metadata.
+        metadata = data.get('metadata') or {}
+        article = cls()
+        for field in fields:
+            value = data.get(field)
+            if value is None:
+                value = metadata.get(field)
+            if value is not None:
+                setattr(article, field, value)
+        return article
+
+    def to_dict(self):
+        return {
+            field: getattr(self, field)
+            for field in self.__slots__ if hasattr(self, field)}
+
+
+Article._install_properties()
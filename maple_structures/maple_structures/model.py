@@ -2,7 +2,9 @@ from __future__ import annotations
 from typing import List
 from abc import ABC, abstractmethod
 import json
+import math
 import pprint
+import numpy as np
 from .maple import Article
 
 
@@ -364,6 +366,162 @@ class Processed(Base):
         return super()._from_dict(cls, data)
 
 
+class ProcessedBatch:
+    '''Columnar batch of processed.
+
+    Holds the processed of a model iteration as parallel columns instead of Processed
+    objects, and serializes straight to the payload of the processed/many endpoint.
+    '''
+    _levels = (1, 2, 3)
+
+    def __init__(
+        self,
+        model_iteration_uuid: str = None,
+        article: list[str] = None,
+        topic_level1: list[str] = None,
+        topic_level1_prob: list[float] = None,
+        topic_level2: list[str] = None,
+        topic_level2_prob: list[float] = None,
+        topic_level3: list[str] = None,
+        topic_level3_prob: list[float] = None,
+        position: list[list[float]] = None,
+        uuid: list[str] = None,
+    ) -> None:
+        """
+        Args:
+            model_iteration_uuid (str, optional): uuid of the model iteration of all processed.
+            article (list[str], optional): article uuids.
+            topic_levelN (list[str], optional): topic uuids of level N.
+            topic_levelN_prob (list[float], optional): probabilities of level N. NaN when missing.
+            position (list[list[float]], optional): 2-D positions. NaN when missing.
+            uuid (list[str], optional): uuids of the processed, if already stored in the backend.
+        """
+        self.model_iteration_uuid = model_iteration_uuid
+        self.article = list(article) if article is not None else []
+        size = len(self.article)
+        loc = locals()
+        for level in self._levels:
+            topics = loc[f'topic_level{level}']
+            probs = loc[f'topic_level{level}_prob']
+            setattr(self, f'topic_level{level}',
+                    list(topics) if topics is not None else [None] * size)
+            setattr(self, f'topic_level{level}_prob',
+                    np.asarray(probs, dtype=np.float64) if probs is not None else np.full(size, np.nan))
+        if position is not None and size > 0:
+            self.position = np.asarray(position, dtype=np.float64).reshape(size, -1)
+        else:
+            self.position = np.full((size, 2), np.nan)
+        self.uuid = list(uuid) if uuid is not None else [None] * size
+        for column in self._columns():
+            if len(getattr(self, column)) != size:
+                raise ValueError(f'Column {column} should have {size} rows.')
+
+    @classmethod
+    def _columns(cls):
+        columns = ['article', 'position', 'uuid']
+        for level in cls._levels:
+            columns.extend([f'topic_level{level}', f'topic_level{level}_prob'])
+        return columns
+
+    def __len__(self):
+        return len(self.article)
+
+    def __getitem__(self, index: slice) -> ProcessedBatch:
+        if not isinstance(index, slice):
+            raise TypeError('ProcessedBatch only supports slicing.')
+        return ProcessedBatch(
+            model_iteration_uuid=self.model_iteration_uuid,
+            **{column: getattr(self, column)[index] for column in self._columns()})
+
+    def take(self, rows: list[int]) -> ProcessedBatch:
+        '''batch with the given rows, in the given order.'''
+        columns = {}
+        for column in self._columns():
+            value = getattr(self, column)
+            if isinstance(value, np.ndarray):
+                columns[column] = value[np.asarray(rows, dtype=np.int64)]
+            else:
+                columns[column] = [value[row] for row in rows]
+        return ProcessedBatch(model_iteration_uuid=self.model_iteration_uuid, **columns)
+
+    def extend(self, other: ProcessedBatch) -> None:
+        '''appends the rows of another batch of the same model iteration.'''
+        if len(other) == 0:
+            return
+        if self.model_iteration_uuid is None:
+            self.model_iteration_uuid = other.model_iteration_uuid
+        elif other.model_iteration_uuid != self.model_iteration_uuid:
+            raise ValueError('Batches belong to different model iterations.')
+        for column in self._columns():
+            value = getattr(self, column)
+            if isinstance(value, np.ndarray):
+                if len(value) == 0:
+                    setattr(self, column, getattr(other, column).copy())
+                else:
+                    setattr(self, column, np.concatenate([value, getattr(other, column)]))
+            else:
+                value.extend(getattr(other, column))
+
+    def to_list(self, *, include_uuid: bool = False) -> list[dict]:
+        '''payload of processed/many. Rows match Processed.to_dict().'''
+        if self.model_iteration_uuid is None:
+            raise AttributeError('missing model_iteration_uuid')
+        model_iteration = dict(uuid=self.model_iteration_uuid)
+        probs = {level: getattr(self, f'topic_level{level}_prob').tolist() for level in self._levels}
+        positions = self.position.tolist()
+        out = []
+        for row, article_uuid in enumerate(self.article):
+            item = dict(article=dict(uuid=article_uuid), modelIteration=model_iteration)
+            for level in self._levels:
+                topic_uuid = getattr(self, f'topic_level{level}')[row]
+                if not topic_uuid:
+                    raise AttributeError(f'topic_level{level} is lacking uuid')
+                item[f'topic_level{level}'] = dict(uuid=topic_uuid)
+            for level in self._levels:
+                prob = probs[level][row]
+                if prob and not math.isnan(prob):
+                    item[f'topic_level{level}_prob'] = prob
+            position = positions[row]
+            if not any(math.isnan(value) for value in position):
+                item['position'] = position
+            if include_uuid and self.uuid[row] is not None:
+                item['uuid'] = self.uuid[row]
+            out.append(item)
+        return out
+
+    @classmethod
+    def from_list(cls, data: list[dict]) -> ProcessedBatch:
+        '''creates a batch from processed dictionaries (e.g. returned by the backend).'''
+        def get_uuid(value):
+            if isinstance(value, dict):
+                return value.get('uuid')
+            return value
+
+        def get_float(value):
+            return np.nan if value is None else value
+
+        model_iteration_uuid = None
+        columns = {column: [] for column in cls._columns()}
+        for item in data:
+            uuid = get_uuid(item.get('modelIteration'))
+            if model_iteration_uuid is None:
+                model_iteration_uuid = uuid
+            elif uuid is not None and uuid != model_iteration_uuid:
+                raise ValueError('Processed belong to different model iterations.')
+            columns['article'].append(get_uuid(item.get('article')))
+            columns['uuid'].append(item.get('uuid'))
+            for level in cls._levels:
+                columns[f'topic_level{level}'].append(get_uuid(item.get(f'topic_level{level}')))
+                columns[f'topic_level{level}_prob'].append(get_float(item.get(f'topic_level{level}_prob')))
+            position = item.get('position')
+            columns['position'].append(position if position else [np.nan, np.nan])
+        return cls(model_iteration_uuid=model_iteration_uuid, **columns)
+
+    @classmethod
+    def from_processed(cls, processed: list[Processed]) -> ProcessedBatch:
+        return cls.from_list([proc.to_dict() for proc in processed])
+
+
 if __name__ == "__main__":
     old_testing = False
     if old_testing:
@@ -8,6 +8,6 @@ setup(
     url="https://github.com/ResearchComputingServices/maple",
     author="Roger Selzler",
     author_email="rogerselzler@cunet.carleton.ca",
-    install_requires=['validators'],
+    install_requires=['validators', 'numpy'],
     packages=["maple_structures"],
 )
@@ -1,6 +1,6 @@
 import unittest
 import logging
-from maple_structures import Processed, Topic, Model, ModelIteration, Article
+from maple_structures import Processed, ProcessedBatch, Topic, Model, ModelIteration, Article, ArticleLite
 from uuid import uuid4 as uuid
 import copy
 import json
@@ -177,5 +177,106 @@ class TestProcessed(unittest.TestCase):
         self.assertEqual(true_dict, processed.to_dict())
         
 
+class TestProcessedBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        model_iteration = ModelIteration()
+        model_iteration.uuid = str(uuid())
+        self.processed = []
+        for i in range(5):
+            article = Article()
+            article.uuid = str(uuid())
+            topics = []
+            for level in range(1, 4):
+                topic = Topic()
+                topic.uuid = str(uuid())
+                topics.append(topic)
+            self.processed.append(Processed(
+                article=article,
+                modelIteration=model_iteration,
+                topic_level1=topics[0],
+                topic_level1_prob=0.1 * (i + 1),
+                topic_level2=topics[1],
+                topic_level2_prob=0.2,
+                topic_level3=topics[2],
+                topic_level3_prob=0.3,
+                position=[float(i), 0.5]))
+        self.batch = ProcessedBatch.from_processed(self.processed)
+
+    def test_to_list(self):
+        self.assertEqual(len(self.batch), 5)
+        self.assertEqual(self.batch.to_list(), [proc.to_dict() for proc in self.processed])
+
+    def test_slice_and_extend(self):
+        batch = self.batch[:2]
+        batch.extend(self.batch[2:])
+        self.assertEqual(batch.to_list(), self.batch.to_list())
+
+    def test_take(self):
+        batch = self.batch.take([3, 0])
+        self.assertEqual(batch.to_list(), [self.processed[3].to_dict(), self.processed[0].to_dict()])
+        self.assertEqual(len(self.batch.take([])), 0)
+
+    def test_from_list(self):
+        data = self.batch.to_list()
+        data[0]['uuid'] = str(uuid())
+        del data[1]['position']
+        batch = ProcessedBatch.from_list(data)
+        self.assertEqual(batch.to_list(include_uuid=True), data)
+
+
+class TestArticle(unittest.TestCase):
+    def setUp(self) -> None:
+        self.data = dict(
+            uuid=str(uuid()),
+            url='https://www.example.com/news/article-1',
+            title='Title',
+            content='Some content.',
+            author=[dict(name='Jane Doe', url='https://www.example.com/jane')],
+            video_url=['https://www.example.com/video.mp4'],
+            createDate='2023-11-01T10:00:00.000Z',
+            number_of_likes=3,
+            chat_summary='A summary.',
+            metadata=dict(source_id=10),
+        )
+
+    def test_trusted_from_json(self):
+        article = Article.from_json(copy.deepcopy(self.data))
+        trusted = Article.from_json(copy.deepcopy(self.data), trusted=True)
+        self.assertEqual(article.to_dict(), trusted.to_dict())
+        self.assertEqual(trusted.url, self.data['url'])
+        self.assertEqual(trusted.chat_summary, self.data['chat_summary'])
+        self.assertEqual(trusted.author[0].name, 'Jane Doe')
+        self.assertEqual(trusted.source_id, 10)
+
+    def test_from_json_validation(self):
+        self.data['url'] = 'not a url'
+        with self.assertRaises(ValueError):
+            Article.from_json(self.data)
+        self.assertEqual(Article.from_json(self.data, trusted=True).url, 'not a url')
+
+
+class TestArticleLite(unittest.TestCase):
+    def test_from_json(self):
+        article = Article()
+        article.uuid = str(uuid())
+        article.url = 'https://www.example.com/news/article-1'
+        article.content = 'Some content.'
+        article.chat_summary = 'A summary.'
+        fields = ['uuid', 'url', 'chat_summary', 'createDate']
+        lite = ArticleLite.from_json(article.to_dict(), fields)
+        self.assertEqual(lite.uuid, article.uuid)
+        self.assertEqual(lite.chat_summary, 'A summary.')
+        self.assertFalse(hasattr(lite, 'createDate'))
+        self.assertFalse(hasattr(lite, 'content'))
+        self.assertFalse(hasattr(lite, '__dict__'))
+        self.assertEqual(
+            lite.to_dict(),
+            dict(uuid=article.uuid, url=article.url, chat_summary='A summary.'))
+
+    def test_invalid_fields(self):
+        with self.assertRaises(ValueError):
+            ArticleLite.validate_fields(['uuid', 'comments'])
+
+
 if __name__ == '__main__':
     unittest.main()
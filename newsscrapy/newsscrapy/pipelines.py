@@ -13,13 +13,8 @@ import bcrypt
 from maple_interface import MapleAPI
 from maple_structures import Article
 from maple_config import config as cfg
-from maple_chatgpt import ChatgptClient
 # from maple_processing.process import chatgpt_summary
 
-import socketio
-from socketio import exceptions
-import threading
-
 config = cfg.load_config(cfg.DEVELOPMENT)
 
 class ProcessArticles:
@@ -27,18 +22,26 @@ class ProcessArticles:
     name = 'ProcessArticles'
     
     def __init__(self) -> None:
-        global config
-        self.chatgpt_client = ChatgptClient(
-            MapleAPI(
-            f"http://{config['MAPLE_BACKEND_IP']}:{config['MAPLE_BACKEND_PORT']}"),
-            chatgpt_api_key=config['MAPLE_CHATGPT35TURBO_APIKEY'],
-            socket_io_api_key=config['MAPLE_CHAT_SOCKETIO_KEY'],
-            socket_io_ip=config['MAPLE_CHAT_IP'],
-            socket_io_port=config['MAPLE_CHAT_PORT'],
-            connection_required = False,
-        )
+        self._chatgpt_client = None
         # self.sio = socketio.Client()
         self.logger = logging.getLogger(self.name)
+
+    @property
+    def chatgpt_client(self):
+        # created on first use, so socketio is only loaded when there are uuids to send.
+        if self._chatgpt_client is None:
+            global config
+            from maple_chatgpt import ChatgptClient
+            self._chatgpt_client = ChatgptClient(
+                MapleAPI(
+                f"http://{config['MAPLE_BACKEND_IP']}:{config['MAPLE_BACKEND_PORT']}"),
+                chatgpt_api_key=config['MAPLE_CHATGPT35TURBO_APIKEY'],
+                socket_io_api_key=config['MAPLE_CHAT_SOCKETIO_KEY'],
+                socket_io_ip=config['MAPLE_CHAT_IP'],
+                socket_io_port=config['MAPLE_CHAT_PORT'],
+                connection_required = False,
+            )
+        return self._chatgpt_client
         
     def add_uuid(self, uuid):
         if uuid not in self.uuids_to_process:
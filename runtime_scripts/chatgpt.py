@@ -3,6 +3,8 @@ import coloredlogs
 import rcs
 from maple_config import config as cfg
 from maple_chatgpt import ChatgptServer
+from maple_chatgpt.rate_limit import KeyLimits
+from maple_chatgpt.llm_cache import LLMCache
 from maple_interface import MapleAPI
 
 LOG_LEVEL = 'debug'
@@ -32,13 +34,18 @@ config = cfg.load_config(cfg.PRODUCTION)
 
 server = ChatgptServer(
     MapleAPI(
-        f"http://{config['MAPLE_BACKEND_IP']}:{config['MAPLE_BACKEND_PORT']}"),
+        f"http://{config['MAPLE_BACKEND_IP']}:{config['MAPLE_BACKEND_PORT']}",
+        trusted_backend=True),
     chatgpt_api_key=config['MAPLE_CHATGPT35TURBO_APIKEY'],
     socket_io_ip=config['MAPLE_CHAT_IP'],
     socket_io_port=config['MAPLE_CHAT_PORT'],
     socket_io_api_key=config['MAPLE_CHAT_SOCKETIO_KEY'],
     article_fetching=True,
     use_config = True,
+    rate_limits=KeyLimits.from_config(config),
+    llm_cache=LLMCache.from_config(config),
+    summary_batch_size=int(config.get('MAPLE_CHAT_SUMMARY_BATCH_SIZE') or 8),
+    summary_batch_window=float(config.get('MAPLE_CHAT_SUMMARY_BATCH_WINDOW') or 0.5),
 )
 
 server.run()
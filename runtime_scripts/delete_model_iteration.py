@@ -8,7 +8,6 @@ import time
 import os
 import shutil
 import coloredlogs
-from openai import timeout
 import rcs
 from maple_structures.model import ModelIteration
 from maple_interface import MapleAPI
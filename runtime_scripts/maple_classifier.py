@@ -0,0 +1,91 @@
+import logging
+import argparse
+import os
+import coloredlogs
+import rcs
+from maple_chatgpt import ChatgptClient
+from maple_processing import MapleClassifier
+from maple_interface import MapleAPI
+from maple_config import config as cfg
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--level', type=str, choices=[
+                    'debug', 'info', 'warning', 'error', 'critical'], default='info', help="The log level")
+parser.add_argument('--batch-size', type=int, default=32, help="Maximum number of articles classified together.")
+parser.add_argument('--max-latency', type=float, default=2.0, help="Seconds waited for more articles before classifying a batch.")
+parser.add_argument('--poll-interval', type=float, default=60, help="Seconds between polls of recent articles.")
+parser.add_argument('--no-events', action='store_true', help="Do not connect to the chatgpt server. Articles are only polled.")
+parser.add_argument('--logname', type=str, default='maple_classifier', help="The name of the log file.")
+logger = logging.getLogger('maple_classifier')
+
+
+def main(*,
+    log_level: str,
+    batch_size: int,
+    max_latency: float,
+    poll_interval: float,
+    events: bool = True,
+    log_filename: str = 'maple_classifier',
+    ):
+    ENV = cfg.PRODUCTION
+    LOG_OUTPUT_DIRECTORY = 'logs'
+
+    # Reduce log messages of some packages.
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
+    logging.getLogger('httpcore').setLevel(logging.WARNING)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    rcs.utils.configure_logging(
+        level=log_level,
+        output_to_console=False,
+        output_directory=LOG_OUTPUT_DIRECTORY,
+        output_filename_prefix=log_filename,
+        n_log_files=3,
+        use_postfix_hour=False,
+        force=True
+    )
+
+    coloredlogs.install(level=getattr(logging, log_level.upper()))
+
+    config = cfg.load_config(ENV)
+
+    maple = MapleAPI(
+        authority=f"http://{config['MAPLE_BACKEND_IP']}:{config['MAPLE_BACKEND_PORT']}",
+        trusted_backend=True)
+
+    chatgpt_client = None
+    if events:
+        chatgpt_client = ChatgptClient(
+            maple,
+            chatgpt_api_key=config['MAPLE_CHATGPT35TURBO_APIKEY'],
+            socket_io_api_key=config['MAPLE_CHAT_SOCKETIO_KEY'],
+            socket_io_ip=config['MAPLE_CHAT_IP'],
+            socket_io_port=config['MAPLE_CHAT_PORT'],
+            connection_required=False,
+            )
+
+    classifier = MapleClassifier(
+        maple=maple,
+        model_iteration_datapath=os.path.join(
+            config['MAPLE_DATA_PATH'],
+            config['MAPLE_MODEL_ITERATION_PATH'],
+        ),
+        batch_size=batch_size,
+        max_latency=max_latency,
+        poll_interval=poll_interval,
+        chatgpt_client=chatgpt_client,
+    )
+    classifier.run()
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logger.debug('Running maple_classifier with args: %s', args)
+    main(
+        log_level=args.level,
+        batch_size=args.batch_size,
+        max_latency=args.max_latency,
+        poll_interval=args.poll_interval,
+        events=not args.no_events,
+        log_filename=args.logname)
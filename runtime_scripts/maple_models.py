@@ -4,7 +4,7 @@ import os
 import coloredlogs
 import rcs
 from maple_chatgpt import ChatgptClient
-from maple_processing import MapleProcessing, MapleBert, MapleModel
+from maple_processing import MapleProcessing, MapleBert, MapleModel, ModelFamilyScheduler
 from maple_interface import MapleAPI
 from maple_config import config as cfg
 
@@ -18,6 +18,10 @@ parser.add_argument('--level', type=str, choices=[
                     'debug', 'info', 'warning', 'error', 'critical'], default='info', help="The log level")
 parser.add_argument('--debug-limits', action='store_true', help="Limits the number of articles used in a model iteration. Used for debug purposes.")
 parser.add_argument('--run-once', action='store_true',help="If provided, model_iteration will be executed only once.")
+parser.add_argument('--parallel-training', action='store_true', help="If provided, the model levels are trained concurrently in worker processes.")
+parser.add_argument('--incremental', action='store_true', help="If provided, the models of the last complete iteration are updated with the new articles instead of being retrained.")
+parser.add_argument('--full-retrain-hours', type=float, default=24, help="With --incremental, hours between full retrains of the models.")
+parser.add_argument('--max-cpu-jobs', type=int, default=1, help="With several models, number of model families training at the same time.")
 parser.add_argument('--logname', type=str, default='maple_models', help="The name of the log file.")
 logger = logging.getLogger('maple_models')
 
@@ -28,6 +32,10 @@ def main(*,
     debug_limits: bool = False,
     run_once: bool = False,
     log_filename: str = 'maple_models',
+    parallel_training: bool = False,
+    incremental: bool = False,
+    full_retrain_hours: float = 24,
+    max_cpu_jobs: int = 1,
     ):
     ENV = cfg.PRODUCTION
     LOG_OUTPUT_DIRECTORY = 'logs'
@@ -54,32 +62,47 @@ def main(*,
 
     config = cfg.load_config(ENV)
 
-    maple = MapleAPI(
-        authority=f"http://{config['MAPLE_BACKEND_IP']}:{config['MAPLE_BACKEND_PORT']}")
+    def create_processing(families: list[MapleModel], **kwargs) -> MapleProcessing:
+        maple = MapleAPI(
+            authority=f"http://{config['MAPLE_BACKEND_IP']}:{config['MAPLE_BACKEND_PORT']}",
+            trusted_backend=True)
 
-    chatgpt_client = ChatgptClient(
-        maple,
-        chatgpt_api_key=config['MAPLE_CHATGPT35TURBO_APIKEY'],
-        socket_io_api_key=config['MAPLE_CHAT_SOCKETIO_KEY'],
-        socket_io_ip=config['MAPLE_CHAT_IP'],
-        socket_io_port=config['MAPLE_CHAT_PORT'],
-        connection_required=True,
+        chatgpt_client = ChatgptClient(
+            maple,
+            chatgpt_api_key=config['MAPLE_CHATGPT35TURBO_APIKEY'],
+            socket_io_api_key=config['MAPLE_CHAT_SOCKETIO_KEY'],
+            socket_io_ip=config['MAPLE_CHAT_IP'],
+            socket_io_port=config['MAPLE_CHAT_PORT'],
+            connection_required=True,
+            )
+        
+        return MapleProcessing(
+            maple=maple,
+            hours=TRAINING_HOURS,
+            models=families,
+            debug_limits=debug_limits,
+            chatgpt_client=chatgpt_client,
+            parallel_training=parallel_training,
+            incremental=incremental,
+            full_retrain_hours=full_retrain_hours,
+            model_iteration_datapath=os.path.join(
+                config['MAPLE_DATA_PATH'],
+                config['MAPLE_MODEL_ITERATION_PATH'],
+            ),
+            **kwargs,
         )
-    
-    maple_proc = MapleProcessing(
-        maple=maple,
-        hours=TRAINING_HOURS,
-        models=models,
-        debug_limits=debug_limits,
-        chatgpt_client=chatgpt_client,
-        model_iteration_datapath=os.path.join(
-            config['MAPLE_DATA_PATH'],
-            config['MAPLE_MODEL_ITERATION_PATH'],
-        ),
-    )
 
-    # maple_proc.DEBUG_LIMIT_PROCESS_COUNT = 200
-    maple_proc.run(run_once=run_once)
+    if len(models) == 1:
+        maple_proc = create_processing(models)
+        # maple_proc.DEBUG_LIMIT_PROCESS_COUNT = 200
+        maple_proc.run(run_once=run_once)
+    else:
+        # one MapleProcessing (and chatgpt client) per model family, running concurrently.
+        scheduler = ModelFamilyScheduler(
+            models,
+            create_processing,
+            max_cpu_jobs=max_cpu_jobs)
+        scheduler.run(run_once=run_once)
 
 
 if __name__ == '__main__':
@@ -89,11 +112,16 @@ if __name__ == '__main__':
     if 'bert' in args.model:
         models.append(MapleBert)
     if 'lda' in args.model:
-        models.append(MapleLDA)
+        # there is no LDA implementation of MapleModel.
+        parser.error('The lda model is not available.')
 
     main(
         models=models,
         log_level=args.level,
         debug_limits=args.debug_limits,
         run_once=args.run_once,
-        log_filename=args.logname)
+        log_filename=args.logname,
+        parallel_training=args.parallel_training,
+        incremental=args.incremental,
+        full_retrain_hours=args.full_retrain_hours,
+        max_cpu_jobs=args.max_cpu_jobs)
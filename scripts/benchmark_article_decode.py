@@ -0,0 +1,75 @@
+'''Measures Article.from_json decode throughput in articles/sec.'''
+import argparse
+import copy
+import timeit
+from uuid import uuid4
+from maple_structures import Article
+
+
+def sample_article(index: int) -> dict:
+    return dict(
+        uuid=str(uuid4()),
+        url=f'https://www.example.com/news/{index}/some-article-title',
+        title=f'Article {index}',
+        summary='Summary of the article.',
+        content='Content of the article. ' * 200,
+        author=[dict(name='Jane Doe', url='https://www.example.com/authors/jane')],
+        video_url=[f'https://www.example.com/videos/{index}.mp4'],
+        date_published='2023-11-01T10:00:00.000Z',
+        createDate='2023-11-01T10:00:00.000Z',
+        modifyDate='2023-11-01T10:00:00.000Z',
+        language='en',
+        chat_summary='Chat summary of the article.',
+        metadata=dict(source_id=index),
+    )
+
+
+def decode_per_instance_descriptors(data: dict) -> Article:
+    '''emulates the previous decoder, which created the descriptors on every instance.'''
+    Article._install_properties()
+    return Article.from_json(data)
+
+
+def decode_validated(data: dict) -> Article:
+    return Article.from_json(data)
+
+
+def decode_trusted(data: dict) -> Article:
+    return Article.from_json(data, trusted=True)
+
+
+def measure(decode, pages: list[list[dict]], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        data = copy.deepcopy(pages)
+        tstart = timeit.default_timer()
+        for page in data:
+            for article_json in page:
+                decode(article_json)
+        elapsed = timeit.default_timer() - tstart
+        best = elapsed if best is None else min(best, elapsed)
+    return sum(len(page) for page in pages) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=5000, help='number of articles.')
+    parser.add_argument('--page-size', type=int, default=100, help='articles per page.')
+    parser.add_argument('--repeat', type=int, default=3, help='best of repeat runs.')
+    args = parser.parse_args()
+
+    articles = [sample_article(i) for i in range(args.n)]
+    pages = [articles[i:i+args.page_size] for i in range(0, len(articles), args.page_size)]
+
+    baseline = None
+    for name, decode in [
+            ('before (descriptors per instance)', decode_per_instance_descriptors),
+            ('validated', decode_validated),
+            ('trusted', decode_trusted)]:
+        rate = measure(decode, pages, args.repeat)
+        baseline = baseline or rate
+        print(f'{name:<36} {rate:>12,.0f} articles/sec  ({rate/baseline:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+'''Import time regression benchmark for the entry points.
+
+Only the top level imports of each entry point are executed (the scripts themselves
+start services), using `python -X importtime`. Results can be saved as a baseline and
+later runs compared against it.
+
+    python scripts/benchmark_importtime.py --save-baseline importtime.json
+    python scripts/benchmark_importtime.py --baseline importtime.json --tolerance 0.2
+'''
+import argparse
+import ast
+import glob
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = sorted(glob.glob(os.path.join(ROOT, 'runtime_scripts', '*.py'))) + [
+    os.path.join(ROOT, 'newsscrapy', 'runspiders.py'),
+]
+HEAVY_MODULES = [
+    'torch', 'transformers', 'spacy', 'nltk', 'bertopic', 'umap', 'hdbscan',
+    'sentence_transformers', 'sklearn', 'openai', 'socketio', 'aiohttp', 'httpx',
+]
+
+
+def top_level_imports(path: str) -> str:
+    '''source code with only the module level imports of path.'''
+    with open(path, 'r', encoding='utf-8') as file:
+        tree = ast.parse(file.read(), filename=path)
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return '\n'.join(ast.unparse(node) for node in nodes)
+
+
+def run_importtime(code: str, cwd: str = None):
+    '''runs code with -X importtime.
+
+    Returns:
+        tuple: the completed process and a list of (self_us, cumulative_us, name) per import.
+    '''
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return process, imports
+
+
+def measure(path: str, startup: set) -> dict:
+    '''runs the imports of path with -X importtime.
+
+    Args:
+        path (str): the entry point.
+        startup (set): modules imported by the interpreter startup, which are not counted.
+
+    Returns:
+        dict: total_ms, heavy modules loaded, slowest top level imports and error, if any.
+    '''
+    process, imports = run_importtime(top_level_imports(path), cwd=os.path.dirname(path))
+    total_us = 0
+    loaded = set()
+    top_level = []
+    for self_us, cumulative_us, name in imports:
+        module = name.strip()
+        if module in startup:
+            continue
+        total_us += self_us
+        loaded.add(module.split('.')[0])
+        # top level imports are not indented.
+        if name.startswith(' ') and not name.startswith('  '):
+            top_level.append((cumulative_us, module))
+    error = None
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'failed'
+    return dict(
+        total_ms=round(total_us / 1000, 1),
+        heavy=[module for module in HEAVY_MODULES if module in loaded],
+        slowest=[
+            dict(module=module, cumulative_ms=round(cumulative_us / 1000, 1))
+            for cumulative_us, module in sorted(top_level, reverse=True)[:5]],
+        error=error,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', help='json file with previous results to compare against.')
+    parser.add_argument('--save-baseline', help='stores the results in this json file.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression. Defaults to 0.2.')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    _, imports = run_importtime('pass')
+    startup = {name.strip() for _, _, name in imports}
+
+    results = {}
+    regressions = []
+    for path in ENTRY_POINTS:
+        name = os.path.relpath(path, ROOT)
+        result = measure(path, startup)
+        results[name] = result
+        line = f"{name:<40} {result['total_ms']:>9.1f} ms  heavy: {', '.join(result['heavy']) or '-'}"
+        if result['error']:
+            line += f"  ERROR: {result['error']}"
+        if name in baseline:
+            previous = baseline[name]['total_ms']
+            line += f"  (baseline {previous:.1f} ms)"
+            if result['total_ms'] > previous * (1 + args.tolerance):
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+        for slow in result['slowest']:
+            print(f"    {slow['module']:<36} {slow['cumulative_ms']:>9.1f} ms")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    if regressions:
+        print(f"Import time regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
+import asyncio
 import logging
 import os
 import json
 import rcs
 from maple_structures import ModelIteration, Model, Processed, Topic, Article
-from maple_interface import MapleAPI
+from maple_interface import MapleAPI, AsyncMapleAPI
 
     
     
@@ -58,17 +59,11 @@ def download_data(maple: MapleAPI, model_iteration_uuid: str, path: str):
     with open(os.path.join(model_iteration_path, 'model_iteration.json'), 'w') as file:
         json.dump(model_iteration.to_dict(), file, indent=2)
     
-    processed = []
-    skip = 0
-    while True:    
-        limit = 1000
-        response = maple.processed_get(model_iteration_uuid, limit=limit, skip=skip, as_json=True)
-        if not isinstance(response,list):
-            continue
-        if len(response) == 0:
-            break 
-        processed.extend(response)
-        skip += limit
+    async def retrieve_processed():
+        async with AsyncMapleAPI.from_maple_api(maple) as maple_async:
+            return await maple_async.processed_get_all(
+                model_iteration_uuid, limit=1000, concurrency=4, as_json=True)
+    processed = asyncio.run(retrieve_processed())
         
     with open(os.path.join(model_iteration_path, 'processed.json'), 'w') as file:
         json.dump(processed, file, indent=2)